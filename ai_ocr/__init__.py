@@ -0,0 +1,8 @@
+"""
+Shared helpers for the ai_ocr_wrappers extractor scripts.
+
+The scripts in `imgextractors/` and `pdfextractors/` stay runnable on their own
+(`uv run` / `python3`), and import from this package for functionality that is
+shared across extractors. Installed as a package, `ai-ocr` (ai_ocr/cli.py)
+dispatches to them through the registry in ai_ocr/registry.py.
+"""
@@ -0,0 +1,5 @@
+"""Allow `python -m ai_ocr ...` as an alias of the `ai-ocr` command."""
+
+from ai_ocr.cli import main
+
+main()
@@ -0,0 +1,108 @@
+"""
+Batch mode shared by all extractor scripts.
+
+Expands input files, glob patterns and manifests into a list of files and runs
+an extractor function over them with a bounded worker pool (`--jobs N`).
+Per-file SKIPPING semantics stay with the extractor function itself.
+"""
+
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def add_batch_arguments(parser, jobs_default=1, jobs_help="Number of files processed concurrently"):
+    """Add batch mode arguments (--manifest, --jobs) to an argparse parser."""
+    parser.add_argument("-m", "--manifest", help="File with one input path per line ('-' for stdin)")
+    parser.add_argument("-j", "--jobs", type=int, default=jobs_default, help=f"{jobs_help} (default: {jobs_default})")
+
+def read_manifest(manifest):
+    """Read input paths from manifest file, skipping blank lines and # comments."""
+    if manifest == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(manifest, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+def expand_inputs(patterns):
+    """Expand glob patterns, keeping literal paths that match nothing (so they fail visibly)."""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for match in matches:
+            if match not in seen:
+                seen.add(match)
+                files.append(match)
+    return files
+
+def collect_inputs(parser, args):
+    """Collect inputs from positional arguments and --manifest, validating flag combinations."""
+    patterns = list(args.inputs)
+    if args.manifest:
+        patterns.extend(read_manifest(args.manifest))
+    inputs = expand_inputs(patterns)
+    if not inputs:
+        parser.error("no input files given")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if getattr(args, "output", None) and len(inputs) > 1:
+        parser.error("-o/--output can only be used with a single input file")
+    return inputs
+
+def run_batch(process_file, inputs, jobs=1, verbose=False):
+    """
+    Run process_file over inputs with at most `jobs` files in flight.
+
+    process_file returns the output filename, or None when the file was skipped.
+    A single input is processed directly, so exit codes and output stay as before.
+    Returns the number of failed files.
+    """
+    if len(inputs) == 1:
+        process_file(inputs[0])
+        return 0
+
+    done = skipped = failed = 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(process_file, input_file): input_file for input_file in inputs}
+        for future in as_completed(futures):
+            input_file = futures[future]
+            try:
+                result = future.result()
+            except SystemExit:
+                # Extractor already reported the error before exiting
+                failed += 1
+                print_failure(input_file)
+                continue
+            except Exception as e:
+                failed += 1
+                print_failure(input_file, e)
+                continue
+            if result is None:
+                skipped += 1
+            else:
+                done += 1
+                if verbose:
+                    print(f"DONE: {input_file} -> {result}", file=sys.stderr)
+
+    print_batch_summary(len(inputs), done, skipped, failed, time.monotonic() - start)
+    return failed
+
+def print_failure(input_file, error=None):
+    """Report a failed batch input to stderr (error omitted when already reported)."""
+    print(f"FAILED: {input_file}: {error}" if error is not None else f"FAILED: {input_file}", file=sys.stderr)
+
+def print_batch_summary(total, done, skipped, failed, elapsed):
+    """Print aggregate batch counts and throughput (files/min) to stderr."""
+    rate = done / elapsed * 60 if elapsed > 0 else 0.0
+    print(
+        f"BATCH: {total} files, done={done} skipped={skipped} failed={failed} "
+        f"in {elapsed:.1f}s ({rate:.1f} files/min)",
+        file=sys.stderr
+    )
@@ -0,0 +1,66 @@
+"""
+Blank page detection for rendered pages.
+
+Scanner backs and intentionally blank pages would otherwise be uploaded in
+full and come back as empty strings seconds later. `is_blank_page()` measures
+ink coverage (pixels clearly darker than the page background) and the
+overall gray level spread on a reduced grayscale copy; pages below both
+thresholds are answered locally. Show-through from the other side of the
+sheet and dust specks stay below the ink threshold, while a single short line
+of text does not. Needs numpy and Pillow; without them no page is blank.
+"""
+
+# Fraction of ink pixels up to which a page counts as (nearly) blank, also
+# for the resolution choice in ai_ocr/resolution.py
+DEFAULT_MAX_INK = 0.0005
+# Pages with more gray level spread hold faint content (pencil, light figures)
+MAX_STDDEV = 24.0
+# Working copy size; thin strokes survive this much reduction
+MAX_ANALYSIS_SIDE = 2048
+DEFAULT_BLANK_TEXT = "[blank page]"
+
+def add_blank_page_arguments(parser):
+    """Add --blank-ink and --blank-page-text arguments to an argparse parser."""
+    parser.add_argument("--blank-ink", type=float, default=DEFAULT_MAX_INK, help=f"Pages with at most this fraction of ink pixels are not OCR'd, 0 OCRs every page (default: {DEFAULT_MAX_INK})")
+    parser.add_argument("--blank-page-text", default=DEFAULT_BLANK_TEXT, help=f"Text written for blank pages (default: {DEFAULT_BLANK_TEXT!r})")
+
+def analysis_pixels(path):
+    """Return (pixels, scale, (width, height)): int16 grayscale at most MAX_ANALYSIS_SIDE, reduced by scale."""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as img:
+        size = img.size
+        gray = img.convert("L")
+    scale = 1
+    if max(size) > MAX_ANALYSIS_SIDE:
+        scale = -(-max(size) // MAX_ANALYSIS_SIDE)
+        gray = gray.reduce(scale)
+    return np.asarray(gray, dtype=np.int16), scale, size
+
+def ink_mask(pixels):
+    """Return (pixels, ink): pixels as dark on light, and the mask of pixels clearly darker than the background."""
+    import numpy as np
+
+    background = int(np.median(pixels))
+    if background < 128:
+        # Light text on dark background
+        pixels = 255 - pixels
+        background = 255 - background
+    return pixels, pixels < background - max(40, background // 4)
+
+def page_ink(png_path):
+    """Return (ink_ratio, stddev) of an image's grayscale pixels."""
+    pixels, ink = ink_mask(analysis_pixels(png_path)[0])
+    return float(ink.mean()), float(pixels.std())
+
+def is_blank_page(png_path, max_ink=DEFAULT_MAX_INK):
+    """True when the image has (almost) no ink and no faint content."""
+    if max_ink <= 0:
+        return False
+    try:
+        ink_ratio, stddev = page_ink(png_path)
+    except Exception:
+        # Missing numpy/Pillow or an unreadable image: let the model look at it
+        return False
+    return ink_ratio <= max_ink and stddev <= MAX_STDDEV
@@ -0,0 +1,222 @@
+"""
+Content-addressed result cache shared by all extractors.
+
+Results are keyed by sha256 of the input bytes plus the pinned model version,
+the task/prompt and any output-affecting parameters, so renamed copies of a
+file hit the cache and different files never collide. Entries are plain files
+under `<cache-dir>/objects/`, evicted by age and total size (least recently
+used first). A cache hit never touches the network.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from ai_ocr.metrics import span
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_MAX_AGE_DAYS = 180
+EVICT_INTERVAL_SECONDS = 600
+
+def default_cache_dir():
+    """Return cache directory from $AI_OCR_CACHE_DIR or the XDG cache location."""
+    if os.environ.get("AI_OCR_CACHE_DIR"):
+        return os.environ["AI_OCR_CACHE_DIR"]
+    xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(xdg_cache, "ai_ocr_wrappers")
+
+def cache_path(args, name):
+    """Path of name inside the --cache-dir of parsed arguments (default cache dir without one)."""
+    cache_dir = getattr(args, "cache_dir", None) or default_cache_dir()
+    return os.path.join(os.path.expanduser(cache_dir), name)
+
+def open_sqlite(path, schema, named_rows=False):
+    """Open (creating it and its directory) a SQLite database shared by threads and runs."""
+    # Imported here: only runs that keep a database pay for loading sqlite3
+    import sqlite3
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    if named_rows:
+        db.row_factory = sqlite3.Row
+    # WAL lets concurrent runs read while one of them writes
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(schema)
+    return db
+
+class SQLiteStore:
+    """SQLite database whose one connection is shared by threads under a lock."""
+
+    def __init__(self, path, schema, named_rows=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = open_sqlite(path, schema, named_rows)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Hash file contents without loading the whole file into memory."""
+    digest = hashlib.sha256()
+    with span("read", input=file_path) as fields, open(file_path, "rb") as f:
+        size = 0
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        fields["bytes_in"] = size
+    return digest.hexdigest()
+
+def make_cache_key(input_file, model_version, task=None, params=None):
+    """Build cache key from input hash, model version, task/prompt and parameters."""
+    description = {
+        "input_sha256": file_sha256(input_file),
+        "model": model_version,
+        "task": task,
+        "params": params or {},
+    }
+    encoded = json.dumps(description, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def add_cache_arguments(parser):
+    """Add --cache-dir and --no-cache arguments to an argparse parser."""
+    parser.add_argument("--cache-dir", default=default_cache_dir(), help="Result cache directory (default: $AI_OCR_CACHE_DIR or ~/.cache/ai_ocr_wrappers)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the result cache")
+
+def open_cache(args):
+    """Return ResultCache configured from parsed arguments, or None when disabled."""
+    if args.no_cache:
+        return None
+    return ResultCache(args.cache_dir)
+
+class ResultCache:
+    """Persistent file-per-entry cache with size and age based eviction."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 3600
+        self._thread = threading.local()
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def path_for(self, key):
+        """Return storage path of a cache entry."""
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def get_file(self, key):
+        """Return path of cached entry or None, refreshing its LRU timestamp on hit."""
+        path = self.path_for(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - stat.st_mtime > self.max_age:
+            self._remove(path)
+            return None
+        os.utime(path, (now, now))
+        self._thread.hits = self.thread_hits() + 1
+        return path
+
+    def thread_hits(self):
+        """Number of cache hits in the calling thread (tells served-from-cache calls apart)."""
+        return getattr(self._thread, "hits", 0)
+
+    def get_text(self, key):
+        """Return cached text or None."""
+        path = self.get_file(key)
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def copy_to(self, key, destination):
+        """Copy cached entry to destination; returns True on cache hit."""
+        path = self.get_file(key)
+        if path is None:
+            return False
+        shutil.copyfile(path, destination)
+        return True
+
+    def put_file(self, key, source):
+        """Store a copy of source file under key (atomic)."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp, open(source, "rb") as src:
+                shutil.copyfileobj(src, tmp)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.maybe_evict()
+
+    def put_text(self, key, text):
+        """Store text under key (atomic)."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+                tmp.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.maybe_evict()
+
+    def maybe_evict(self):
+        """Run eviction at most once per EVICT_INTERVAL_SECONDS across processes."""
+        marker = os.path.join(self.cache_dir, ".last_evict")
+        try:
+            if time.time() - os.stat(marker).st_mtime < EVICT_INTERVAL_SECONDS:
+                return
+        except FileNotFoundError:
+            pass
+        with open(marker, "w"):
+            pass
+        self.evict()
+
+    def evict(self):
+        """Remove expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"WARNING: Could not remove cache entry {path}: {e}", file=sys.stderr)
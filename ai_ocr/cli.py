@@ -0,0 +1,75 @@
+"""
+`ai-ocr` command: one entry point for all extractors.
+
+    ai-ocr list
+    ai-ocr nougat paper.pdf
+    ai-ocr deepseek-deepinfra --jobs 16 'scans/*.png'
+    ai-ocr pipeline -e surya book.pdf
+    ai-ocr probe book.pdf
+    ai-ocr route --max-cost 0.01 papers/*.pdf
+    ai-ocr usage --pages 50000
+    ai-ocr serve &
+
+Everything after the extractor name is passed to that extractor's own argument
+parser. Only the selected extractor module is imported, and provider SDKs are
+imported on first API use, so `--help` and cache hits start quickly.
+"""
+
+import sys
+
+from ai_ocr.registry import EXTRACTORS, get_extractor, load_plugins
+
+# Commands that are not extractors: name -> (module, description)
+COMMANDS = {
+    "pipeline": ("pdfextractors.pdf_pages_ocr_pipeline", "PDF to Markdown by OCR'ing rendered pages with an image extractor"),
+    "serve": ("ai_ocr.server", "Keep warm API clients in a daemon the extractors forward their files to"),
+    "journal": ("ai_ocr.journal", "Show documents, pages and predictions recorded for resuming interrupted runs"),
+    "probe": ("ai_ocr.pdfprobe", "Print PDF page count and metadata as JSON, without rendering"),
+    "metrics": ("ai_ocr.metrics", "Per-stage latency histograms of runs recorded with --metrics-file"),
+    "usage": ("ai_ocr.usage", "Token usage, tokens/sec and corpus cost projections of DeepInfra runs"),
+    "route": ("ai_ocr.router", "Convert with the extractor that best meets a latency or cost goal, from recorded history"),
+}
+
+def print_usage(file=sys.stdout):
+    """Print the command overview (without importing any extractor)."""
+    print("usage: ai-ocr <command> [options] [input ...]\n", file=file)
+    print("Extractors:", file=file)
+    for name, extractor in EXTRACTORS.items():
+        print(f"  {name:<20} {extractor.description}", file=file)
+    print("\nOther commands:", file=file)
+    for name, (_, description) in COMMANDS.items():
+        print(f"  {name:<20} {description}", file=file)
+    print(f"  {'list':<20} List extractors (including plugins) with provider and input type", file=file)
+    print("\nRun 'ai-ocr <command> --help' for the options of a command.", file=file)
+
+def list_extractors():
+    """Print one line per registered extractor, plugins included."""
+    load_plugins()
+    for name, extractor in EXTRACTORS.items():
+        print(f"{name}\t{extractor.provider or '-'}\t{extractor.input_kind or '-'}\t{extractor.module}")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print_usage()
+        return
+    command, rest = argv[0], argv[1:]
+    if command == "list":
+        list_extractors()
+        return
+
+    # Sub-command parsers name themselves after argv[0]
+    sys.argv[0] = f"ai-ocr {command}"
+    if command in COMMANDS:
+        import importlib
+
+        return importlib.import_module(COMMANDS[command][0]).main(rest)
+    extractor = get_extractor(command)
+    if extractor is None:
+        print(f"ERROR: Unknown command or extractor: {command}\n", file=sys.stderr)
+        print_usage(sys.stderr)
+        sys.exit(2)
+    return extractor.main(rest)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Small helpers shared by the ai_ocr modules and extractor scripts.
+"""
+
+import os
+import sys
+
+# Environment variables holding each provider's API token; the first one is canonical
+PROVIDER_TOKENS = {
+    "replicate": ("REPLICATE_API_TOKEN",),
+    "deepinfra": ("DEEPINFRA_API_TOKEN", "DEEPINFRA_TOKEN"),
+}
+
+def verbose_print(message, verbose=False):
+    """Print message if verbose mode is enabled."""
+    if verbose:
+        print(message, file=sys.stderr)
+
+def load_key_file(key_file, names):
+    """Export the first of the given token variables found in a shell-style key file."""
+    # Expand ~ to user home directory
+    key_file = os.path.expanduser(key_file)
+    if not os.path.exists(key_file):
+        print(f"ERROR: Key file not found: {key_file}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        with open(key_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('export '):
+                    line = line[7:]  # Remove 'export '
+                name, _, value = line.partition('=')
+                if name in names:
+                    os.environ[names[0]] = value.strip().strip('"').strip("'")
+                    break
+    except Exception as e:
+        print(f"ERROR: Failed to read key file: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def check_api_token(provider, key_file=None):
+    """Check that the provider's API token is set, loading it from key_file if given."""
+    names = PROVIDER_TOKENS[provider]
+    if key_file:
+        load_key_file(key_file, names)
+
+    token = next((os.environ[name] for name in names if name in os.environ), None)
+    if token is None:
+        print(f"ERROR: {names[0]} is not set", file=sys.stderr)
+        print("Set it via environment variable or use --key-file option", file=sys.stderr)
+        sys.exit(1)
+    # Use either token
+    os.environ[names[0]] = token
+
+def normalize_filename(filename, max_length=64):
+    """Normalize filename to a valid format."""
+    base = os.path.splitext(os.path.basename(filename))[0]
+    normalized = ''.join(c.lower() if c.isalnum() else '_' for c in base)
+    return normalized[:max_length]
+
+def task_extension(task_type):
+    """Output extension for a DeepSeek-OCR style task: .md for Markdown, .txt otherwise."""
+    return ".md" if "markdown" in task_type.lower() else ".txt"
+
+def generate_output_filename(input_filename, output_filename, extension=".md"):
+    """Generate output filename based on input file or output flag."""
+    if output_filename:
+        return output_filename
+    return normalize_filename(input_filename) + extension
+
+def truncate_long_string(data, max_length=1024):
+    """Truncate long strings for verbose output."""
+    if len(data) > max_length:
+        return f"{data[:64]} (...) {data[-64:]}"
+    return data
@@ -0,0 +1,222 @@
+"""
+Perceptual-hash deduplication of rendered pages.
+
+Scanned corpora repeat cover sheets, disclaimers, separator pages and slide
+templates. `PageDeduplicator.ocr()` hashes every rendered page and serves pages
+that look the same as an already OCR'd page (in the same document, another
+document of the run or, with a persistent index, an earlier run) from that
+page's text instead of sending it to the model again.
+
+A page matches when its 256-bit DCT perceptual hash is within `distance` bits
+of an earlier page's and, to rule out different text in the same layout, their
+small grayscale thumbnails agree pixel by pixel. Pages being OCR'd right now
+are matched too: a repeated page waits for the first copy's result.
+
+The persistent index (`<cache-dir>/pages.sqlite3`) is keyed by the extractor
+settings, so pages are only reused for the same model, task and rendering.
+Needs numpy and Pillow; without them every page is OCR'd.
+"""
+
+import sys
+import threading
+import time
+import zlib
+
+from ai_ocr.cache import open_sqlite
+from ai_ocr.common import verbose_print
+
+# Hash: 16x16 lowest DCT frequencies of a 64x64 grayscale copy
+HASH_SIZE = 64
+HASH_FREQUENCIES = 16
+DEFAULT_DISTANCE = 8
+# Verification: thumbnails must agree within these limits. At 256px a changed
+# word of body text still moves a few dozen pixels by more than DIFFERENT_PIXEL,
+# while scanner noise averages out to a mean difference of ~2.
+THUMBNAIL_SIZE = 256
+MAX_MEAN_DIFFERENCE = 3.0
+DIFFERENT_PIXEL = 32
+MAX_DIFFERENT_PIXELS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    context TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    thumbnail BLOB NOT NULL,
+    result TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_context ON pages (context);
+"""
+
+def add_dedup_arguments(parser):
+    """Add --no-dedup and --dedup-distance arguments to an argparse parser."""
+    parser.add_argument("--no-dedup", action="store_true", help="OCR every page, even when it looks like a page OCR'd before")
+    parser.add_argument("--dedup-distance", type=int, default=DEFAULT_DISTANCE, help=f"Max differing perceptual hash bits (of 256) for a page to count as a repeat (default: {DEFAULT_DISTANCE})")
+
+def _dct_matrix(size):
+    import numpy as np
+
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+def page_fingerprint(png_path):
+    """
+    Return (hash, thumbnail) of an image: 256 packed hash bits and a uint8
+    grayscale THUMBNAIL_SIZE square, as numpy arrays.
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(png_path) as img:
+        gray = img.convert("L")
+        # One cheap reduction first; resampling full-size pages twice would dominate
+        gray.thumbnail((THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2), Image.BILINEAR)
+        thumbnail = np.asarray(gray.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BILINEAR), dtype=np.uint8)
+        small = np.asarray(gray.resize((HASH_SIZE, HASH_SIZE), Image.BILINEAR), dtype=np.float64)
+    dct = _dct_matrix(HASH_SIZE)
+    low = (dct @ small @ dct.T)[:HASH_FREQUENCIES, :HASH_FREQUENCIES].ravel()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return np.packbits(bits), thumbnail
+
+def _same_page(thumbnail, other):
+    import numpy as np
+
+    difference = np.abs(thumbnail.astype(np.int16) - other.astype(np.int16))
+    return difference.mean() <= MAX_MEAN_DIFFERENCE and np.count_nonzero(difference > DIFFERENT_PIXEL) <= MAX_DIFFERENT_PIXELS
+
+class _Entry:
+    """A known page; pages from the persistent index load their thumbnail on first use."""
+
+    def __init__(self, thumbnail, document, result=None, rowid=None):
+        self.thumbnail = thumbnail
+        self.document = document
+        self.result = result
+        self.rowid = rowid
+        self.ready = threading.Event()
+        if result is not None:
+            self.ready.set()
+
+class PageDeduplicator:
+    """Serves OCR results of repeated pages from the first copy's result."""
+
+    def __init__(self, context, distance=DEFAULT_DISTANCE, index_path=None, verbose=False):
+        self.context = context
+        self.distance = distance
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.hashes = []
+        self.entries = []
+        self.pages = 0
+        self.hits = {"document": 0, "corpus": 0, "index": 0}
+        self._db = None
+        self._hash_matrix = None
+        if index_path:
+            self._open_index(index_path)
+
+    def _open_index(self, path):
+        import numpy as np
+
+        try:
+            self._db = open_sqlite(path, SCHEMA)
+            rows = self._db.execute("SELECT rowid, hash, result FROM pages WHERE context = ?", (self.context,)).fetchall()
+        except Exception as e:
+            print(f"WARNING: Page index disabled, cannot open {path}: {e}", file=sys.stderr)
+            self._db = None
+            return
+        for rowid, page_hash, result in rows:
+            self.hashes.append(np.frombuffer(page_hash, dtype=np.uint8))
+            self.entries.append(_Entry(None, None, result, rowid))
+
+    def _thumbnail(self, entry):
+        """Thumbnail of an entry, read from the index when it came from there."""
+        import numpy as np
+
+        if entry.thumbnail is None:
+            blob = self._db.execute("SELECT thumbnail FROM pages WHERE rowid = ?", (entry.rowid,)).fetchone()[0]
+            entry.thumbnail = np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        return entry.thumbnail
+
+    def _find(self, page_hash, thumbnail):
+        """Return the first matching entry (caller holds the lock)."""
+        import numpy as np
+
+        if not self.hashes:
+            return None
+        if self._hash_matrix is None or len(self._hash_matrix) != len(self.hashes):
+            self._hash_matrix = np.stack(self.hashes)
+        # Hamming distance to all known pages at once
+        distances = np.unpackbits(self._hash_matrix ^ page_hash, axis=1).sum(axis=1)
+        candidates = np.flatnonzero(distances <= self.distance)
+        for index in candidates[np.argsort(distances[candidates], kind="stable")]:
+            if _same_page(thumbnail, self._thumbnail(self.entries[index])):
+                return self.entries[index]
+        return None
+
+    def ocr(self, png_path, document, ocr):
+        """
+        Return (text, hit) for a rendered page: the text of a matching earlier
+        page, or ocr() whose result is remembered for later repeats.
+        """
+        try:
+            page_hash, thumbnail = page_fingerprint(png_path)
+        except Exception as e:
+            # Missing numpy/Pillow or an unreadable image: no deduplication
+            verbose_print(f"DEDUP: {png_path}: not hashed, {e}", self.verbose)
+            return ocr(), False
+        with self.lock:
+            self.pages += 1
+            entry = self._find(page_hash, thumbnail)
+            if entry is None:
+                entry = _Entry(thumbnail, document)
+                self.hashes.append(page_hash)
+                self.entries.append(entry)
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            # The first copy may still be in flight; a failed one leaves result None
+            entry.ready.wait()
+            if entry.result is not None:
+                with self.lock:
+                    source = "index" if entry.document is None else "document" if entry.document == document else "corpus"
+                    self.hits[source] += 1
+                return entry.result, True
+            return ocr(), False
+        try:
+            entry.result = ocr()
+        except BaseException:
+            # Forget the failed page, so its next copy is OCR'd and remembered
+            with self.lock:
+                index = self.entries.index(entry)
+                del self.entries[index], self.hashes[index]
+                self._hash_matrix = None
+            raise
+        finally:
+            entry.ready.set()
+        self._remember(page_hash, thumbnail, entry.result)
+        return entry.result, False
+
+    def _remember(self, page_hash, thumbnail, result):
+        if self._db is None:
+            return
+        try:
+            with self.lock:
+                self._db.execute(
+                    "INSERT INTO pages (context, hash, thumbnail, result, updated) VALUES (?, ?, ?, ?, ?)",
+                    (self.context, page_hash.tobytes(), zlib.compress(thumbnail.tobytes()), result, time.time())
+                )
+        except Exception as e:
+            print(f"WARNING: Could not record page in index: {e}", file=sys.stderr)
+
+    def print_summary(self):
+        """Print dedup hit rates of this run to stderr."""
+        hits = sum(self.hits.values())
+        rate = 100.0 * hits / self.pages if self.pages else 0.0
+        print(
+            f"DEDUP: {hits}/{self.pages} pages served from repeated pages ({rate:.1f}%): "
+            f"same document={self.hits['document']}, other document={self.hits['corpus']}, earlier runs={self.hits['index']}",
+            file=sys.stderr
+        )
@@ -0,0 +1,106 @@
+"""
+Pooled, streaming download of model output files.
+
+One keep-alive `requests.Session` per process is shared by all downloads, every
+request has connect/read timeouts, and bodies are streamed with `iter_content`
+into a temporary file next to the destination that is atomically renamed into
+place, so partial downloads never look like finished outputs. Transient HTTP
+and connection errors restart the download (see ai_ocr/resilience.py).
+"""
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_ocr.metrics import span
+from ai_ocr.resilience import retry_call
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (10, 300)
+CHUNK_SIZE = 1024 * 1024
+POOL_MAXSIZE = 64
+
+_session = None
+_session_lock = threading.Lock()
+_umask = None
+_umask_lock = threading.Lock()
+
+def get_session():
+    """Return the process-wide keep-alive session."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def current_umask():
+    """
+    Return the process umask without changing it where possible.
+
+    Linux reports it in /proc/self/status. Elsewhere it can only be read by
+    setting it, which is done once, under a lock, with a restrictive value so
+    that files other threads create meanwhile are never too permissive.
+    """
+    global _umask
+    with _umask_lock:
+        if _umask is None:
+            try:
+                with open("/proc/self/status", "r", encoding="ascii") as f:
+                    _umask = next(int(line.split()[1], 8) for line in f if line.startswith("Umask:"))
+            except (OSError, StopIteration, ValueError, IndexError):
+                _umask = os.umask(0o077)
+                os.umask(_umask)
+        return _umask
+
+def output_url(output):
+    """Return URL of a replicate output value (FileOutput object or plain string)."""
+    return getattr(output, "url", None) or str(output)
+
+def download_to_file(url, destination, timeout=DEFAULT_TIMEOUT, chunk_size=CHUNK_SIZE):
+    """Stream url into destination via an atomic temp-file rename; returns bytes written."""
+    with span("download", output=destination) as fields:
+        fields["bytes_in"] = retry_call(
+            lambda: _download_once(url, destination, timeout, chunk_size),
+            label=f"download {os.path.basename(destination)}"
+        )
+    return fields["bytes_in"]
+
+def _download_once(url, destination, timeout, chunk_size):
+    directory = os.path.dirname(os.path.abspath(destination))
+    written = 0
+    with get_session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(destination)}.", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+            # mkstemp creates 0600 files; finished downloads get the usual umask-based mode
+            os.chmod(tmp_path, 0o666 & ~current_umask())
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    return written
+
+def download_many(downloads, jobs=4, timeout=DEFAULT_TIMEOUT):
+    """Download [(url, destination), ...] in parallel; returns destinations in input order."""
+    if len(downloads) == 1:
+        url, destination = downloads[0]
+        download_to_file(url, destination, timeout)
+        return [destination]
+    with ThreadPoolExecutor(max_workers=min(jobs, len(downloads))) as executor:
+        futures = [executor.submit(download_to_file, url, destination, timeout) for url, destination in downloads]
+        for future in futures:
+            future.result()
+    return [destination for _, destination in downloads]
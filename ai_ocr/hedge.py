@@ -0,0 +1,267 @@
+"""
+Hedged DeepSeek-OCR requests across Replicate and DeepInfra.
+
+The same DeepSeek-OCR model runs on Replicate (queue and cold boot stalls) and
+on DeepInfra. `HedgedDeepSeek.ocr()` sends a page to the primary provider and,
+when it has not answered after the hedge delay, sends the same page to the other
+provider as well. The first result wins; a losing Replicate prediction is
+canceled, a losing DeepInfra request cannot be aborted and its answer is
+discarded. A primary that fails outright is backed up immediately.
+
+The hedge delay adapts: it is the `--hedge-percentile` of the primary's recent
+latencies (seeded from the router statistics, see ai_ocr/router.py), so only
+the slowest few percent of pages pay for a second request. Until enough
+latencies are known `--hedge-delay` is used.
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from ai_ocr.common import verbose_print
+from ai_ocr.metrics import quantile
+
+PROVIDERS = ("deepseek-replicate", "deepseek-deepinfra")
+DEFAULT_PERCENTILE = 95.0
+DEFAULT_INITIAL_DELAY = 10.0
+# Never hedge earlier than this, whatever the history says
+MIN_DELAY = 1.0
+# Latencies needed before the percentile replaces --hedge-delay
+MIN_SAMPLES = 10
+WINDOW = 200
+
+def add_hedge_arguments(parser):
+    """Add --hedge, --hedge-percentile and --hedge-delay arguments to an argparse parser."""
+    parser.add_argument("--hedge", action="store_true", help="Back up slow DeepSeek-OCR pages with a second request to the other provider (Replicate/DeepInfra), first result wins")
+    parser.add_argument("--hedge-percentile", type=float, default=DEFAULT_PERCENTILE, help=f"Hedge pages slower than this percentile of the primary's recent latencies (default: {DEFAULT_PERCENTILE:g})")
+    parser.add_argument("--hedge-delay", type=float, default=DEFAULT_INITIAL_DELAY, help=f"Hedge delay in seconds until enough latencies are recorded (default: {DEFAULT_INITIAL_DELAY:g})")
+
+class _Leg:
+    """One request of a hedged page: provider name, start time and result Future."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.monotonic()
+        self.future = Future()
+        self.prediction = None
+        self.canceled = False
+        self.lock = threading.Lock()
+
+class HedgedDeepSeek:
+    """OCRs images with DeepSeek-OCR on a primary provider, backed up by the other one."""
+
+    def __init__(self, primary, task_type="Convert to Markdown", resolution_size="Base", base_url=None, preprocess=True,
+                 hedge_percentile=DEFAULT_PERCENTILE, initial_delay=DEFAULT_INITIAL_DELAY, stats=None, prices=None, verbose=False):
+        if primary not in PROVIDERS:
+            raise ValueError(f"hedging needs one of {', '.join(PROVIDERS)} as primary, not {primary}")
+        self.primary = primary
+        self.backup = PROVIDERS[1 - PROVIDERS.index(primary)]
+        self.task_type = task_type
+        self.resolution_size = resolution_size
+        self.base_url = base_url
+        self.preprocess = preprocess
+        self.hedge_percentile = hedge_percentile
+        self.initial_delay = initial_delay
+        self.stats = stats
+        self.prices = prices or {}
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=WINDOW)
+        self.page_latencies = []
+        self.counts = {"pages": 0, "cached": 0, "hedged": 0, "fallbacks": 0, "backup_won": 0, "canceled": 0, "abandoned": 0}
+        self.extra_cost = 0.0
+        if stats is not None:
+            # Earlier runs' latencies of the primary, oldest first
+            for _, pages, seconds, ok, _ in reversed(stats.recent(primary, WINDOW)):
+                if ok:
+                    self.latencies.append(seconds / max(pages, 1))
+
+    def delay(self):
+        """Seconds to wait for the primary before sending the backup request."""
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return self.initial_delay
+            return max(MIN_DELAY, quantile(sorted(self.latencies), self.hedge_percentile / 100.0))
+
+    def cache_key(self, name, input_file):
+        """Result cache key of input_file as the extractor called name caches it."""
+        from ai_ocr.registry import get_extractor
+
+        module = get_extractor(name).load()
+        if name == "deepseek-replicate":
+            return module.get_cache_key(input_file, self.task_type, self.resolution_size, self.preprocess)
+        return module.get_cache_key(input_file, self.task_type, None, "auto", 0.0, self.preprocess)
+
+    def _start(self, name, input_file):
+        leg = _Leg(name)
+        run = self._replicate if name == "deepseek-replicate" else self._deepinfra
+
+        def target():
+            try:
+                leg.future.set_result(run(leg, input_file))
+            except BaseException as e:
+                leg.future.set_exception(e)
+
+        threading.Thread(target=target, name=f"hedge-{name}", daemon=True).start()
+        return leg
+
+    def _replicate(self, leg, input_file):
+        from ai_ocr.predictions import get_scheduler, record_output
+        from ai_ocr.preprocess import deepseek_max_side, discard_preprocessed, preprocess_image
+        from ai_ocr.registry import get_extractor
+
+        module = get_extractor("deepseek-replicate").load()
+        resolution_size = self.resolution_size
+        if resolution_size == "auto":
+            from ai_ocr.resolution import choose_resolution, measure_image
+            resolution_size = choose_resolution(measure_image(input_file))[0]
+        upload_file = input_file
+        if self.preprocess:
+            upload_file = preprocess_image(input_file, deepseek_max_side(resolution_size), self.verbose)[0]
+        scheduler = get_scheduler()
+        try:
+            prediction = scheduler.submit(module.MODEL_VERSION, {"task_type": self.task_type, "resolution_size": resolution_size}, {"image": upload_file})
+        finally:
+            discard_preprocessed(upload_file, input_file)
+        with leg.lock:
+            leg.prediction = prediction
+            canceled = leg.canceled
+        if canceled:
+            # Lost the race while the prediction was still being created
+            scheduler.cancel(prediction)
+        try:
+            text = module.output_text(prediction.result())
+        except Exception as e:
+            record_output(prediction, error=e)
+            raise
+        record_output(prediction, text)
+        return text
+
+    def _deepinfra(self, leg, input_file):
+        from ai_ocr.registry import get_extractor
+
+        module = get_extractor("deepseek-deepinfra").load()
+        client = module.get_client(self.base_url)
+        messages = module.build_messages(input_file, self.task_type, None, self.verbose, self.preprocess)
+        response = module.complete(client, messages, input_file, self.task_type, verbose=self.verbose)
+        return response.choices[0].message.content
+
+    def _cancel(self, leg):
+        """Stop a losing request: cancel its Replicate prediction, or abandon it."""
+        with leg.lock:
+            leg.canceled = True
+            prediction = leg.prediction
+        if leg.name == "deepseek-replicate":
+            if prediction is not None:
+                from ai_ocr.predictions import get_scheduler
+                get_scheduler().cancel(prediction)
+            return "canceled"
+        return "abandoned"
+
+    def ocr(self, input_file, cache=None, label=None):
+        """Return the DeepSeek-OCR text of an image from whichever provider answers first."""
+        label = label or input_file
+        if cache:
+            for name in (self.primary, self.backup):
+                text = cache.get_text(self.cache_key(name, input_file))
+                if text is not None:
+                    with self._lock:
+                        self.counts["pages"] += 1
+                        self.counts["cached"] += 1
+                    return text
+
+        start = time.monotonic()
+        primary = self._start(self.primary, input_file)
+        legs = {primary.future: primary}
+        done, _ = wait([primary.future], timeout=self.delay())
+        backup = None
+        # hedged: the primary was slow, fallbacks: it failed
+        kind = None
+        if not done or primary.future.exception() is not None:
+            kind = "fallbacks" if done else "hedged"
+            reason = "failed" if done else f"no answer after {time.monotonic() - start:.1f}s"
+            verbose_print(f"HEDGE: {label}: {self.primary} {reason}, sending to {self.backup}", self.verbose)
+            backup = self._start(self.backup, input_file)
+            legs[backup.future] = backup
+
+        winner = None
+        errors = []
+        pending = set(legs)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                leg = legs[future]
+                seconds = time.monotonic() - leg.started
+                if future.exception() is not None:
+                    errors.append(f"{leg.name}: {future.exception()}")
+                    self._record(leg.name, seconds, False)
+                    if backup is None:
+                        # The primary failed before the hedge delay passed
+                        kind = "fallbacks"
+                        backup = self._start(self.backup, input_file)
+                        legs[backup.future] = backup
+                        pending.add(backup.future)
+                    continue
+                self._record(leg.name, seconds, True)
+                if winner is None:
+                    winner = leg
+        if winner is None:
+            raise RuntimeError(f"DeepSeek-OCR failed on both providers for {label}: {'; '.join(errors)}")
+
+        outcome = None
+        for leg in legs.values():
+            if leg is not winner and not leg.future.done():
+                outcome = self._cancel(leg)
+                if leg is primary:
+                    # Censored: the primary took at least this long
+                    self._observe(time.monotonic() - primary.started)
+        with self._lock:
+            self.counts["pages"] += 1
+            self.page_latencies.append(time.monotonic() - start)
+            if backup is not None:
+                self.counts[kind] += 1
+                self.extra_cost += self.prices.get(self.backup, 0.0)
+            if winner is backup:
+                self.counts["backup_won"] += 1
+            if outcome is not None:
+                self.counts[outcome] += 1
+        if backup is not None:
+            verbose_print(f"HEDGE: {label}: {winner.name} won after {time.monotonic() - start:.1f}s", self.verbose)
+        text = winner.future.result()
+        if cache:
+            cache.put_text(self.cache_key(winner.name, input_file), text)
+        return text
+
+    def _observe(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def _record(self, name, seconds, ok):
+        if name == self.primary and ok:
+            self._observe(seconds)
+        if self.stats is not None:
+            try:
+                self.stats.record(name, 1, seconds, ok, self.prices.get(name, 0.0))
+            except Exception as e:
+                print(f"WARNING: Could not record extractor statistics: {e}", file=sys.stderr)
+
+    def print_summary(self):
+        """Print how often hedging fired, who won and the extra cost to stderr."""
+        counts = self.counts
+        ocrd = counts["pages"] - counts["cached"]
+        rate = 100.0 * counts["hedged"] / ocrd if ocrd else 0.0
+        latency = ""
+        if self.page_latencies:
+            ordered = sorted(self.page_latencies)
+            latency = ", page latency " + " ".join(
+                f"p{q}={quantile(ordered, q / 100.0):.1f}s" for q in (50, 95, 99)
+            )
+        print(
+            f"HEDGE: {counts['hedged']}/{ocrd} pages hedged ({rate:.1f}%) after {self.delay():.1f}s, "
+            f"{counts['fallbacks']} failed over, {self.backup} won {counts['backup_won']}, "
+            f"losers canceled={counts['canceled']} abandoned={counts['abandoned']}, "
+            f"extra cost ~${self.extra_cost:.4f}{latency}",
+            file=sys.stderr
+        )
@@ -0,0 +1,195 @@
+"""
+Durable job journal, so interrupted runs resume instead of starting over.
+
+A SQLite database (default `<cache-dir>/journal.sqlite3`) records
+
+* every Replicate prediction the scheduler creates, keyed by model, input
+  parameters and input file hashes, with its prediction ID. Re-running
+  the same command re-attaches to predictions still running (or finished
+  within the output retention window) instead of paying for them twice;
+* documents of the page pipeline and each of their pages (pending, in_flight,
+  done, failed) with the page text, so only unfinished pages are rendered and
+  OCR'd again.
+
+The journal is process-wide like the rate limits: `configure_journal(args)`
+opens it and `current_journal()` returns it (or None with --no-journal).
+`python3 -m ai_ocr.journal` (or `ai-ocr journal`) shows its contents.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+
+from ai_ocr.cache import SQLiteStore, cache_path, default_cache_dir, file_sha256
+
+STATES = ("pending", "in_flight", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    key TEXT PRIMARY KEY,
+    input TEXT,
+    output TEXT,
+    state TEXT NOT NULL,
+    pages INTEGER,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS units (
+    key TEXT PRIMARY KEY,
+    document TEXT,
+    unit TEXT,
+    state TEXT NOT NULL,
+    prediction_id TEXT,
+    result TEXT,
+    error TEXT,
+    run TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS units_document ON units (document);
+"""
+
+# Identifies the rows written by this process, which are never "an earlier run"
+RUN_ID = uuid.uuid4().hex
+
+def journal_path(args):
+    """Return the --journal path, or journal.sqlite3 inside the --cache-dir."""
+    return os.path.expanduser(args.journal) if args.journal else cache_path(args, "journal.sqlite3")
+
+def add_journal_arguments(parser):
+    """Add --journal and --no-journal arguments to an argparse parser."""
+    parser.add_argument("--journal", help="Journal database used to resume interrupted runs (default: <cache-dir>/journal.sqlite3)")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record or resume predictions and pages")
+
+_journal = None
+
+def configure_journal(args):
+    """Open the journal selected by add_journal_arguments() as the process-wide journal."""
+    global _journal
+    if args.no_journal:
+        _journal = None
+        return None
+    path = journal_path(args)
+    if _journal is None or _journal.path != path:
+        try:
+            _journal = Journal(path)
+        except Exception as e:
+            # A broken or unwritable journal must not stop the run itself
+            print(f"WARNING: Journal disabled, cannot open {path}: {e}", file=sys.stderr)
+            _journal = None
+    return _journal
+
+def current_journal():
+    """Return the process-wide journal, or None when journaling is off."""
+    return _journal
+
+def make_key(*parts):
+    """Stable key from JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def prediction_key(model_version, api_input, files=None):
+    """Journal key of a prediction: model, parameters and content hashes of its input files."""
+    # Content, not mtime: re-rendered page images of an interrupted run must match
+    hashes = {name: file_sha256(path) for name, path in (files or {}).items()}
+    return make_key("prediction", model_version, api_input, hashes)
+
+class Journal(SQLiteStore):
+    """Thread-safe SQLite journal of documents and their units (predictions or pages)."""
+
+    def __init__(self, path):
+        super().__init__(path, SCHEMA, named_rows=True)
+        if "run" not in [row["name"] for row in self._execute("PRAGMA table_info(units)")]:
+            # Journals written before units recorded their run
+            self._execute("ALTER TABLE units ADD COLUMN run TEXT")
+
+    def start_document(self, key, input_file, output_file, pages=None):
+        """
+        Mark a document in flight and return {unit: result} of its done units.
+
+        A document that finished before starts from scratch (e.g. re-run with
+        --force); an interrupted or failed one keeps its done units.
+        """
+        rows = self._execute("SELECT state FROM documents WHERE key = ?", (key,))
+        if rows and rows[0]["state"] == "done":
+            self._execute("DELETE FROM units WHERE document = ?", (key,))
+        self._execute(
+            "INSERT INTO documents (key, input, output, state, pages, updated) VALUES (?, ?, ?, 'in_flight', ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET input = excluded.input, output = excluded.output, "
+            "state = excluded.state, pages = COALESCE(excluded.pages, documents.pages), updated = excluded.updated",
+            (key, input_file, output_file, pages, time.time())
+        )
+        return {row["unit"]: row["result"] for row in self._execute(
+            "SELECT unit, result FROM units WHERE document = ? AND state = 'done'", (key,)
+        )}
+
+    def finish_document(self, key, ok):
+        """Mark a document done or failed."""
+        self._execute("UPDATE documents SET state = ?, updated = ? WHERE key = ?", ("done" if ok else "failed", time.time(), key))
+
+    def unit(self, key):
+        """Return the unit row as a dict, or None."""
+        rows = self._execute("SELECT * FROM units WHERE key = ?", (key,))
+        return dict(rows[0]) if rows else None
+
+    def set_unit(self, key, state, document=None, unit=None, prediction_id=None, result=None, error=None):
+        """Create or update a unit of this run; fields given as None keep their stored value (except error)."""
+        self._execute(
+            "INSERT INTO units (key, document, unit, state, prediction_id, result, error, run, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET document = COALESCE(excluded.document, units.document), "
+            "unit = COALESCE(excluded.unit, units.unit), state = excluded.state, "
+            "prediction_id = COALESCE(excluded.prediction_id, units.prediction_id), "
+            "result = COALESCE(excluded.result, units.result), error = excluded.error, run = excluded.run, updated = excluded.updated",
+            (key, document, unit, state, prediction_id, result, error, RUN_ID, time.time())
+        )
+
+    def documents(self):
+        """All documents with their unit counts per state, most recently updated first."""
+        documents = [dict(row) for row in self._execute("SELECT * FROM documents ORDER BY updated DESC")]
+        for document in documents:
+            document["units"] = {row["state"]: row["count"] for row in self._execute(
+                "SELECT state, COUNT(*) AS count FROM units WHERE document = ? GROUP BY state", (document["key"],)
+            )}
+        return documents
+
+    def prediction_counts(self):
+        """Counts per state of predictions not belonging to a document."""
+        return {row["state"]: row["count"] for row in self._execute(
+            "SELECT state, COUNT(*) AS count FROM units WHERE document IS NULL GROUP BY state"
+        )}
+
+    def prune(self, max_age_days):
+        """Forget entries not updated within max_age_days; returns number of removed units."""
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            removed = self._db.execute("DELETE FROM units WHERE updated < ?", (cutoff,)).rowcount
+            self._db.execute("DELETE FROM documents WHERE updated < ?", (cutoff,))
+        return removed
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show documents, pages and predictions recorded in the ai-ocr journal")
+    parser.add_argument("--journal", help="Journal database (default: <cache-dir>/journal.sqlite3)")
+    parser.add_argument("--cache-dir", default=default_cache_dir(), help="Result cache directory (default: $AI_OCR_CACHE_DIR or ~/.cache/ai_ocr_wrappers)")
+    parser.add_argument("--prune-days", type=float, help="Forget entries older than this many days")
+    args = parser.parse_args(argv)
+
+    path = journal_path(args)
+    if not os.path.exists(path):
+        print(f"No journal at {path}", file=sys.stderr)
+        return
+    journal = Journal(path)
+    if args.prune_days is not None:
+        print(f"Pruned {journal.prune(args.prune_days)} entries", file=sys.stderr)
+
+    for document in journal.documents():
+        units = ", ".join(f"{state}={document['units'][state]}" for state in STATES if state in document["units"])
+        updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(document["updated"]))
+        print(f"{document['state']:<10} {updated}  {document['input']} -> {document['output']}  ({units or 'no pages'})")
+    predictions = journal.prediction_counts()
+    if predictions:
+        print("predictions: " + ", ".join(f"{state}={predictions[state]}" for state in STATES if state in predictions))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Per-stage timing spans written as JSON lines.
+
+With `--metrics-file PATH` (or `$AI_OCR_METRICS_FILE`) every wrapper appends one
+JSON object per finished stage to PATH:
+
+    {"ts": 1760000000.12, "stage": "upload", "seconds": 0.84, "ok": true,
+     "wrapper": "ai-ocr nougat", "pid": 4711, "input": "paper.pdf", "bytes_out": 1843200}
+
+Stages: `read` (hashing inputs), `preprocess`, `render` (page pipeline),
+`encode` (base64 data URIs), `upload`, `create` (Replicate prediction),
+`queue` and `inference` (from Replicate's own timestamps), `wait` (submit to
+finish as seen by the client), `request` (DeepInfra round trip), `download`
+and `write`. Fields such as `bytes_in`, `bytes_out`, `prediction_id` and
+`model` are added where they are known.
+
+The file is shared process-wide like the journal: `configure_metrics(args)`
+opens it, `span()` and `record()` do nothing when it is not set. Several
+processes may append to the same file. `ai-ocr metrics FILE...` prints
+per-stage latency histograms of a batch.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0, 300.0)
+HISTOGRAM_WIDTH = 40
+STAGE_ORDER = ("read", "preprocess", "render", "encode", "upload", "create", "queue", "inference", "wait", "request", "download", "write")
+
+_sink = None
+
+def add_metrics_arguments(parser):
+    """Add --metrics-file argument to an argparse parser."""
+    parser.add_argument("--metrics-file", default=os.environ.get("AI_OCR_METRICS_FILE"), help="Append per-stage timings as JSON lines to this file (default: $AI_OCR_METRICS_FILE)")
+
+def configure_metrics(args):
+    """Open the metrics file selected by add_metrics_arguments() for this process."""
+    global _sink
+    path = args.metrics_file
+    if not path:
+        _sink = None
+        return None
+    path = os.path.expanduser(path)
+    if _sink is None or _sink.path != path:
+        try:
+            _sink = MetricsFile(path)
+        except OSError as e:
+            # Missing metrics must not stop the run itself
+            print(f"WARNING: Metrics disabled, cannot open {path}: {e}", file=sys.stderr)
+            _sink = None
+    return _sink
+
+def enabled():
+    """True when spans are being recorded."""
+    return _sink is not None
+
+class MetricsFile:
+    """Thread-safe JSON lines writer, one line per span."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.wrapper = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+
+    def emit(self, stage, started, seconds, ok, fields):
+        import json
+
+        entry = {"ts": round(started, 3), "stage": stage, "seconds": round(seconds, 4), "ok": ok, "wrapper": self.wrapper, "pid": os.getpid()}
+        entry.update((name, value) for name, value in fields.items() if value is not None)
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            # One write per line: appends from several processes do not interleave
+            self._file.write(line)
+            self._file.flush()
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Time the enclosed block as stage and yield its fields dict, so the block can
+    add what it learns (bytes_in, prediction_id, ...). Failing blocks are
+    recorded with ok false.
+    """
+    sink = _sink
+    if sink is None:
+        yield fields
+        return
+    started = time.time()
+    start = time.monotonic()
+    ok = True
+    try:
+        yield fields
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        try:
+            sink.emit(stage, started, time.monotonic() - start, ok, fields)
+        except Exception as e:
+            print(f"WARNING: Could not write metrics: {e}", file=sys.stderr)
+
+def record(stage, seconds, ok=True, started=None, **fields):
+    """Record a stage measured elsewhere (e.g. from API timestamps)."""
+    sink = _sink
+    if sink is None or seconds is None:
+        return
+    try:
+        sink.emit(stage, started if started is not None else time.time() - seconds, seconds, ok, fields)
+    except Exception as e:
+        print(f"WARNING: Could not write metrics: {e}", file=sys.stderr)
+
+def load(paths):
+    """Spans from JSON lines files; malformed lines are skipped."""
+    import json
+
+    spans = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    return spans
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f}{unit}" if unit == "B" else f"{count:.1f}{unit}"
+        count /= 1024.0
+
+def format_seconds(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+def quantile(ordered, q):
+    """Nearest-rank quantile (0-1) of a sorted list."""
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def print_report(spans, histograms=True, file=sys.stdout):
+    """Print per-stage counts, percentiles, bytes and latency histograms."""
+    stages = {}
+    for entry in spans:
+        stages.setdefault(entry.get("stage", "?"), []).append(entry)
+    if not stages:
+        print("No spans recorded", file=file)
+        return
+    order = [stage for stage in STAGE_ORDER if stage in stages] + sorted(set(stages) - set(STAGE_ORDER))
+    starts = [entry["ts"] for entry in spans if "ts" in entry]
+    ends = [entry["ts"] + entry.get("seconds", 0) for entry in spans if "ts" in entry]
+    predictions = {entry["prediction_id"] for entry in spans if entry.get("prediction_id")}
+    inputs = {entry["input"] for entry in spans if entry.get("input")}
+    if starts:
+        print(f"{len(spans)} spans, {len(inputs)} inputs, {len(predictions)} predictions, {max(ends) - min(starts):.1f}s wall time\n", file=file)
+    print(f"{'stage':<11} {'count':>6} {'failed':>6} {'total':>9} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'in':>9} {'out':>9}", file=file)
+    for stage in order:
+        entries = stages[stage]
+        seconds = sorted(entry.get("seconds", 0.0) for entry in entries)
+        failed = sum(1 for entry in entries if not entry.get("ok", True))
+        print(
+            f"{stage:<11} {len(entries):>6} {failed:>6} {format_seconds(sum(seconds)):>9} "
+            f"{format_seconds(quantile(seconds, 0.5)):>8} {format_seconds(quantile(seconds, 0.9)):>8} "
+            f"{format_seconds(quantile(seconds, 0.99)):>8} {format_seconds(seconds[-1]):>8} "
+            f"{format_bytes(sum(entry.get('bytes_in', 0) for entry in entries)):>9} "
+            f"{format_bytes(sum(entry.get('bytes_out', 0) for entry in entries)):>9}",
+            file=file
+        )
+    if not histograms:
+        return
+    for stage in order:
+        counts = [0] * (len(BUCKETS) + 1)
+        for entry in stages[stage]:
+            seconds = entry.get("seconds", 0.0)
+            counts[next((index for index, bound in enumerate(BUCKETS) if seconds < bound), len(BUCKETS))] += 1
+        used = [index for index, count in enumerate(counts) if count]
+        peak = max(counts)
+        print(f"\n{stage}", file=file)
+        for index in range(used[0], used[-1] + 1):
+            label = f"<{format_seconds(BUCKETS[index])}" if index < len(BUCKETS) else f">={format_seconds(BUCKETS[-1])}"
+            bar = "#" * max(1 if counts[index] else 0, round(HISTOGRAM_WIDTH * counts[index] / peak))
+            print(f"  {label:>7} {counts[index]:>6} {bar}", file=file)
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize --metrics-file JSON lines: per-stage counts, percentiles, bytes and latency histograms")
+    parser.add_argument("files", nargs="+", metavar="file", help="Metrics file(s) written with --metrics-file")
+    parser.add_argument("--wrapper", help="Only spans of wrappers whose name contains this")
+    parser.add_argument("--no-histograms", action="store_true", help="Only print the summary table")
+    args = parser.parse_args(argv)
+    try:
+        spans = load(args.files)
+    except OSError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.wrapper:
+        spans = [entry for entry in spans if args.wrapper in entry.get("wrapper", "")]
+    print_report(spans, not args.no_histograms)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""
+Fast PDF page count and metadata probe.
+
+The native backend reads only what it needs: the linearization dictionary at the
+start of the file if present, otherwise `startxref` at the end of the file, then
+single xref entries (classic tables or xref streams, following /Prev chains and
+object streams) for the catalog, page tree root and info dictionary. This takes
+a few small reads regardless of document size. pypdf and `pdfinfo` remain as
+fallbacks, and the backend that succeeded is tried first next time.
+
+Results are memoized in-process and persisted under `<cache-dir>/pdfprobe/`,
+keyed by a quick file fingerprint (size, mtime and hash of head and tail bytes).
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import zlib
+
+from ai_ocr.cache import default_cache_dir
+from ai_ocr.common import verbose_print
+
+FINGERPRINT_BLOCK = 64 * 1024
+TAIL_SIZE = 4096
+OBJECT_READ_SIZE = 8192
+MAX_OBJECT_READ_SIZE = 64 * 1024 * 1024
+MAX_XREF_SECTIONS = 256
+
+INFO_KEYS = ["Title", "Author", "Subject", "Keywords", "Creator", "Producer", "CreationDate", "ModDate"]
+
+class PDFProbeError(Exception):
+    """Raised when the native probe cannot understand the file structure."""
+
+_REF_RE = r"\s+(\d+)\s+(\d+)\s+R"
+
+def _ref(dictionary, key):
+    """Return object number of indirect reference /key N G R, or None."""
+    match = re.search(rb"/" + key.encode() + _REF_RE.encode(), dictionary)
+    return int(match.group(1)) if match else None
+
+def _int(dictionary, key):
+    """Return direct integer value of /key, or None."""
+    match = re.search(rb"/" + key.encode() + rb"\s+(-?\d+)\b(?!\s+\d+\s+R)", dictionary)
+    return int(match.group(1)) if match else None
+
+def _array(dictionary, key):
+    """Return integers of direct array /key [ ... ], or None."""
+    match = re.search(rb"/" + key.encode() + rb"\s*\[([^\]]*)\]", dictionary)
+    return [int(x) for x in match.group(1).split()] if match else None
+
+def _dict_body(data, start=0):
+    """Return the outermost << ... >> dictionary starting at or after start."""
+    begin = data.find(b"<<", start)
+    if begin < 0:
+        raise PDFProbeError("dictionary not found")
+    depth = 0
+    i = begin
+    while i < len(data) - 1:
+        pair = data[i:i + 2]
+        if pair == b"<<":
+            depth += 1
+            i += 2
+            continue
+        if pair == b">>":
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return data[begin:i], i
+            continue
+        if data[i:i + 1] == b"(":
+            # Skip literal strings, they may contain unbalanced brackets
+            nesting = 0
+            while i < len(data):
+                c = data[i:i + 1]
+                if c == b"\\":
+                    i += 2
+                    continue
+                if c == b"(":
+                    nesting += 1
+                elif c == b")":
+                    nesting -= 1
+                    if nesting == 0:
+                        break
+                i += 1
+        i += 1
+    raise PDFProbeError("unterminated dictionary")
+
+def _decode_pdf_string(raw):
+    """Decode a PDF literal (...) or hex <...> string to text."""
+    if raw.startswith(b"<"):
+        data = bytes.fromhex(raw[1:-1].decode("ascii").replace(" ", "").ljust(2, "0"))
+    else:
+        out = bytearray()
+        body = raw[1:-1]
+        escapes = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+        i = 0
+        while i < len(body):
+            c = body[i:i + 1]
+            if c == b"\\" and i + 1 < len(body):
+                nxt = body[i + 1:i + 2]
+                if nxt in escapes:
+                    out += escapes[nxt]
+                    i += 2
+                elif nxt.isdigit():
+                    octal = re.match(rb"[0-7]{1,3}", body[i + 1:i + 4]).group(0)
+                    out.append(int(octal, 8) & 0xFF)
+                    i += 1 + len(octal)
+                elif nxt in b"\r\n":
+                    i += 2
+                else:
+                    out += nxt
+                    i += 2
+            else:
+                out += c
+                i += 1
+        data = bytes(out)
+    if data.startswith(b"\xfe\xff"):
+        return data[2:].decode("utf-16-be", errors="replace")
+    return data.decode("latin-1")
+
+def _png_unpredict(data, columns):
+    """Undo PNG row predictors (xref streams use /Predictor 12)."""
+    row_size = columns + 1
+    rows = []
+    previous = bytearray(columns)
+    for offset in range(0, len(data) - columns, row_size):
+        kind = data[offset]
+        row = bytearray(data[offset + 1:offset + row_size])
+        if kind == 2:
+            for i in range(columns):
+                row[i] = (row[i] + previous[i]) & 0xFF
+        elif kind == 1:
+            for i in range(1, columns):
+                row[i] = (row[i] + row[i - 1]) & 0xFF
+        elif kind != 0:
+            raise PDFProbeError(f"unsupported PNG predictor {kind}")
+        rows.append(bytes(row))
+        previous = row
+    return b"".join(rows)
+
+class _NativeReader:
+    """Minimal random-access reader of PDF cross-reference structures."""
+
+    def __init__(self, f, size):
+        self.f = f
+        self.size = size
+        self.sections = []
+        self.objstm_cache = {}
+
+    def read_at(self, offset, length):
+        self.f.seek(offset)
+        return self.f.read(length)
+
+    def load_xref_chain(self):
+        """Locate startxref and read trailers of all xref sections (newest first)."""
+        tail = self.read_at(max(0, self.size - TAIL_SIZE), TAIL_SIZE)
+        position = tail.rfind(b"startxref")
+        if position < 0:
+            raise PDFProbeError("startxref not found")
+        offset = int(tail[position + 9:].split()[0])
+        seen = set()
+        pending = [offset]
+        while pending and len(self.sections) < MAX_XREF_SECTIONS:
+            offset = pending.pop(0)
+            if offset in seen:
+                continue
+            seen.add(offset)
+            section = self._read_section(offset)
+            self.sections.append(section)
+            trailer = section["trailer"]
+            for key in ("XRefStm", "Prev"):
+                value = _int(trailer, key)
+                if value is not None:
+                    pending.append(value)
+        return self.sections[0]["trailer"]
+
+    def _read_section(self, offset):
+        head = self.read_at(offset, 64)
+        if head.lstrip().startswith(b"xref"):
+            return self._read_table_section(offset)
+        return self._read_stream_section(offset)
+
+    def _read_table_section(self, offset):
+        """Record subsection positions of a classic xref table and read its trailer."""
+        self.f.seek(offset)
+        self.f.readline()
+        subsections = []
+        while True:
+            line_start = self.f.tell()
+            line = self.f.readline()
+            if not line:
+                raise PDFProbeError("unexpected end of xref table")
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith(b"trailer"):
+                data = self.read_at(line_start, OBJECT_READ_SIZE)
+                trailer, _ = _dict_body(data)
+                return {"kind": "table", "subsections": subsections, "trailer": trailer}
+            parts = stripped.split()
+            first, count = int(parts[0]), int(parts[1])
+            # Entries are exactly 20 bytes each, so single entries can be read by position
+            entries_offset = self.f.tell()
+            subsections.append((first, count, entries_offset))
+            self.f.seek(entries_offset + 20 * count)
+
+    def _read_stream_section(self, offset):
+        """Read and decode an xref stream section."""
+        dictionary, data = self._read_stream_object(offset)
+        widths = _array(dictionary, "W")
+        size = _int(dictionary, "Size")
+        index = _array(dictionary, "Index") or [0, size]
+        if not widths:
+            raise PDFProbeError("xref stream without /W")
+        return {"kind": "stream", "widths": widths, "index": index, "data": data, "trailer": dictionary}
+
+    def _read_stream_object(self, offset):
+        """Return (dictionary, decoded stream data) of the stream object at offset."""
+        head = self.read_at(offset, OBJECT_READ_SIZE)
+        dictionary, end = _dict_body(head)
+        match = re.compile(rb"\s*stream\r?\n").match(head, end)
+        if not match:
+            raise PDFProbeError("stream keyword not found")
+        length = _int(dictionary, "Length")
+        if length is None:
+            length_ref = _ref(dictionary, "Length")
+            if length_ref is None:
+                raise PDFProbeError("stream without /Length")
+            length = int(self.object_body(length_ref).strip().split()[0])
+        data = self.read_at(offset + match.end(), length)
+        filters = re.findall(rb"/(\w+Decode)", dictionary.split(b"/DecodeParms")[0])
+        if filters and filters != [b"FlateDecode"]:
+            raise PDFProbeError(f"unsupported stream filter {filters}")
+        if filters:
+            data = zlib.decompress(data)
+        predictor = _int(dictionary, "Predictor")
+        if predictor and predictor >= 10:
+            data = _png_unpredict(data, _int(dictionary, "Columns") or 1)
+        return dictionary, data
+
+    def find_entry(self, objnum):
+        """Return ('offset', pos) or ('objstm', stream_objnum, index) for objnum."""
+        for section in self.sections:
+            if section["kind"] == "table":
+                for first, count, entries_offset in section["subsections"]:
+                    if first <= objnum < first + count:
+                        entry = self.read_at(entries_offset + 20 * (objnum - first), 20).split()
+                        if entry[2] == b"n":
+                            return ("offset", int(entry[0]))
+                        return None
+            else:
+                widths = section["widths"]
+                row_size = sum(widths)
+                index = section["index"]
+                row = 0
+                for i in range(0, len(index), 2):
+                    first, count = index[i], index[i + 1]
+                    if first <= objnum < first + count:
+                        start = (row + objnum - first) * row_size
+                        fields = []
+                        position = start
+                        for width in widths:
+                            fields.append(int.from_bytes(section["data"][position:position + width], "big") if width else None)
+                            position += width
+                        kind = 1 if fields[0] is None else fields[0]
+                        if kind == 1:
+                            return ("offset", fields[1])
+                        if kind == 2:
+                            return ("objstm", fields[1], fields[2])
+                        return None
+                    row += count
+        raise PDFProbeError(f"object {objnum} not in xref")
+
+    def object_body(self, objnum, read_size=OBJECT_READ_SIZE):
+        """Return raw bytes of object objnum (following its `N G obj` header)."""
+        entry = self.find_entry(objnum)
+        if entry is None:
+            raise PDFProbeError(f"object {objnum} is free")
+        if entry[0] == "offset":
+            data = self.read_at(entry[1], read_size)
+            match = re.match(rb"\s*\d+\s+\d+\s+obj", data)
+            if not match:
+                raise PDFProbeError(f"object {objnum} not found at offset {entry[1]}")
+            return data[match.end():]
+        stream_objnum, index = entry[1], entry[2]
+        if stream_objnum not in self.objstm_cache:
+            stream_entry = self.find_entry(stream_objnum)
+            if not stream_entry or stream_entry[0] != "offset":
+                raise PDFProbeError(f"object stream {stream_objnum} not found")
+            self.objstm_cache[stream_objnum] = self._read_stream_object(stream_entry[1])
+        dictionary, data = self.objstm_cache[stream_objnum]
+        count = _int(dictionary, "N")
+        first = _int(dictionary, "First")
+        header = data[:first].split()
+        offsets = {int(header[i]): int(header[i + 1]) for i in range(0, 2 * count, 2)}
+        return data[first + offsets[objnum]:]
+
+    def object_dict(self, objnum):
+        """Return the dictionary of object objnum, reading more for large ones (e.g. flat /Kids)."""
+        read_size = OBJECT_READ_SIZE
+        while True:
+            body = self.object_body(objnum, read_size)
+            try:
+                dictionary, _ = _dict_body(body)
+                return dictionary
+            except PDFProbeError:
+                entry = self.find_entry(objnum)
+                # Only objects read directly from the file can have been cut short
+                if entry[0] != "offset" or entry[1] + read_size >= self.size or read_size >= MAX_OBJECT_READ_SIZE:
+                    raise
+                read_size *= 8
+
+def _linearized_page_count(head, size):
+    """Page count from linearization dictionary, when it is still valid for this file."""
+    match = re.search(rb"<<[^>]*/Linearized[^>]*>>", head[:2048])
+    if not match:
+        return None
+    dictionary = match.group(0)
+    if _int(dictionary, "L") != size:
+        # Incrementally updated after linearization, page count may have changed
+        return None
+    return _int(dictionary, "N")
+
+def _parse_info(reader, info_ref):
+    """Extract common /Info entries as text."""
+    info = {}
+    data = reader.object_dict(info_ref)
+    for key in INFO_KEYS:
+        match = re.search(rb"/" + key.encode() + rb"\s*(\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>)", data, re.S)
+        if match:
+            info[key] = _decode_pdf_string(match.group(1))
+    return info
+
+def probe_pdf_native(pdf_filename, verbose=False):
+    """Probe page count and metadata from trailer/xref structures only."""
+    size = os.path.getsize(pdf_filename)
+    with open(pdf_filename, "rb") as f:
+        head = f.read(2048)
+        version = re.match(rb"%PDF-(\d\.\d)", head)
+        if not version:
+            raise PDFProbeError("missing %PDF header")
+        reader = _NativeReader(f, size)
+        trailer = reader.load_xref_chain()
+        encrypted = b"/Encrypt" in trailer
+        pages = _linearized_page_count(head, size)
+        if pages is None:
+            root = _ref(trailer, "Root")
+            if root is None:
+                raise PDFProbeError("trailer without /Root")
+            pages_ref = _ref(reader.object_dict(root), "Pages")
+            if pages_ref is None:
+                raise PDFProbeError("catalog without /Pages")
+            pages_dict = reader.object_dict(pages_ref)
+            pages = _int(pages_dict, "Count")
+            if pages is None and _ref(pages_dict, "Count") is not None:
+                pages = int(reader.object_body(_ref(pages_dict, "Count")).split()[0])
+        if pages is None or pages < 0:
+            raise PDFProbeError("page count not found")
+        info = {}
+        info_ref = _ref(trailer, "Info")
+        if info_ref is not None and not encrypted:
+            try:
+                info = _parse_info(reader, info_ref)
+            except PDFProbeError as e:
+                verbose_print(f"DEBUG: native probe could not read /Info: {e}", verbose)
+    return {"pages": pages, "pdf_version": version.group(1).decode(), "encrypted": encrypted, "info": info}
+
+def probe_pdf_with_pypdf(pdf_filename, verbose=False):
+    """Probe page count and metadata using pypdf (parses the page tree)."""
+    from pypdf import PdfReader
+    reader = PdfReader(pdf_filename)
+    metadata = reader.metadata or {}
+    info = {key: str(metadata.get(f"/{key}")) for key in INFO_KEYS if metadata.get(f"/{key}") is not None}
+    return {"pages": len(reader.pages), "pdf_version": reader.pdf_header.replace("%PDF-", ""),
+            "encrypted": reader.is_encrypted, "info": info}
+
+def probe_pdf_with_pdfinfo(pdf_filename, verbose=False):
+    """Probe page count and metadata using the pdfinfo command-line tool."""
+    result = subprocess.run(['pdfinfo', pdf_filename], capture_output=True, text=True, check=True)
+    fields = {}
+    for line in result.stdout.split('\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)
+            fields[key.strip()] = value.strip()
+    if "Pages" not in fields:
+        raise PDFProbeError("pdfinfo did not report pages")
+    return {
+        "pages": int(fields["Pages"]),
+        "pdf_version": fields.get("PDF version"),
+        "encrypted": fields.get("Encrypted", "no").startswith("yes"),
+        "info": {key: fields[key] for key in INFO_KEYS if fields.get(key)},
+    }
+
+PROBE_BACKENDS = {
+    "native": probe_pdf_native,
+    "pypdf": probe_pdf_with_pypdf,
+    "pdfinfo": probe_pdf_with_pdfinfo,
+}
+
+# Backend that last succeeded, tried first next time
+_preferred_backend = None
+_memo = {}
+
+def file_fingerprint(pdf_filename):
+    """Quick content fingerprint: size, mtime and sha256 of the first and last 64 KiB."""
+    stat = os.stat(pdf_filename)
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(pdf_filename, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BLOCK))
+        if stat.st_size > FINGERPRINT_BLOCK:
+            f.seek(max(FINGERPRINT_BLOCK, stat.st_size - FINGERPRINT_BLOCK))
+            digest.update(f.read(FINGERPRINT_BLOCK))
+    return digest.hexdigest()
+
+def _cache_path(cache_dir, fingerprint):
+    return os.path.join(cache_dir, "pdfprobe", fingerprint[:2], fingerprint + ".json")
+
+def probe_pdf(pdf_filename, verbose=False, cache_dir=None, use_cache=True):
+    """
+    Return {"pages", "pdf_version", "encrypted", "info", "backend"} for pdf_filename.
+
+    Raises ValueError when no backend can read the file.
+    """
+    global _preferred_backend
+    fingerprint = file_fingerprint(pdf_filename)
+    cache_file = _cache_path(cache_dir or default_cache_dir(), fingerprint)
+    if use_cache:
+        if fingerprint in _memo:
+            return _memo[fingerprint]
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                _memo[fingerprint] = json.load(f)
+            verbose_print(f"DEBUG: Probe cache hit for {pdf_filename}", verbose)
+            return _memo[fingerprint]
+        except (OSError, ValueError):
+            pass
+
+    names = list(PROBE_BACKENDS)
+    if _preferred_backend in names:
+        names.remove(_preferred_backend)
+        names.insert(0, _preferred_backend)
+    errors = []
+    for name in names:
+        verbose_print(f"DEBUG: Trying {name} probe for {pdf_filename}", verbose)
+        try:
+            result = PROBE_BACKENDS[name](pdf_filename, verbose)
+        except Exception as e:
+            verbose_print(f"DEBUG: {name} probe failed: {str(e)}", verbose)
+            errors.append(f"{name}: {e}")
+            continue
+        _preferred_backend = name
+        result["backend"] = name
+        break
+    else:
+        raise ValueError(f"Could not probe {pdf_filename}: {'; '.join(errors)}")
+
+    if use_cache:
+        _memo[fingerprint] = result
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file), prefix=".tmp-")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, cache_file)
+        except OSError as e:
+            verbose_print(f"DEBUG: Could not write probe cache: {e}", verbose)
+    return result
+
+def get_no_of_pages_pdf(pdf_filename, verbose=False, cache_dir=None):
+    """Get number of pages, or None if the file cannot be probed (probe cache in cache_dir)."""
+    verbose_print(f"DEBUG: Getting page count for {pdf_filename}", verbose)
+    try:
+        no_of_pages = probe_pdf(pdf_filename, verbose, cache_dir)["pages"]
+    except (OSError, ValueError) as e:
+        verbose_print(f"DEBUG: {str(e)}", verbose)
+        no_of_pages = None
+    verbose_print(f"VERBOSE: Page count: {no_of_pages}", verbose)
+    return no_of_pages
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Print PDF page count and metadata as JSON")
+    parser.add_argument("inputs", nargs="+", metavar="input", help="Input PDF file(s)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
+    parser.add_argument("--cache-dir", default=default_cache_dir(), help="Result cache directory holding the probe cache (default: $AI_OCR_CACHE_DIR or ~/.cache/ai_ocr_wrappers)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the probe cache")
+    args = parser.parse_args(argv)
+    failed = 0
+    for input_file in args.inputs:
+        try:
+            result = probe_pdf(input_file, args.verbose, os.path.expanduser(args.cache_dir), use_cache=not args.no_cache)
+        except (OSError, ValueError) as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            failed += 1
+            continue
+        print(json.dumps({"file": input_file, **result}, ensure_ascii=False))
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
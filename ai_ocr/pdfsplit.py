@@ -0,0 +1,181 @@
+"""
+Page-range sharding of PDFs and stitching of the per-shard Markdown.
+
+Models like marker process a document on a single worker, so long documents are
+split locally into consecutive page ranges that run as concurrent predictions:
+
+    ranges = shard_ranges(600)                  # [(1, 38), (39, 76), ...]
+    shards = split_pdf("manual.pdf", ranges, tmpdir)
+    ...
+    markdown = stitch_markdown([(first, text), ...])
+
+Splitting uses pypdf (parsing the document once for all shards) or the `qpdf`
+command-line tool, and the backend that worked is tried first next time.
+"""
+
+import math
+import os
+import re
+import subprocess
+
+from ai_ocr.common import verbose_print
+
+# Documents shorter than this are converted in one prediction by --shard-pages auto
+AUTO_SHARD_MIN_PAGES = 50
+# Smallest shard auto mode creates; each prediction pays model start-up once
+MIN_SHARD_PAGES = 20
+# Most shards auto mode creates for one document
+MAX_SHARDS = 16
+
+# Name of the backend that last split successfully, tried first next time
+_preferred_backend = None
+
+def parse_shard_pages(value):
+    """argparse type for --shard-pages: 'auto', 0 (never shard) or pages per shard."""
+    if value == "auto":
+        return value
+    try:
+        pages = int(value)
+    except ValueError:
+        pages = -1
+    if pages < 0:
+        import argparse
+
+        raise argparse.ArgumentTypeError(f"expected 'auto' or a page count, got {value!r}")
+    return pages
+
+def shard_ranges(pages, shard_pages="auto"):
+    """
+    Split pages 1..pages into consecutive (first, last) ranges.
+
+    With "auto", documents below AUTO_SHARD_MIN_PAGES stay whole, and larger ones
+    get at most MAX_SHARDS shards of at least MIN_SHARD_PAGES pages. A shard_pages
+    of 0 never shards. Shards are balanced to differ by at most one page.
+    """
+    if shard_pages == "auto":
+        if pages < AUTO_SHARD_MIN_PAGES:
+            return [(1, pages)]
+        shard_pages = max(MIN_SHARD_PAGES, math.ceil(pages / MAX_SHARDS))
+    if not shard_pages or shard_pages >= pages:
+        return [(1, pages)]
+    count = math.ceil(pages / shard_pages)
+    base, extra = divmod(pages, count)
+    ranges = []
+    first = 1
+    for index in range(count):
+        last = first + base + (index < extra) - 1
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+def split_with_pypdf(pdf_filename, ranges, paths):
+    """Write each page range to its path with pypdf."""
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(pdf_filename)
+    for (first, last), path in zip(ranges, paths):
+        writer = PdfWriter()
+        for index in range(first - 1, last):
+            writer.add_page(reader.pages[index])
+        with open(path, "wb") as f:
+            writer.write(f)
+
+def split_with_qpdf(pdf_filename, ranges, paths):
+    """Write each page range to its path with the qpdf command-line tool."""
+    for (first, last), path in zip(ranges, paths):
+        subprocess.run(
+            ['qpdf', '--empty', '--pages', pdf_filename, f'{first}-{last}', '--', path],
+            check=True, capture_output=True
+        )
+
+SPLIT_BACKENDS = {
+    "pypdf": split_with_pypdf,
+    "qpdf": split_with_qpdf,
+}
+
+def split_pdf(pdf_filename, ranges, out_dir, verbose=False):
+    """
+    Write one PDF per (first, last) page range into out_dir.
+
+    Returns the shard paths in range order; raises RuntimeError when no
+    backend is available or able to split the file.
+    """
+    global _preferred_backend
+    base = os.path.splitext(os.path.basename(pdf_filename))[0]
+    paths = [os.path.join(out_dir, f"{base}-pages-{first}-{last}.pdf") for first, last in ranges]
+
+    names = list(SPLIT_BACKENDS)
+    if _preferred_backend in names:
+        names.remove(_preferred_backend)
+        names.insert(0, _preferred_backend)
+    errors = []
+    for name in names:
+        verbose_print(f"DEBUG: Splitting {pdf_filename} into {len(ranges)} shards with {name}", verbose)
+        try:
+            SPLIT_BACKENDS[name](pdf_filename, ranges, paths)
+        except Exception as e:
+            verbose_print(f"DEBUG: {name} split failed: {str(e)}", verbose)
+            errors.append(f"{name}: {e}")
+            continue
+        _preferred_backend = name
+        return paths
+    raise RuntimeError(f"Could not split {pdf_filename} (install pypdf or qpdf): {'; '.join(errors)}")
+
+# A fenced code block (left alone: "# ..." is a comment there) or an ATX heading
+_HEADING_RE = re.compile(r"^ {0,3}(`{3,}|~{3,}).*?(?:^ {0,3}\1[`~]*[ \t]*$|\Z)|^(#{1,6})(?=\s)", re.M | re.S)
+# marker names extracted images after their 0-based page, e.g. _page_3_Picture_1.jpeg
+_PAGE_IMAGE_RE = re.compile(r"_page_(\d+)_")
+_SENTENCE_END = ".!?:;|)]}\"'*`>"
+
+def _heading_levels(text):
+    return [len(match.group(2)) for match in _HEADING_RE.finditer(text) if match.group(2)]
+
+def _body_heading_level(levels):
+    """Top heading level of the document body, not counting a lone title heading."""
+    top = min(levels)
+    deeper = [level for level in levels if level > top]
+    if levels.count(top) == 1 and deeper:
+        return min(deeper)
+    return top
+
+def _shift_headings(text, offset):
+    if not offset:
+        return text
+    return _HEADING_RE.sub(lambda match: "#" * min(6, len(match.group(2)) + offset) if match.group(2) else match.group(0), text)
+
+def _continues_paragraph(previous, text):
+    """True when previous ends mid-sentence and text starts in lower case (split paragraph)."""
+    last_line = previous.rstrip().rsplit("\n", 1)[-1]
+    if not last_line or last_line[-1] in _SENTENCE_END or last_line.lstrip()[:1] in "#|-*>":
+        return False
+    return text[:1].islower()
+
+def stitch_markdown(shards):
+    """
+    Join [(first_page, markdown), ...] of consecutive shards into one document.
+
+    Shards after the first lack the title page, so marker tends to promote their
+    chapter headings by a level; they are demoted to the body heading level of
+    the first shard with headings. Image names are renumbered from shard-relative
+    to document pages, and a paragraph cut at a shard boundary is rejoined.
+    """
+    body_level = None
+    merged = ""
+    for first_page, text in shards:
+        text = text.strip("\n")
+        text = _PAGE_IMAGE_RE.sub(lambda match: f"_page_{int(match.group(1)) + first_page - 1}_", text)
+        levels = _heading_levels(text)
+        if levels:
+            if body_level is None:
+                body_level = _body_heading_level(levels)
+            else:
+                text = _shift_headings(text, max(0, body_level - min(levels)))
+        if not text:
+            continue
+        if not merged:
+            merged = text
+        elif _continues_paragraph(merged, text):
+            merged = merged.rstrip() + " " + text
+        else:
+            merged += "\n\n" + text
+    return merged + "\n" if merged else ""
@@ -0,0 +1,190 @@
+"""
+Pipelined PDF -> page image -> OCR processing.
+
+Pages are rendered by `ai_ocr.rasterize.render_pages` while already rendered
+pages are OCR'd remotely by up to `ocr_jobs` concurrent requests. Completed
+pages go through a reorder buffer, so the merged Markdown is appended to
+`<output>.partial` strictly in page order as soon as each next page is ready,
+and renamed to the final output once all pages succeeded.
+
+With a journal (ai_ocr/journal.py) every page's state and text is recorded, so
+re-running an interrupted or partly failed document renders and OCRs only the
+pages that are not done yet. With a PageDeduplicator (ai_ocr/dedup.py) pages
+that repeat an already OCR'd page reuse its text, and with blank_ink blank
+pages (ai_ocr/blankpage.py) are answered without OCR. With a TextLayerRouter
+(ai_ocr/textlayer.py) pages with a usable embedded text layer are neither
+rendered nor OCR'd.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_ocr.blankpage import DEFAULT_BLANK_TEXT, is_blank_page
+from ai_ocr.common import verbose_print
+from ai_ocr.pdfprobe import get_no_of_pages_pdf
+from ai_ocr.rasterize import DEFAULT_DPI, render_pages
+
+def page_separator(page_no):
+    """Markdown comment marking the start of a page in merged output."""
+    return f"<!-- page {page_no} -->\n\n"
+
+class ReorderBuffer:
+    """Collects out-of-order page results and writes them to a file in page order."""
+
+    def __init__(self, output_file, first_page):
+        self.output = open(output_file, "w", encoding="utf-8")
+        self.next_page = first_page
+        self.pending = {}
+        self.failed = {}
+        self.written = 0
+        self.first_write_at = None
+        self.lock = threading.Lock()
+
+    def add(self, page_no, text=None, error=None):
+        """Store a page result and flush all contiguous pages that are ready."""
+        with self.lock:
+            if error is not None:
+                self.failed[page_no] = error
+                return
+            self.pending[page_no] = text
+            while self.next_page in self.pending and not self.failed:
+                text = self.pending.pop(self.next_page)
+                if self.written:
+                    self.output.write("\n\n")
+                self.output.write(page_separator(self.next_page))
+                self.output.write(text.strip() + "\n")
+                self.output.flush()
+                if self.first_write_at is None:
+                    self.first_write_at = time.monotonic()
+                self.written += 1
+                self.next_page += 1
+
+    def close(self):
+        self.output.close()
+
+def missing_ranges(first_page, last_page, done_pages):
+    """Consecutive (first, last) ranges of pages in first..last that are not in done_pages."""
+    ranges = []
+    for page_no in range(first_page, last_page + 1):
+        if page_no in done_pages:
+            continue
+        if ranges and ranges[-1][1] == page_no - 1:
+            ranges[-1] = (ranges[-1][0], page_no)
+        else:
+            ranges.append((page_no, page_no))
+    return ranges
+
+def ocr_pdf_pages(pdf_filename, final_output_file, ocr_page, first_page=None, last_page=None,
+                  dpi=DEFAULT_DPI, ocr_jobs=8, render_jobs=None, verbose=False, journal=None, document=None,
+                  scale_to=None, dedup=None, blank_ink=0.0, blank_text=DEFAULT_BLANK_TEXT, text_layer=None, cache_dir=None):
+    """
+    OCR pages of pdf_filename with ocr_page(png_path, page_no) -> text, pipelined.
+
+    Pages are taken without OCR where possible: from an earlier run (journal,
+    under the document key), the embedded text layer (text_layer), blank_text
+    for pages with at most blank_ink ink coverage, and repeated pages (dedup).
+    scale_to renders pages to that longest side in pixels instead of at dpi;
+    the page count probe is cached in cache_dir.
+    Returns True when all pages succeeded and final_output_file was written.
+    """
+    first_page = first_page or 1
+    resumed = {}
+    if journal is not None:
+        resumed = {int(page): text for page, text in journal.start_document(document, pdf_filename, final_output_file).items()}
+    ranges = [(first_page, last_page)]
+    local = {}
+    if (resumed or text_layer is not None) and last_page is None:
+        last_page = get_no_of_pages_pdf(pdf_filename, verbose, cache_dir)
+        if not isinstance(last_page, int):
+            raise ValueError(f"Could not determine page count for {pdf_filename}")
+    if resumed:
+        resumed = {page_no: text for page_no, text in resumed.items() if first_page <= page_no <= last_page}
+        print(f"RESUMING: {pdf_filename}: {len(resumed)} pages done in an earlier run", file=sys.stderr)
+    if text_layer is not None:
+        local = text_layer.extract(pdf_filename, first_page, last_page, skip=resumed)
+    if resumed or local:
+        ranges = missing_ranges(first_page, last_page, {**resumed, **local})
+
+    partial_file = final_output_file + ".partial"
+    pages_dir = tempfile.mkdtemp(prefix="ai_ocr_pages_")
+    buffer = ReorderBuffer(partial_file, first_page)
+    start = time.monotonic()
+    page_count = len(resumed) + len(local)
+    deduplicated = []
+    blank = []
+    for page_no in sorted(resumed):
+        buffer.add(page_no, resumed[page_no])
+
+    def record(page_no, state, text=None, error=None):
+        if journal is not None:
+            journal.set_unit(f"{document}:{page_no}", state, document, str(page_no), result=text, error=error)
+
+    for page_no in sorted(local):
+        record(page_no, "done", local[page_no])
+        buffer.add(page_no, local[page_no])
+
+    def process(page_no, png_path):
+        record(page_no, "in_flight")
+        try:
+            if blank_ink and is_blank_page(png_path, blank_ink):
+                blank.append(page_no)
+                verbose_print(f"Page {page_no} is blank, OCR skipped ({time.monotonic() - start:.1f}s)", verbose)
+                record(page_no, "done", blank_text)
+                buffer.add(page_no, blank_text)
+                return
+            if dedup is not None:
+                text, repeated = dedup.ocr(png_path, pdf_filename, lambda: ocr_page(png_path, page_no))
+            else:
+                text, repeated = ocr_page(png_path, page_no), False
+        except (Exception, SystemExit) as e:
+            print(f"ERROR: OCR of page {page_no} failed: {e}", file=sys.stderr)
+            buffer.add(page_no, error=str(e) or type(e).__name__)
+            record(page_no, "failed", error=str(e) or type(e).__name__)
+            return
+        if repeated:
+            deduplicated.append(page_no)
+            verbose_print(f"Page {page_no} repeats an earlier page, OCR skipped ({time.monotonic() - start:.1f}s)", verbose)
+        else:
+            verbose_print(f"Page {page_no} OCR done ({time.monotonic() - start:.1f}s)", verbose)
+        record(page_no, "done", text)
+        buffer.add(page_no, text)
+
+    def rendered_pages():
+        for range_first, range_last in ranges:
+            yield from render_pages(pdf_filename, range_first, range_last, dpi,
+                                    render_jobs, output_dir=pages_dir, verbose=verbose, scale_to=scale_to, cache_dir=cache_dir)
+
+    try:
+        with ThreadPoolExecutor(max_workers=ocr_jobs) as executor:
+            # Rendering continues in the background while earlier pages are OCR'd
+            for page_no, png_path in rendered_pages():
+                verbose_print(f"Page {page_no} rendered ({time.monotonic() - start:.1f}s)", verbose)
+                page_count += 1
+                executor.submit(process, page_no, png_path)
+    finally:
+        buffer.close()
+        shutil.rmtree(pages_dir, ignore_errors=True)
+
+    elapsed = time.monotonic() - start
+    first_page_after = f"{buffer.first_write_at - start:.1f}s" if buffer.first_write_at else "n/a"
+    skipped_pages = f", deduplicated={len(deduplicated)}" if dedup is not None else ""
+    if text_layer is not None:
+        skipped_pages += f", text_layer={len(local)}"
+    print(
+        f"PIPELINE: {pdf_filename}: {buffer.written}/{page_count} pages in {elapsed:.1f}s, "
+        f"first page after {first_page_after}, failed={len(buffer.failed)}, blank={len(blank)}{skipped_pages}",
+        file=sys.stderr
+    )
+
+    if journal is not None:
+        journal.finish_document(document, not buffer.failed)
+    if buffer.failed:
+        print(f"ERROR: Failed pages {sorted(buffer.failed)}, partial output kept in {partial_file}", file=sys.stderr)
+        return False
+    os.replace(partial_file, final_output_file)
+    return True
@@ -0,0 +1,647 @@
+"""
+Non-blocking Replicate prediction scheduler.
+
+`replicate.run()` holds a thread for the whole queue, boot and inference time of
+every prediction. The scheduler instead creates predictions up front and tracks
+all of them from one background poller thread, resolving a `Future` per
+prediction as soon as it finishes, so a single process can keep hundreds of
+jobs in flight.
+
+The poller sweeps `GET /v1/predictions` (newest first, one request covers a whole
+page of predictions) instead of fetching each prediction, and only fetches the
+full prediction once it reached a terminal state. Predictions that fall off the
+swept pages are fetched individually with backoff. With `--webhook-url` a local
+receiver gets signed completion webhooks and the sweep becomes a slow safety net.
+
+Prediction creation goes through `retry_call()` and the shared "replicate" rate
+limit; uploads, sweeps and GETs draw from the separate "replicate-api" bucket
+(see ai_ocr/resilience.py). Before a failed create is retried, the recent
+predictions are checked for one using the same freshly uploaded input files, so
+a create that failed after all started the prediction is not run twice.
+
+Created predictions are recorded in the journal (see ai_ocr/journal.py): when
+the same prediction is submitted again after an interrupted run, the scheduler
+re-attaches to the recorded prediction instead of creating a new one, as long as
+it did not fail and its output files have not expired yet.
+
+The API base URL follows the replicate client (`$REPLICATE_BASE_URL`), which is
+how the local fake API in tests/fakes is used.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+
+from ai_ocr.batch import print_batch_summary
+from ai_ocr.common import verbose_print
+from ai_ocr.journal import RUN_ID, add_journal_arguments, configure_journal, current_journal, prediction_key
+from ai_ocr.metrics import record, span
+from ai_ocr.resilience import (
+    add_resilience_arguments, configure_resilience, error_status, get_rate_limiter, retry_after_seconds, retry_call
+)
+from ai_ocr.upload import open_for_upload
+
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+DEFAULT_MAX_IN_FLIGHT = 256
+DEFAULT_POLL_INTERVAL = 1.0
+# Individual GET backoff for predictions not covered by the list sweep
+MAX_POLL_INTERVAL = 10.0
+MAX_SWEEP_PAGES = 5
+# Replicate deletes output files of API predictions after an hour; leave a margin
+OUTPUT_REUSE_SECONDS = 50 * 60
+# With webhooks the sweep only catches lost deliveries
+WEBHOOK_SWEEP_INTERVAL = 30.0
+
+class PredictionError(Exception):
+    """A prediction finished as failed or canceled."""
+
+    def __init__(self, prediction_id, status, error=None):
+        super().__init__(f"Prediction {prediction_id} {status}: {error or 'no error message'}")
+        self.prediction_id = prediction_id
+        self.status = status
+        self.error = error
+
+class PredictionJob:
+    """
+    One prediction to run.
+
+    `files` maps input names to local paths, opened (and streamed to Replicate's
+    files API) only while the prediction is created. `on_output(output)` turns the
+    prediction output into the extractor result (usually the output filename), or
+    returns another PredictionJob to run instead (e.g. a retry at a larger
+    resolution), which is submitted like the first one. `cleanup()` runs once
+    the files are no longer needed, whether or not the prediction was created.
+    """
+
+    def __init__(self, model_version, api_input, files=None, on_output=None, cleanup=None):
+        self.model_version = model_version
+        self.api_input = api_input
+        self.files = files or {}
+        self.on_output = on_output
+        self.cleanup = cleanup
+
+    def submit(self, scheduler):
+        """Create the prediction with scheduler and return its Future."""
+        try:
+            return scheduler.submit(self.model_version, self.api_input, self.files)
+        finally:
+            if self.cleanup is not None:
+                self.cleanup()
+
+class _Tracked:
+    """Bookkeeping for one in-flight prediction."""
+
+    def __init__(self, future, created_at, poll_interval, model=None, input_file=None):
+        self.future = future
+        self.created_at = created_at or ""
+        self.interval = poll_interval
+        self.submitted = time.monotonic()
+        self.next_check = self.submitted + poll_interval
+        self.model = model
+        self.input_file = input_file
+
+def _raise_with_retry_after(response):
+    """httpx response hook: raise ReplicateError carrying the Retry-After header."""
+    if response.status_code >= 400:
+        from replicate.exceptions import ReplicateError
+
+        response.read()
+        error = ReplicateError.from_response(response)
+        error.retry_after = response.headers.get("Retry-After")
+        raise error
+
+def make_client():
+    """Return a replicate Client whose errors expose Retry-After (for retry_call)."""
+    # Imported here so --help and cache hits never pay for loading the SDK
+    import replicate
+
+    return replicate.Client(event_hooks={"response": [_raise_with_retry_after]})
+
+def add_scheduler_arguments(parser):
+    """Add prediction scheduler arguments to an argparse parser."""
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT, help=f"Maximum predictions running on Replicate at once (default: {DEFAULT_MAX_IN_FLIGHT})")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help=f"Seconds between status sweeps (default: {DEFAULT_POLL_INTERVAL})")
+    parser.add_argument("--webhook-url", help="Public URL forwarded to the local webhook receiver; enables completion webhooks")
+    parser.add_argument("--webhook-listen", default="127.0.0.1:8780", help="host:port of the local webhook receiver (default: 127.0.0.1:8780)")
+    add_resilience_arguments(parser, "replicate")
+    add_journal_arguments(parser)
+
+def open_scheduler(args):
+    """Create the prediction scheduler configured by add_scheduler_arguments()."""
+    if args.max_in_flight < 1:
+        print("ERROR: --max-in-flight must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    configure_resilience(args, "replicate")
+    configure_journal(args)
+    return PredictionScheduler(
+        max_in_flight=args.max_in_flight,
+        poll_interval=args.poll_interval,
+        webhook_url=args.webhook_url,
+        webhook_listen=args.webhook_listen,
+        verbose=args.verbose
+    )
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Return the process-wide scheduler with default settings (created on first use)."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = PredictionScheduler()
+        return _default_scheduler
+
+class PredictionScheduler:
+    """Create Replicate predictions without blocking and resolve Futures as they finish."""
+
+    def __init__(self, client=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, poll_interval=DEFAULT_POLL_INTERVAL,
+                 webhook_url=None, webhook_listen=None, verbose=False):
+        self.client = client or make_client()
+        self.poll_interval = poll_interval
+        self.webhook_url = webhook_url
+        self.webhook_listen = webhook_listen or "127.0.0.1:8780"
+        self.verbose = verbose
+        self.stats = {"created": 0, "attached": 0, "canceled": 0, "list_requests": 0, "get_requests": 0, "webhooks": 0}
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._receiver = None
+
+    def _start(self):
+        """Start the poller thread (and webhook receiver) on first submit."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self.webhook_url:
+                secret = retry_call(self.client.webhooks.default.secret, provider="replicate-api", label="webhook secret")
+                self._receiver = WebhookReceiver(self, self.webhook_listen, secret)
+                self._receiver.start()
+                verbose_print(f"Webhook receiver listening on {self._receiver.address}", self.verbose)
+            self._thread = threading.Thread(target=self._poll_loop, name="replicate-poller", daemon=True)
+            self._thread.start()
+
+    def submit(self, model_version, api_input, files=None, journal_key=None, document=None, unit=None):
+        """
+        Create a prediction (blocks only while --max-in-flight is reached) and return its Future.
+
+        With a journal, the prediction is recorded under journal_key (default:
+        derived from model, input and files) and an in-flight prediction of an
+        earlier run with the same key is re-attached instead of created again.
+        Duplicates within this run (same input twice, hedged legs) are not.
+        """
+        self._start()
+        journal = current_journal()
+        if journal is not None:
+            journal_key = journal_key or prediction_key(model_version, api_input, files)
+            previous = journal.unit(journal_key)
+            if previous and previous["state"] == "in_flight" and previous["prediction_id"] and previous["run"] != RUN_ID:
+                future = self.attach(previous["prediction_id"])
+                if future is not None:
+                    future.journal_key = journal_key
+                    return future
+        self._slots.acquire()
+        try:
+            with ExitStack() as stack:
+                api_input = dict(api_input)
+                for name, path in (files or {}).items():
+                    api_input[name] = self._upload(stack.enter_context(open_for_upload(path)), name)
+                uploaded = [api_input[name] for name in (files or {})]
+                attempted = []
+
+                def create():
+                    # A failed create may still have started the prediction; the
+                    # freshly uploaded file URLs identify it in the recent list
+                    if attempted:
+                        existing = self._find_created(uploaded)
+                        if existing is not None:
+                            return existing
+                    attempted.append(True)
+                    return self._create(model_version, api_input)
+
+                model = model_version.split(':')[0]
+                input_file = next(iter((files or {}).values()), None)
+                with span("create", model=model, input=input_file) as fields:
+                    prediction = retry_call(
+                        create, provider="replicate", idempotent=bool(uploaded),
+                        label=f"create {model}"
+                    )
+                    fields["prediction_id"] = prediction.id
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future = Future()
+        future.prediction_id = prediction.id
+        if journal is not None:
+            journal.set_unit(journal_key, "in_flight", document, unit, prediction_id=prediction.id)
+            future.journal_key = journal_key
+            future.add_done_callback(_journal_prediction_failure)
+        with self._lock:
+            self.stats["created"] += 1
+            self._pending[prediction.id] = _Tracked(future, prediction.created_at, self.poll_interval, model, input_file)
+        verbose_print(f"Prediction {prediction.id} created ({prediction.status})", self.verbose)
+        # The create response may already be terminal (e.g. cached by Replicate)
+        if prediction.status in TERMINAL_STATUSES:
+            self._finish(prediction.id, prediction.status, prediction.output, prediction.error, prediction.started_at, prediction.completed_at)
+        return future
+
+    def attach(self, prediction_id):
+        """
+        Track a prediction created by an earlier run and return its Future.
+
+        Returns None when it cannot be reused: unknown, failed or canceled, or
+        succeeded so long ago that its output files may have been deleted. A
+        prediction this scheduler already tracks gets a Future chained to it.
+        """
+        self._start()
+        with self._lock:
+            tracked = self._pending.get(prediction_id)
+        if tracked is not None:
+            return _chain(tracked.future, prediction_id)
+        try:
+            prediction = retry_call(lambda: self.client.predictions.get(prediction_id), provider="replicate-api", label=f"get {prediction_id}")
+        except Exception as e:
+            verbose_print(f"Prediction {prediction_id} of an earlier run cannot be re-attached: {e}", self.verbose)
+            return None
+        if prediction.status in ("failed", "canceled") or (prediction.status == "succeeded" and _output_expired(prediction.completed_at)):
+            verbose_print(f"Prediction {prediction_id} of an earlier run is {prediction.status}, creating a new one", self.verbose)
+            return None
+
+        self._slots.acquire()
+        future = Future()
+        future.prediction_id = prediction.id
+        with self._lock:
+            self.stats["attached"] += 1
+            self._pending[prediction.id] = _Tracked(future, prediction.created_at, self.poll_interval, getattr(prediction, "model", None))
+        print(f"RESUMING: prediction {prediction.id} ({prediction.status}) of an earlier run", file=sys.stderr)
+        if prediction.status in TERMINAL_STATUSES:
+            self._finish(prediction.id, prediction.status, prediction.output, prediction.error, prediction.started_at, prediction.completed_at)
+        return future
+
+    def cancel(self, prediction):
+        """
+        Cancel the prediction behind a Future returned by submit() or attach().
+
+        The Future then fails with a canceled PredictionError (or resolves
+        normally when the prediction finished first). Returns True when the
+        cancel request was accepted.
+        """
+        prediction_id = getattr(prediction, "prediction_id", None)
+        if prediction_id is None or prediction.done():
+            return False
+        try:
+            canceled = retry_call(lambda: self.client.predictions.cancel(prediction_id), provider="replicate-api", label=f"cancel {prediction_id}")
+        except Exception as e:
+            verbose_print(f"Prediction {prediction_id} could not be canceled: {e}", self.verbose)
+            return False
+        with self._lock:
+            self.stats["canceled"] += 1
+        verbose_print(f"Prediction {prediction_id} cancel requested ({canceled.status})", self.verbose)
+        if canceled.status in TERMINAL_STATUSES:
+            self._finish(canceled.id, canceled.status, canceled.output, canceled.error, canceled.started_at, canceled.completed_at)
+        return True
+
+    def _upload(self, file, name):
+        """Upload an input file to Replicate's files API and return its URL."""
+        # A repeated upload only leaves an unused file behind, so 5xx are retried too
+        with span("upload", input=getattr(file, "name", None), bytes_out=os.fstat(file.fileno()).st_size):
+            uploaded = retry_call(lambda: self.client.files.create(file), provider="replicate-api", label=f"upload {name}")
+        return uploaded.urls["get"]
+
+    def _create(self, model_version, api_input):
+        """Create one prediction from already uploaded inputs."""
+        params = {}
+        if self.webhook_url:
+            params["webhook"] = self.webhook_url
+            params["webhook_events_filter"] = ["completed"]
+        if ":" in model_version:
+            return self.client.predictions.create(version=model_version.split(":", 1)[1], input=api_input, **params)
+        return self.client.models.predictions.create(model=model_version, input=api_input, **params)
+
+    def _find_created(self, uploaded):
+        """Return the most recent prediction whose input uses all uploaded URLs, or None."""
+        self._api_limiter_acquire()
+        page = self.client.predictions.list()
+        for prediction in page.results:
+            values = set(str(value) for value in (prediction.input or {}).values())
+            if all(url in values for url in uploaded):
+                verbose_print(f"Prediction {prediction.id} was created despite the error", self.verbose)
+                return prediction
+        return None
+
+    def run(self, model_version, api_input, files=None):
+        """Blocking helper: submit one prediction and return its output."""
+        return self.submit(model_version, api_input, files).result()
+
+    def in_flight(self):
+        """Number of predictions created but not finished yet."""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """Stop the poller and webhook receiver; unfinished Futures are cancelled."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._receiver is not None:
+            self._receiver.stop()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for tracked in pending.values():
+            tracked.future.cancel()
+
+    def _finish(self, prediction_id, status, output=None, error=None, started_at=None, completed_at=None):
+        """Resolve the Future of a terminal prediction (ignores unknown or finished ids)."""
+        with self._lock:
+            tracked = self._pending.pop(prediction_id, None)
+        if tracked is None:
+            return
+        self._slots.release()
+        verbose_print(f"Prediction {prediction_id} {status}", self.verbose)
+        _record_timing(prediction_id, status, tracked, started_at, completed_at)
+        if status == "succeeded":
+            tracked.future.set_result(output)
+        else:
+            tracked.future.set_exception(PredictionError(prediction_id, status, error))
+
+    def _api_limiter_acquire(self):
+        limiter = get_rate_limiter("replicate-api")
+        if limiter is not None:
+            limiter.acquire()
+
+    def _fetch_and_finish(self, prediction_id):
+        """Fetch one prediction and resolve it if it reached a terminal state."""
+        self._api_limiter_acquire()
+        prediction = self.client.predictions.get(prediction_id)
+        with self._lock:
+            self.stats["get_requests"] += 1
+        if prediction.status in TERMINAL_STATUSES:
+            self._finish(prediction.id, prediction.status, prediction.output, prediction.error, prediction.started_at, prediction.completed_at)
+            return True
+        return False
+
+    def _poll_loop(self):
+        """Background thread: sweep pending predictions until closed."""
+        interval = WEBHOOK_SWEEP_INTERVAL if self.webhook_url else self.poll_interval
+        while not self._closed:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self._sweep()
+            except Exception as e:
+                # Network hiccups must not kill the poller; the next sweep retries
+                verbose_print(f"Prediction sweep failed: {e}", self.verbose)
+                limiter = get_rate_limiter("replicate-api")
+                if limiter is not None and error_status(e) == 429:
+                    limiter.pause(retry_after_seconds(e) or interval)
+
+    def _sweep(self):
+        """One status sweep over the list endpoint, falling back to individual GETs."""
+        with self._lock:
+            pending = dict(self._pending)
+        if not pending:
+            return
+        oldest = min(tracked.created_at for tracked in pending.values())
+        seen = set()
+        finished = []
+        cursor = ...
+        for _ in range(MAX_SWEEP_PAGES):
+            self._api_limiter_acquire()
+            page = self.client.predictions.list(cursor)
+            with self._lock:
+                self.stats["list_requests"] += 1
+            for prediction in page.results:
+                if prediction.id in pending:
+                    seen.add(prediction.id)
+                    if prediction.status in TERMINAL_STATUSES:
+                        finished.append(prediction.id)
+            if len(seen) == len(pending) or not page.next or not page.results:
+                break
+            if oldest and (page.results[-1].created_at or "") < oldest:
+                break
+            cursor = page.next
+
+        # List entries may carry a truncated output; fetch the full prediction
+        for prediction_id in finished:
+            self._fetch_and_finish(prediction_id)
+
+        now = time.monotonic()
+        for prediction_id, tracked in pending.items():
+            if prediction_id in seen or tracked.next_check > now:
+                continue
+            if not self._fetch_and_finish(prediction_id):
+                tracked.interval = min(tracked.interval * 2, MAX_POLL_INTERVAL)
+                tracked.next_check = now + tracked.interval
+
+def _parse_time(value):
+    """Replicate ISO timestamp as an aware datetime, or None."""
+    if not value:
+        return None
+    from datetime import datetime, timezone
+
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+def _output_expired(completed_at):
+    """True when a prediction completed longer than OUTPUT_REUSE_SECONDS ago."""
+    if not completed_at:
+        return False
+    from datetime import datetime, timezone
+
+    completed = _parse_time(completed_at)
+    if completed is None:
+        return True
+    return (datetime.now(timezone.utc) - completed).total_seconds() > OUTPUT_REUSE_SECONDS
+
+def _record_timing(prediction_id, status, tracked, started_at, completed_at):
+    """Metrics of a finished prediction: client-side wait, and queue/inference from Replicate's timestamps."""
+    fields = {"prediction_id": prediction_id, "model": tracked.model, "input": tracked.input_file, "status": status}
+    ok = status == "succeeded"
+    record("wait", time.monotonic() - tracked.submitted, ok, **fields)
+    created, started, completed = _parse_time(tracked.created_at), _parse_time(started_at), _parse_time(completed_at)
+    if created and started:
+        # Queue time includes a cold boot of the model
+        record("queue", max(0.0, (started - created).total_seconds()), True, started=created.timestamp(), **fields)
+    if started and completed:
+        record("inference", max(0.0, (completed - started).total_seconds()), ok, started=started.timestamp(), **fields)
+
+def _chain(source, prediction_id):
+    """A new Future resolved like source, for a second caller of the same prediction."""
+    future = Future()
+    future.prediction_id = prediction_id
+
+    def copy(done):
+        if done.cancelled():
+            future.cancel()
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+    source.add_done_callback(copy)
+    return future
+
+def _journal_prediction_failure(future):
+    """Done callback: journal failed predictions, so the next run creates them afresh."""
+    if future.cancelled() or future.exception() is None:
+        # Succeeded predictions stay in flight until record_output(); cancelled
+        # ones (interrupted run) can be re-attached
+        return
+    journal = current_journal()
+    if journal is not None:
+        journal.set_unit(future.journal_key, "failed", error=str(future.exception()))
+
+def record_output(prediction, result=None, error=None):
+    """Journal whether the output of a prediction Future was saved (done) or not (failed)."""
+    journal = current_journal()
+    key = getattr(prediction, "journal_key", None)
+    if journal is None or key is None:
+        return
+    if error is not None:
+        journal.set_unit(key, "failed", error=str(error) or type(error).__name__)
+    else:
+        journal.set_unit(key, "done", result=None if result is None else str(result))
+
+class WebhookReceiver:
+    """Local HTTP server that resolves predictions from signed Replicate webhooks."""
+
+    def __init__(self, scheduler, listen, secret):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        import replicate
+
+        host, _, port = listen.rpartition(":")
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                try:
+                    replicate.webhooks.validate(headers=dict(self.headers), body=body, secret=secret, tolerance=300)
+                    prediction = json.loads(body)
+                except Exception as e:
+                    verbose_print(f"Rejected webhook: {e}", scheduler.verbose)
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.end_headers()
+                with scheduler._lock:
+                    scheduler.stats["webhooks"] += 1
+                if prediction.get("status") in TERMINAL_STATUSES:
+                    scheduler._finish(
+                        prediction["id"], prediction["status"], prediction.get("output"), prediction.get("error"),
+                        prediction.get("started_at"), prediction.get("completed_at")
+                    )
+
+            def log_message(self, format, *args):
+                verbose_print(f"webhook: {format % args}", scheduler.verbose)
+
+        self.server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), Handler)
+        self.server.daemon_threads = True
+        self.address = f"{self.server.server_address[0]}:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="replicate-webhooks", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def run_prediction_job(job, scheduler=None):
+    """Run one PredictionJob (and its follow-up jobs) to completion and return the on_output() result."""
+    scheduler = scheduler or get_scheduler()
+    result = job
+    while isinstance(result, PredictionJob):
+        job = result
+        result = _save_output(job, job.submit(scheduler))
+    return result
+
+def _save_output(job, prediction):
+    """Run job.on_output() on the finished prediction Future and journal the outcome."""
+    output = prediction.result()
+    try:
+        result = job.on_output(output)
+    except BaseException as e:
+        record_output(prediction, error=e)
+        raise
+    # A follow-up job replaces this prediction's output, which is done with
+    record_output(prediction, None if isinstance(result, PredictionJob) else result)
+    return result
+
+def run_prediction_batch(prepare, inputs, scheduler, jobs=1, verbose=False):
+    """
+    Run Replicate predictions for many inputs without a thread per prediction.
+
+    prepare(input_file) returns the output filename (e.g. cache hit), None when
+    the file was skipped, or a PredictionJob. Up to `jobs` threads upload inputs
+    and handle outputs; waiting on Replicate costs no thread at all.
+    Returns the number of failed files.
+    """
+    done = skipped = failed = 0
+    start = time.monotonic()
+    batch = len(inputs) > 1
+
+    def submit(input_file, job=None):
+        job = job or prepare(input_file)
+        if isinstance(job, PredictionJob):
+            return job, job.submit(scheduler)
+        return job, None
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # future -> (stage, input_file, job); stages: submit, predict, output
+        waiting = {executor.submit(submit, input_file): ("submit", input_file, None) for input_file in inputs}
+        while waiting:
+            finished, _ = wait(waiting, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, input_file, job = waiting.pop(future)
+                try:
+                    result = future.result()
+                except SystemExit:
+                    # Extractor already reported the error before exiting
+                    failed += 1
+                    if batch:
+                        print(f"FAILED: {input_file}", file=sys.stderr)
+                    continue
+                except Exception as e:
+                    failed += 1
+                    print(f"FAILED: {input_file}: {e}" if batch else f"Error: {e}", file=sys.stderr)
+                    continue
+                if stage == "submit":
+                    job, prediction = result
+                    if prediction is not None:
+                        waiting[prediction] = ("predict", input_file, job)
+                        continue
+                    result = job
+                elif stage == "predict":
+                    waiting[executor.submit(_save_output, job, future)] = ("output", input_file, job)
+                    continue
+                elif isinstance(result, PredictionJob):
+                    # Follow-up prediction: submitted like a new input, no thread waits for it
+                    waiting[executor.submit(submit, input_file, result)] = ("submit", input_file, None)
+                    continue
+                if result is None:
+                    skipped += 1
+                else:
+                    done += 1
+                    if verbose and batch:
+                        print(f"DONE: {input_file} -> {result}", file=sys.stderr)
+
+    if batch:
+        print_batch_summary(len(inputs), done, skipped, failed, time.monotonic() - start)
+        verbose_print(f"Scheduler requests: {scheduler.stats}", verbose)
+    return failed
@@ -0,0 +1,176 @@
+"""
+Shrink images to what the model actually sees before uploading them.
+
+A 400 DPI A4 page is ~3300x4700 RGB pixels (tens of MB decoded, several MB as
+PNG), while DeepSeek-OCR reads at most 1280x1280 in its fixed modes and the
+providers downscale everything else anyway. `preprocess_image()`
+
+* downscales to the model's longest input side (never upscales),
+* flattens transparency onto white and applies EXIF orientation,
+* drops color when the page is effectively grayscale (scans, rendered text),
+* re-encodes to the smaller of PNG and JPEG (JPEG only when clearly smaller),
+
+and returns the file to upload with its real MIME type. Images that would not
+get smaller are uploaded unchanged. Needs Pillow and numpy; without them the
+original file is used.
+
+    upload_file, mime_type = preprocess_image("page.png", SURYA_MAX_SIDE)
+    ...
+    discard_preprocessed(upload_file, "page.png")
+"""
+
+import atexit
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from ai_ocr.common import verbose_print
+from ai_ocr.metrics import span
+
+# Longest side each model works at
+SURYA_MAX_SIDE = 2048
+# DeepSeek-OCR dynamic (Gundam) mode: grid of 640px tiles plus a 1024px global view
+DEEPSEEK_DYNAMIC_MAX_SIDE = 2560
+# Pixels whose channels differ by more than this count as colored
+GRAY_TOLERANCE = 20
+# Pages with at most this fraction of colored pixels are uploaded as grayscale
+MAX_COLOR_FRACTION = 0.002
+# JPEG is lossy, so it is only used when it saves at least a quarter over PNG
+JPEG_MAX_RATIO = 0.75
+JPEG_QUALITY = 90
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "GIF": "image/gif", "WEBP": "image/webp", "BMP": "image/bmp", "TIFF": "image/tiff"}
+EXTENSION_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".webp": "image/webp"}
+
+def add_preprocess_arguments(parser):
+    """Add --no-preprocess argument to an argparse parser."""
+    parser.add_argument("--no-preprocess", action="store_true", help="Upload images unchanged instead of downscaling and re-encoding them to the model's input size")
+
+def deepseek_max_side(resolution_size):
+    """Longest useful input side for a lucataco/deepseek-ocr resolution_size."""
+    sides = {"Tiny": 512, "Small": 640, "Base": 1024, "Large": 1280}
+    return sides.get(resolution_size, DEEPSEEK_DYNAMIC_MAX_SIDE)
+
+def extractor_max_side(extractor, options=None):
+    """Longest useful input side of a registered image extractor, or None when unknown."""
+    options = options or {}
+    if extractor == "surya":
+        return SURYA_MAX_SIDE
+    if extractor == "deepseek-deepinfra":
+        return DEEPSEEK_DYNAMIC_MAX_SIDE
+    if extractor == "deepseek-replicate":
+        # auto may escalate up to the dynamic mode
+        return deepseek_max_side(options.get("resolution_size"))
+    return None
+
+def extension_mime_type(input_file):
+    """Image MIME type guessed from the file extension."""
+    return EXTENSION_MIME_TYPES.get(os.path.splitext(input_file)[1].lower(), "image/jpeg")
+
+_tmp_root = None
+_tmp_lock = threading.Lock()
+
+def _output_path(input_file, extension):
+    """New path named like input_file (providers and logs show the name) in a process-wide temp dir."""
+    global _tmp_root
+    with _tmp_lock:
+        if _tmp_root is None:
+            _tmp_root = tempfile.mkdtemp(prefix="ai_ocr_preprocess_")
+            atexit.register(shutil.rmtree, _tmp_root, True)
+    directory = tempfile.mkdtemp(dir=_tmp_root)
+    return os.path.join(directory, os.path.splitext(os.path.basename(input_file))[0] + extension)
+
+def discard_preprocessed(upload_file, input_file):
+    """Remove a preprocessed file once it is uploaded (no-op for the original)."""
+    if upload_file != input_file:
+        shutil.rmtree(os.path.dirname(upload_file), ignore_errors=True)
+
+def _is_grayscale(img):
+    """True when (almost) no pixel of the RGB image has visible color."""
+    import numpy as np
+
+    pixels = np.asarray(img, dtype=np.int16)
+    spread = pixels.max(axis=2) - pixels.min(axis=2)
+    return np.count_nonzero(spread > GRAY_TOLERANCE) <= MAX_COLOR_FRACTION * spread.size
+
+def _encode(img, fmt):
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        # No chroma subsampling: colored text edges stay sharp
+        img.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, subsampling=0)
+    else:
+        # optimize=True costs ~5x the time for a few percent
+        img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+def preprocess_image(input_file, max_side, verbose=False):
+    """
+    Return (upload_file, mime_type) for input_file shrunk to max_side.
+
+    upload_file is input_file itself when preprocessing is unavailable or would
+    not make the upload smaller; otherwise a temporary file to pass to
+    discard_preprocessed() after the upload.
+    """
+    with span("preprocess", input=input_file) as fields:
+        upload_file, mime_type = _preprocess_image(input_file, max_side, verbose)
+        fields["bytes_in"] = os.path.getsize(input_file)
+        fields["bytes_out"] = os.path.getsize(upload_file)
+    return upload_file, mime_type
+
+def _preprocess_image(input_file, max_side, verbose):
+    start = time.monotonic()
+    original_size = os.path.getsize(input_file)
+    try:
+        # Imported lazily: only runs that preprocess images load Pillow and numpy
+        from PIL import Image, ImageOps
+
+        with Image.open(input_file) as source:
+            original_format = source.format
+            original_desc = f"{source.width}x{source.height} {source.mode}"
+            img = ImageOps.exif_transpose(source)
+            resized = max(img.size) > max_side
+            if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+                background = Image.new("RGB", img.size, "white")
+                background.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+                img = background
+            elif img.mode not in ("L", "RGB"):
+                img = img.convert("RGB")
+            if resized:
+                img = img.copy()
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+            grayed = img.mode == "RGB" and _is_grayscale(img)
+            if grayed:
+                img = img.convert("L")
+            if not resized and not grayed and original_format == "JPEG":
+                # Re-encoding a JPEG at its own size only adds artifacts
+                verbose_print(f"PREPROCESS: {input_file}: {original_desc} {original_size} bytes, unchanged", verbose)
+                return input_file, MIME_TYPES[original_format]
+            encoded = _encode(img, "PNG")
+            fmt = "PNG"
+            jpeg = _encode(img, "JPEG")
+            if len(jpeg) < JPEG_MAX_RATIO * len(encoded):
+                encoded, fmt = jpeg, "JPEG"
+            new_desc = f"{img.width}x{img.height} {img.mode}"
+    except ImportError as e:
+        verbose_print(f"PREPROCESS: {input_file}: skipped, {e} (install pillow and numpy)", verbose)
+        return input_file, extension_mime_type(input_file)
+    except Exception as e:
+        # Not an image Pillow can read; let the model decide
+        verbose_print(f"PREPROCESS: {input_file}: skipped, {e}", verbose)
+        return input_file, extension_mime_type(input_file)
+
+    if len(encoded) >= original_size and not resized and original_format in MIME_TYPES:
+        verbose_print(f"PREPROCESS: {input_file}: {original_desc} {original_size} bytes, unchanged (re-encoding is not smaller)", verbose)
+        return input_file, MIME_TYPES[original_format]
+    upload_file = _output_path(input_file, ".jpg" if fmt == "JPEG" else ".png")
+    with open(upload_file, "wb") as f:
+        f.write(encoded)
+    verbose_print(
+        f"PREPROCESS: {input_file}: {original_desc} {original_size} bytes -> {new_desc} {fmt} {len(encoded)} bytes "
+        f"({time.monotonic() - start:.2f}s)",
+        verbose
+    )
+    return upload_file, MIME_TYPES[fmt]
@@ -0,0 +1,178 @@
+"""
+Parallel PDF page rasterization.
+
+Pages are rendered in chunks of consecutive pages, one `pdftoppm` (or ImageMagick)
+process per chunk, so process startup and PDF parsing are paid once per chunk
+instead of once per page. Up to `jobs` renderer processes run at the same time,
+and the backend that worked is remembered for the rest of the process instead of
+re-trying a failing one first on every page.
+
+With `scale_to` pages are rendered so that their longer side is scale_to pixels
+(the input size of the OCR model) instead of at a fixed DPI.
+
+    for page_no, png_path in render_pages("doc.pdf", jobs=8):
+        ...
+"""
+
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_ocr.common import verbose_print
+from ai_ocr.metrics import span
+from ai_ocr.pdfprobe import get_no_of_pages_pdf
+
+DEFAULT_DPI = 400
+MAX_CHUNK_SIZE = 32
+
+_PAGE_FILE_RE = re.compile(r"-(\d+)\.png$")
+
+# Name of the backend that last rendered successfully, tried first next time
+_preferred_backend = None
+
+def _collect_pages(out_dir):
+    """Map page numbers to PNG files named `<prefix>-<page>.png` in out_dir."""
+    pages = {}
+    for name in os.listdir(out_dir):
+        match = _PAGE_FILE_RE.search(name)
+        if match:
+            pages[int(match.group(1))] = os.path.join(out_dir, name)
+    return pages
+
+def render_range_with_pdftoppm(pdf_filename, first_page, last_page, out_dir, dpi=DEFAULT_DPI, scale_to=None):
+    """Render pages first..last to out_dir with a single pdftoppm process."""
+    size = ['-scale-to', str(scale_to)] if scale_to else ['-r', str(dpi)]
+    subprocess.run(
+        ['pdftoppm', *size, '-f', str(first_page), '-l', str(last_page), '-png',
+         pdf_filename, os.path.join(out_dir, 'page')],
+        check=True, capture_output=True
+    )
+    return _collect_pages(out_dir)
+
+def render_range_with_imagemagick(pdf_filename, first_page, last_page, out_dir, dpi=DEFAULT_DPI, scale_to=None):
+    """Render pages first..last to out_dir with a single ImageMagick process."""
+    # ImageMagick cannot render to a pixel size directly: render at dpi, then shrink
+    resize = ['-resize', f'{scale_to}x{scale_to}>'] if scale_to else []
+    subprocess.run(
+        ['magick', '-density', str(dpi), f'{pdf_filename}[{first_page - 1}-{last_page - 1}]',
+         *resize, '-scene', str(first_page), os.path.join(out_dir, 'page-%d.png')],
+        check=True, capture_output=True
+    )
+    return _collect_pages(out_dir)
+
+RENDER_BACKENDS = {
+    "pdftoppm": render_range_with_pdftoppm,
+    "imagemagick": render_range_with_imagemagick,
+}
+
+def backend_order():
+    """Backend names to try, the one that worked last first."""
+    names = list(RENDER_BACKENDS)
+    if _preferred_backend in names:
+        names.remove(_preferred_backend)
+        names.insert(0, _preferred_backend)
+    return names
+
+def render_range(pdf_filename, first_page, last_page, out_dir, dpi=DEFAULT_DPI, verbose=False, scale_to=None):
+    """
+    Render a page range with the first backend that succeeds.
+
+    Returns {page_no: png_path} and raises RuntimeError if no backend could
+    render all requested pages.
+    """
+    global _preferred_backend
+    expected = set(range(first_page, last_page + 1))
+    errors = []
+    for name in backend_order():
+        verbose_print(f"DEBUG: Rendering pages {first_page}-{last_page} with {name}", verbose)
+        try:
+            pages = RENDER_BACKENDS[name](pdf_filename, first_page, last_page, out_dir, dpi, scale_to)
+        except (OSError, subprocess.SubprocessError) as e:
+            verbose_print(f"DEBUG: {name} failed: {str(e)}", verbose)
+            errors.append(f"{name}: {e}")
+            for path in _collect_pages(out_dir).values():
+                os.unlink(path)
+            continue
+        if expected.issubset(pages):
+            _preferred_backend = name
+            return {page_no: pages[page_no] for page_no in sorted(expected)}
+        errors.append(f"{name}: missing pages {sorted(expected - set(pages))}")
+        for path in pages.values():
+            os.unlink(path)
+    raise RuntimeError(f"Could not render pages {first_page}-{last_page} of {pdf_filename}: {'; '.join(errors)}")
+
+def default_chunk_size(page_count, jobs):
+    """Pick pages per renderer process: few processes, but enough chunks to keep all jobs busy."""
+    return max(1, min(MAX_CHUNK_SIZE, math.ceil(page_count / (jobs * 4))))
+
+def chunk_ranges(first_page, last_page, chunk_size):
+    """Split first..last into (first, last) ranges of at most chunk_size pages."""
+    return [
+        (start, min(start + chunk_size - 1, last_page))
+        for start in range(first_page, last_page + 1, chunk_size)
+    ]
+
+def render_pages(pdf_filename, first_page=None, last_page=None, dpi=DEFAULT_DPI, jobs=None,
+                 chunk_size=None, output_dir=None, verbose=False, scale_to=None, cache_dir=None):
+    """
+    Render PDF pages in parallel, yielding (page_no, png_path) in page order.
+
+    Pages are yielded as soon as they and all previous pages are rendered. Files
+    are written as `page-<n>.png` into output_dir; without output_dir they live in
+    a temporary directory that is removed when the generator finishes or is closed.
+    """
+    first_page = first_page or 1
+    if last_page is None:
+        last_page = get_no_of_pages_pdf(pdf_filename, verbose, cache_dir)
+        if not isinstance(last_page, int):
+            raise ValueError(f"Could not determine page count for {pdf_filename}")
+    if last_page < first_page:
+        return
+    jobs = jobs or os.cpu_count() or 1
+    chunk_size = chunk_size or default_chunk_size(last_page - first_page + 1, jobs)
+    ranges = chunk_ranges(first_page, last_page, chunk_size)
+    verbose_print(f"VERBOSE: Rendering pages {first_page}-{last_page} in {len(ranges)} chunks with {jobs} jobs", verbose)
+
+    tmp_root = tempfile.mkdtemp(prefix="ai_ocr_render_")
+    target_dir = output_dir or tmp_root
+    os.makedirs(target_dir, exist_ok=True)
+
+    def render_chunk(page_range):
+        chunk_dir = tempfile.mkdtemp(dir=tmp_root)
+        with span("render", input=pdf_filename, pages=f"{page_range[0]}-{page_range[1]}") as fields:
+            pages = render_range(pdf_filename, page_range[0], page_range[1], chunk_dir, dpi, verbose, scale_to)
+            fields["bytes_out"] = sum(os.path.getsize(path) for path in pages.values())
+        result = {}
+        for page_no, path in pages.items():
+            final_path = os.path.join(target_dir, f"page-{page_no}.png")
+            os.replace(path, final_path)
+            result[page_no] = final_path
+        os.rmdir(chunk_dir)
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        # Renderers are separate processes; threads only wait on them
+        futures = [executor.submit(render_chunk, page_range) for page_range in ranges]
+        for future in futures:
+            pages = future.result()
+            for page_no in sorted(pages):
+                yield page_no, pages[page_no]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+def pdf_page_as_png_image(pdf_filename, page_no, tmp_png, dpi=DEFAULT_DPI, verbose=False, scale_to=None):
+    """Convert one PDF page to PNG at tmp_png using the remembered backend first."""
+    with tempfile.TemporaryDirectory(prefix="ai_ocr_render_") as out_dir:
+        try:
+            pages = render_range(pdf_filename, page_no, page_no, out_dir, dpi, verbose, scale_to)
+        except RuntimeError as e:
+            verbose_print(f"DEBUG: {str(e)}", verbose)
+            return False
+        shutil.move(pages[page_no], tmp_png)
+    return True
@@ -0,0 +1,106 @@
+"""
+Registry of the extractors behind the `ai-ocr` command.
+
+Entries only name the module implementing an extractor; nothing is imported
+until an extractor is actually used, so listing extractors or printing help
+never loads a provider SDK. Every extractor module provides `main(argv=None)`
+and a per-file function taking `(input_file, output_file, verbose=..., force=...,
+cache=...)` plus extractor specific keyword options.
+
+Other packages can add extractors through the `ai_ocr.extractors` entry point
+group, e.g. in their pyproject.toml:
+
+    [project.entry-points."ai_ocr.extractors"]
+    my-ocr = "my_package.my_ocr_module"
+
+Such modules must provide `main(argv=None)`, and optionally `PROVIDER`,
+`INPUT_KIND`, `DESCRIPTION` and `EXTRACT_FUNCTION`.
+"""
+
+import importlib
+import sys
+
+ENTRY_POINT_GROUP = "ai_ocr.extractors"
+
+class Extractor:
+    """One registered extractor: CLI name, implementing module and metadata."""
+
+    def __init__(self, name, module, provider=None, input_kind=None, description="", function=None):
+        self.name = name
+        self.module = module
+        self.provider = provider
+        self.input_kind = input_kind
+        self.description = description
+        self.function = function
+
+    def load(self):
+        """Import and return the extractor module."""
+        return importlib.import_module(self.module)
+
+    def main(self, argv=None):
+        """Run the extractor command line with argv."""
+        return self.load().main(argv)
+
+    def extract(self, input_file, output_file, **options):
+        """Process one file; returns the output filename (None when skipped)."""
+        module = self.load()
+        function = self.function or getattr(module, "EXTRACT_FUNCTION", None)
+        if function is None:
+            raise ValueError(f"extractor {self.name} has no per-file function")
+        return getattr(module, function)(input_file, output_file, **options)
+
+EXTRACTORS = {}
+_plugins_loaded = False
+
+def register_extractor(extractor):
+    """Add an extractor to the registry (replaces an existing one of the same name)."""
+    EXTRACTORS[extractor.name] = extractor
+    return extractor
+
+for _extractor in [
+    Extractor("nougat", "pdfextractors.cudanexus_nougat_replicate", "replicate", "pdf",
+              "PDF to Markdown with Nougat (academic papers, LaTeX math)", "convert_pdf_to_markdown"),
+    Extractor("marker", "pdfextractors.cuuupid_marker_replicate", "replicate", "pdf",
+              "PDF to Markdown with Marker (books, mixed layouts)", "convert_pdf_to_markdown"),
+    Extractor("surya", "imgextractors.cudanexus_ocr_surya_replicate", "replicate", "image",
+              "Image OCR with Surya (plain text lines)", "extract_text_from_image"),
+    Extractor("deepseek-replicate", "imgextractors.lucataco_deepseek_ocr_replicate", "replicate", "image",
+              "Image to Markdown with DeepSeek-OCR on Replicate", "extract_with_deepseek_ocr"),
+    Extractor("deepseek-deepinfra", "imgextractors.deepseek_ocr_deepinfra", "deepinfra", "image",
+              "Image to Markdown with DeepSeek-OCR on DeepInfra", "extract_with_deepseek_ocr"),
+]:
+    register_extractor(_extractor)
+
+def load_plugins():
+    """Register extractors advertised through the ai_ocr.extractors entry point group."""
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    from importlib.metadata import entry_points
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name in EXTRACTORS:
+            continue
+        try:
+            module = importlib.import_module(entry_point.value)
+        except Exception as e:
+            print(f"WARNING: Cannot load extractor plugin {entry_point.name}: {e}", file=sys.stderr)
+            continue
+        register_extractor(Extractor(
+            entry_point.name,
+            entry_point.value,
+            getattr(module, "PROVIDER", None),
+            getattr(module, "INPUT_KIND", None),
+            getattr(module, "DESCRIPTION", ""),
+        ))
+
+def get_extractor(name):
+    """Return the registered Extractor called name, or None."""
+    if name not in EXTRACTORS:
+        load_plugins()
+    return EXTRACTORS.get(name)
+
+def extractor_names(input_kind=None):
+    """Names of the registered extractors, optionally only those taking input_kind."""
+    return [name for name, extractor in EXTRACTORS.items() if input_kind in (None, extractor.input_kind)]
@@ -0,0 +1,268 @@
+"""
+Retries and rate limiting shared by all API calls.
+
+`retry_call()` retries transient failures (429, 408/425, 5xx and connection
+errors) with full-jitter exponential backoff and honors `Retry-After`. Calls
+marked not idempotent (they create something remotely and the caller cannot
+detect a duplicate) are only retried when the request was refused (429),
+rejected by the gateway (502/503) or never reached the server.
+
+Before every attempt a token bucket per provider is drawn from. The bucket lives
+in a small state file under `<cache-dir>/ratelimit/` guarded by `flock`, so
+parallel invocations (separate shells, xargs -P, the pipeline) share one budget
+instead of each stampeding the API at full speed. A 429 drains the shared bucket
+so every process backs off, not only the one that was refused.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+from ai_ocr.cache import cache_path, default_cache_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is only shared between threads
+    fcntl = None
+
+DEFAULT_MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+# A longer Retry-After means a quota is exhausted rather than a transient overload
+MAX_RETRY_AFTER = 300.0
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Status codes meaning the request was rejected before any work was done
+REFUSED_STATUS = {429, 502, 503}
+
+# Requests per second; bursts of up to one second's worth are allowed.
+# Replicate documents 600 creates/min and 3000 other requests/min per account.
+DEFAULT_RATES = {
+    "replicate": 10.0,
+    "replicate-api": 50.0,
+    "deepinfra": 100.0,
+}
+RATE_DESCRIPTIONS = {
+    "replicate": "Replicate prediction creations",
+    "replicate-api": "Replicate status requests",
+    "deepinfra": "DeepInfra requests",
+}
+
+_CONNECTION_ERRORS = {
+    "ConnectionError", "TimeoutError", "Timeout", "TimeoutException", "TransportError",
+    "ChunkedEncodingError", "APIConnectionError",
+}
+# Failures where the request provably never reached the server
+_CONNECT_ERRORS = {"ConnectError", "ConnectTimeout", "ConnectionRefusedError", "PoolTimeout"}
+
+_settings = {"max_retries": DEFAULT_MAX_RETRIES, "state_dir": None}
+_rates = dict(DEFAULT_RATES)
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def add_resilience_arguments(parser, provider=None):
+    """Add --max-retries and --rate-limit arguments to an argparse parser."""
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help=f"Retries of transient API errors (429/5xx/connection) per call (default: {DEFAULT_MAX_RETRIES})")
+    if provider:
+        rate_help = f"Maximum {RATE_DESCRIPTIONS[provider]} per second, shared by all running wrappers; 0 disables (default: {DEFAULT_RATES[provider]:g})"
+    else:
+        rate_help = "Maximum API requests per second to the extractor's provider, shared by all running wrappers; 0 disables"
+    parser.add_argument("--rate-limit", type=float, help=rate_help)
+
+def configure_resilience(args, provider):
+    """Apply parsed --max-retries/--rate-limit arguments to this process."""
+    if args.max_retries < 0:
+        print("ERROR: --max-retries must not be negative", file=sys.stderr)
+        sys.exit(1)
+    _settings["max_retries"] = args.max_retries
+    state_dir = cache_path(args, "ratelimit")
+    if state_dir != _settings["state_dir"]:
+        with _limiters_lock:
+            _settings["state_dir"] = state_dir
+            _limiters.clear()
+    if args.rate_limit is not None:
+        set_rate_limit(provider, args.rate_limit)
+
+def set_rate_limit(provider, rate):
+    """Change the requests/second limit of a provider (0 disables limiting)."""
+    with _limiters_lock:
+        _rates[provider] = rate
+        _limiters.pop(provider, None)
+
+def get_rate_limiter(provider):
+    """Return the process-wide RateLimiter of a provider, or None when unlimited."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            rate = _rates.get(provider, 0)
+            _limiters[provider] = RateLimiter(provider, rate) if rate > 0 else None
+        return _limiters[provider]
+
+class RateLimiter:
+    """Token bucket whose state is shared across processes through a locked file."""
+
+    def __init__(self, name, rate, burst=None, directory=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._lock = threading.Lock()
+        self._state = None
+        self.path = None
+        directory = directory or _settings["state_dir"] or os.path.join(default_cache_dir(), "ratelimit")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f"{name}.bucket")
+        except OSError:
+            pass  # Unwritable cache dir: limit this process only
+
+    def _update(self, change):
+        """Refill the bucket, apply change(tokens) and return the new token count."""
+        with self._lock:
+            if self.path is None or fcntl is None:
+                self._state = self._apply(self._state, change)
+                return self._state[0]
+            try:
+                with open(self.path, "a+") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    f.seek(0)
+                    fields = f.read().split()
+                    state = self._apply((float(fields[0]), float(fields[1])) if len(fields) == 2 else None, change)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(f"{state[0]!r} {state[1]!r}\n")
+                    return state[0]
+            except (OSError, ValueError):
+                self._state = self._apply(self._state, change)
+                return self._state[0]
+
+    def _apply(self, state, change):
+        now = time.time()
+        tokens, stamp = state or (self.burst, now)
+        tokens = min(self.burst, tokens + max(now - stamp, 0) * self.rate)
+        return change(tokens), now
+
+    def acquire(self):
+        """Take one token, sleeping until it is available."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve(self):
+        """Take one token now and return the seconds to wait before using it."""
+        tokens = self._update(lambda tokens: tokens - 1)
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+    def pause(self, seconds):
+        """Drain the bucket so no process gets a token for `seconds`."""
+        self._update(lambda tokens: min(tokens, -seconds * self.rate))
+
+def error_status(exc):
+    """HTTP status code carried by an exception from openai, replicate or requests, or None."""
+    for attribute in ("status_code", "status"):
+        status = getattr(exc, attribute, None)
+        if isinstance(status, int):
+            return status
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+def retry_after_seconds(exc):
+    """Seconds requested by the Retry-After header of a failed response, or None."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def _class_names(exc):
+    return {cls.__name__ for cls in type(exc).__mro__}
+
+def is_connection_error(exc):
+    """True for network-level failures (connect/read errors and timeouts)."""
+    return bool(_class_names(exc) & (_CONNECTION_ERRORS | _CONNECT_ERRORS))
+
+def is_provider_error(exc):
+    """True for failures of the provider rather than the input: HTTP errors, network errors, failed predictions."""
+    # By class name, so predictions (which imports this module) need not be imported here
+    return error_status(exc) is not None or is_connection_error(exc) or "PredictionError" in _class_names(exc)
+
+def retry_delay(exc, attempt, idempotent=True):
+    """Seconds to wait before retry number attempt+1 of a failed call, or None to give up."""
+    status = error_status(exc)
+    if status is not None:
+        if status not in RETRYABLE_STATUS or (not idempotent and status not in REFUSED_STATUS):
+            return None
+    elif not is_connection_error(exc) or (not idempotent and not _class_names(exc) & _CONNECT_ERRORS):
+        return None
+    retry_after = retry_after_seconds(exc)
+    if retry_after is not None:
+        if retry_after > MAX_RETRY_AFTER:
+            return None
+        # Jitter on top so throttled clients do not all come back at once
+        return retry_after + random.uniform(0, BASE_DELAY)
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+def _describe(exc):
+    status = error_status(exc)
+    return f"HTTP {status}" if status else type(exc).__name__
+
+def _next_delay(exc, attempt, max_retries, idempotent, limiter, label):
+    """Return the delay before the next attempt (None: re-raise) and report it."""
+    if attempt >= max_retries:
+        return None
+    delay = retry_delay(exc, attempt, idempotent)
+    if delay is None:
+        return None
+    if limiter is not None and error_status(exc) == 429:
+        limiter.pause(delay)
+    print(f"RETRY: {label}: {_describe(exc)} (attempt {attempt + 1}/{max_retries}, waiting {delay:.1f}s)", file=sys.stderr)
+    return delay
+
+def retry_call(fn, provider=None, idempotent=True, label="API call", max_retries=None):
+    """Call fn() with rate limiting and retries of transient errors; returns its result."""
+    max_retries = _settings["max_retries"] if max_retries is None else max_retries
+    limiter = get_rate_limiter(provider) if provider else None
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            delay = _next_delay(e, attempt, max_retries, idempotent, limiter, label)
+            if delay is None:
+                raise
+        attempt += 1
+        time.sleep(delay)
+
+async def retry_call_async(fn, provider=None, idempotent=True, label="API call", max_retries=None):
+    """Async retry_call(): awaits fn() with rate limiting and retries of transient errors."""
+    import asyncio
+
+    max_retries = _settings["max_retries"] if max_retries is None else max_retries
+    limiter = get_rate_limiter(provider) if provider else None
+    attempt = 0
+    while True:
+        if limiter is not None:
+            wait = await asyncio.to_thread(limiter.reserve)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        try:
+            return await fn()
+        except Exception as e:
+            delay = _next_delay(e, attempt, max_retries, idempotent, limiter, label)
+            if delay is None:
+                raise
+        attempt += 1
+        await asyncio.sleep(delay)
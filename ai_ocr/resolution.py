@@ -0,0 +1,118 @@
+"""
+Automatic resolution_size selection for DeepSeek-OCR (lucataco/deepseek-ocr).
+
+The model renders the page into a fixed vision token budget: Tiny (512px, 64
+tokens), Small (640px, 100), Base (1024px, 256), Large (1280px, 400) and Gundam
+(dynamic tiles). Sparse pages do fine at Tiny, dense small print needs Large or
+Gundam. `measure_image()` computes cheap local statistics (pixel dimensions, ink
+density, text line height from the row projection profile, estimated characters
+and fine-detail gradient energy) and `choose_resolution()` picks the cheapest size
+where text lines stay legible after downscaling and the estimated text fits the
+token budget at DeepSeek-OCR's ~10x compression. `output_looks_truncated()` flags
+results that warrant escalating to `next_resolution()`.
+"""
+
+import re
+
+import numpy as np
+
+from ai_ocr.blankpage import DEFAULT_MAX_INK, analysis_pixels, ink_mask
+
+# Escalation order with the model's square input side and vision tokens
+RESOLUTIONS = [
+    ("Tiny", 512, 64),
+    ("Small", 640, 100),
+    ("Base", 1024, 256),
+    ("Large", 1280, 400),
+    ("Gundam", None, 800),
+]
+# Smallest text line height (px at model resolution) that still reads reliably
+MIN_LINE_PX = 10
+# Text tokens per vision token the model decodes with ~97% precision is ~10;
+# keep a margin below that
+TEXT_TOKENS_PER_VISION_TOKEN = 8
+CHARS_PER_TOKEN = 4
+# Mean gradient above which a page without text lines is treated as a figure/photo
+FIGURE_DETAIL_ENERGY = 12.0
+
+def _text_lines(ink, min_row_ink):
+    """Return (start, end) row ranges of consecutive inked rows that are text-line sized."""
+    rows = ink.sum(axis=1) >= min_row_ink
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.astype(np.int8), [0]))))
+    # Taller bands are figures, photos or noise rather than lines of text
+    max_height = max(ink.shape[0] // 20, 4)
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2]) if 2 <= end - start <= max_height]
+
+def measure_image(path):
+    """Compute layout statistics used to pick a resolution."""
+    # Line heights are measured on the reduced copy and scaled back to full size
+    pixels, scale, (width, height) = analysis_pixels(path)
+    pixels, ink = ink_mask(pixels)
+    ink_ratio = float(ink.mean())
+
+    # Figures and photos have strong gradients but few clean text lines
+    detail_energy = float(
+        np.abs(np.diff(pixels, axis=1)).mean() + np.abs(np.diff(pixels, axis=0)).mean()
+    )
+
+    lines = _text_lines(ink, max(2, ink.shape[1] // 500))
+    heights = [end - start for start, end in lines]
+    line_height = float(np.median(heights)) * scale if heights else None
+
+    estimated_chars = 0
+    for start, end in lines:
+        columns = np.flatnonzero(ink[start:end].any(axis=0))
+        # Glyphs are roughly half as wide as the line is high
+        estimated_chars += int((columns[-1] - columns[0] + 1) * scale / max(0.5 * (end - start) * scale, 1))
+
+    return {
+        "width": width,
+        "height": height,
+        "ink_ratio": ink_ratio,
+        "detail_energy": detail_energy,
+        "lines": len(lines),
+        "line_height": line_height,
+        "estimated_chars": estimated_chars,
+    }
+
+def choose_resolution(stats):
+    """Pick the cheapest resolution likely to read the whole page; returns (name, reason)."""
+    if stats["ink_ratio"] <= DEFAULT_MAX_INK or stats["lines"] == 0:
+        if stats["detail_energy"] >= FIGURE_DETAIL_ENERGY:
+            return "Base", "figure or photo without text lines"
+        return "Tiny", "blank or nearly blank page"
+
+    needed_tokens = stats["estimated_chars"] / CHARS_PER_TOKEN / TEXT_TOKENS_PER_VISION_TOKEN
+    long_side = max(stats["width"], stats["height"])
+    for name, side, vision_tokens in RESOLUTIONS:
+        if side is None:
+            break
+        scaled_line = stats["line_height"] * min(side / long_side, 1.0)
+        if scaled_line >= MIN_LINE_PX and vision_tokens >= needed_tokens:
+            return name, f"line height {scaled_line:.0f}px at {side}px, ~{needed_tokens:.0f} text tokens"
+    return "Gundam", "small print or too much text for a single view"
+
+def next_resolution(resolution):
+    """Return the next larger resolution, or None after Gundam."""
+    names = [name for name, _, _ in RESOLUTIONS]
+    index = names.index(resolution)
+    return names[index + 1] if index + 1 < len(names) else None
+
+def output_looks_truncated(content, stats=None):
+    """Heuristic check for empty, cut-off or degenerate (looping) OCR output."""
+    text = (content or "").strip()
+    if not text:
+        return bool(stats is None or stats["ink_ratio"] > DEFAULT_MAX_INK)
+    # Unclosed code fence
+    if text.count("```") % 2:
+        return True
+    # Decoder stuck repeating the same line
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) >= 6 and len(set(lines[-6:])) == 1:
+        return True
+    if re.search(r"(.{8,}?)\1{7,}$", text[-2000:], re.S):
+        return True
+    # Far less text than the page visibly holds
+    if stats and stats["estimated_chars"] >= 400 and len(text) < 0.2 * stats["estimated_chars"]:
+        return True
+    return False
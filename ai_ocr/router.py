@@ -0,0 +1,341 @@
+"""
+Latency- and cost-aware choice between interchangeable extractors.
+
+Every routed call records the extractor, pages, wall time, success and an
+approximate cost (pages times a per-page price) in a small SQLite store
+(default `<cache-dir>/router.sqlite3`). Estimates per extractor come from its
+recent history, blended with built-in priors until enough runs are recorded:
+
+* seconds per page - median of successful calls,
+* failure rate     - share of failed calls,
+* cost per page    - recorded cost over successfully converted pages, so
+                     paid-for failures make an extractor more expensive.
+
+`Router.ranked()` orders the available extractors (provider token set) for a
+goal: with `--target-latency` the cheapest one expected to meet it, with
+`--max-cost` the fastest one within budget, otherwise the fastest. Extractors
+failing most of their calls in the last minutes count as degraded and are only
+tried after all others; `Router.run()` falls back down the list when a call
+fails.
+
+    ai-ocr route --max-cost 0.01 'scans/*.png' papers/*.pdf
+    ai-ocr pipeline -e auto --target-latency 10 book.pdf
+    ai-ocr route --stats
+"""
+
+import os
+import sys
+import threading
+import time
+
+from ai_ocr.cache import SQLiteStore, cache_path
+from ai_ocr.common import PROVIDER_TOKENS, verbose_print
+from ai_ocr.metrics import quantile
+from ai_ocr.resilience import is_provider_error
+
+# Rough list-price estimates in USD per page (override with --price NAME=USD)
+PRICES = {
+    "nougat": 0.003,
+    "marker": 0.002,
+    "surya": 0.002,
+    "deepseek-replicate": 0.003,
+    "deepseek-deepinfra": 0.0003,
+}
+DEFAULT_PRICE = 0.003
+# Seconds per page assumed before an extractor has history
+PRIOR_SECONDS_PER_PAGE = {
+    "nougat": 12.0,
+    "marker": 4.0,
+    "surya": 6.0,
+    "deepseek-replicate": 8.0,
+    "deepseek-deepinfra": 5.0,
+}
+DEFAULT_SECONDS_PER_PAGE = 10.0
+# Weight of the prior, in observations
+PRIOR_WEIGHT = 3
+# Observations per extractor used for estimates
+HISTORY = 50
+# Degraded: at least DEGRADED_MIN_CALLS calls in the window, mostly failed
+DEGRADED_WINDOW = 600
+DEGRADED_MIN_CALLS = 3
+DEGRADED_FAILURE_RATE = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    extractor TEXT NOT NULL,
+    finished REAL NOT NULL,
+    pages INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS observations_extractor ON observations (extractor, finished);
+"""
+
+def stats_path(args):
+    """Return the --router-stats path, or router.sqlite3 inside the --cache-dir."""
+    return os.path.expanduser(args.router_stats) if args.router_stats else cache_path(args, "router.sqlite3")
+
+def add_router_arguments(parser):
+    """Add --target-latency, --max-cost, --price and --router-stats arguments to an argparse parser."""
+    parser.add_argument("--target-latency", type=float, help="Pick the cheapest extractor expected to finish within this many seconds per input (per page in the page pipeline)")
+    parser.add_argument("--max-cost", type=float, help="Pick the fastest extractor expected to cost at most this many USD per input (per page in the page pipeline)")
+    parser.add_argument("--price", action="append", default=[], metavar="NAME=USD", help="Price per page of an extractor for cost estimates (repeatable)")
+    parser.add_argument("--router-stats", help="Extractor latency/failure/cost history (default: <cache-dir>/router.sqlite3)")
+
+def parse_prices(values):
+    """Turn --price NAME=USD values into a price table."""
+    prices = dict(PRICES)
+    for value in values:
+        name, _, price = value.partition("=")
+        try:
+            prices[name] = float(price)
+        except ValueError:
+            print(f"ERROR: Invalid --price {value!r}, expected NAME=USD", file=sys.stderr)
+            sys.exit(1)
+    return prices
+
+def available_extractors(input_kind):
+    """Registered extractors for input_kind whose provider token is set."""
+    from ai_ocr.registry import EXTRACTORS, load_plugins
+
+    load_plugins()
+    return [
+        name for name, extractor in EXTRACTORS.items()
+        if extractor.input_kind == input_kind
+        and any(token in os.environ for token in PROVIDER_TOKENS.get(extractor.provider, ("",)))
+    ]
+
+class ExtractorStats(SQLiteStore):
+    """Thread-safe SQLite history of routed calls."""
+
+    def __init__(self, path):
+        super().__init__(path, SCHEMA)
+
+    def record(self, extractor, pages, seconds, ok, cost):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO observations (extractor, finished, pages, seconds, ok, cost) VALUES (?, ?, ?, ?, ?, ?)",
+                (extractor, time.time(), pages, seconds, int(ok), cost)
+            )
+
+    def recent(self, extractor, limit=HISTORY):
+        """Latest observations as (finished, pages, seconds, ok, cost), newest first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT finished, pages, seconds, ok, cost FROM observations WHERE extractor = ? ORDER BY finished DESC LIMIT ?",
+                (extractor, limit)
+            ).fetchall()
+
+    def extractors(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT extractor FROM observations ORDER BY extractor")]
+
+class Router:
+    """Orders extractors for a latency or cost goal and runs calls with fallback."""
+
+    def __init__(self, candidates, stats=None, target_latency=None, max_cost=None, prices=None, verbose=False):
+        self.candidates = list(candidates)
+        self.stats = stats
+        self.target_latency = target_latency
+        self.max_cost = max_cost
+        self.prices = prices or dict(PRICES)
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def estimate(self, name):
+        """Return seconds_per_page, cost_per_page, failure_rate, degraded and runs of an extractor."""
+        price = self.prices.get(name, DEFAULT_PRICE)
+        prior_seconds = PRIOR_SECONDS_PER_PAGE.get(name, DEFAULT_SECONDS_PER_PAGE)
+        rows = self.stats.recent(name) if self.stats is not None else []
+        ok_rows = [row for row in rows if row[3]]
+        per_page = [row[2] / max(row[1], 1) for row in ok_rows]
+        seconds = prior_seconds
+        if per_page:
+            seconds = (prior_seconds * PRIOR_WEIGHT + quantile(sorted(per_page), 0.5) * len(per_page)) / (PRIOR_WEIGHT + len(per_page))
+        converted = sum(row[1] for row in ok_rows)
+        cost = price
+        if rows:
+            # Cost of failed calls is spread over the pages that did convert
+            cost = (price * PRIOR_WEIGHT + sum(row[4] for row in rows)) / (PRIOR_WEIGHT + converted)
+        failure_rate = (len(rows) - len(ok_rows)) / len(rows) if rows else 0.0
+        window = [row for row in rows if row[0] >= time.time() - DEGRADED_WINDOW]
+        degraded = (
+            len(window) >= DEGRADED_MIN_CALLS
+            and sum(1 for row in window if not row[3]) / len(window) >= DEGRADED_FAILURE_RATE
+        )
+        return {"seconds_per_page": seconds, "cost_per_page": cost, "failure_rate": failure_rate, "degraded": degraded, "runs": len(rows)}
+
+    def ranked(self, pages=1, exclude=()):
+        """Candidate names, best first for the configured goal; degraded ones last."""
+        estimates = {name: self.estimate(name) for name in self.candidates if name not in exclude}
+
+        def expected(name, field):
+            estimate = estimates[name]
+            if field == "cost_per_page":
+                # Already includes the cost of failed calls
+                return estimate[field] * pages
+            # A failed attempt is followed by another one elsewhere
+            return estimate[field] * pages / max(1.0 - estimate["failure_rate"], 0.1)
+
+        def meets_goal(name):
+            return (
+                (self.target_latency is None or expected(name, "seconds_per_page") <= self.target_latency)
+                and (self.max_cost is None or expected(name, "cost_per_page") <= self.max_cost)
+            )
+
+        # Among extractors meeting the goal the cheapest (latency goal) or fastest;
+        # when none does, the one closest to the goal
+        best = "cost_per_page" if self.target_latency is not None else "seconds_per_page"
+        closest = "cost_per_page" if self.target_latency is None and self.max_cost is not None else "seconds_per_page"
+
+        def key(name):
+            ok = meets_goal(name)
+            return estimates[name]["degraded"], not ok, expected(name, best if ok else closest)
+
+        return sorted(estimates, key=key)
+
+    def run(self, call, pages=1, label="input", cache=None):
+        """
+        Run call(name) with the best extractor, falling back to the next one on failure.
+
+        call returns the extractor's result (None when the input was skipped).
+        Calls answered from cache (the ResultCache passed to the extractors) and
+        failures caused by the input rather than the provider are not recorded.
+
+        Returns (name, result); raises RuntimeError when every extractor failed.
+        """
+        errors = []
+        for name in self.ranked(pages):
+            estimate = self.estimate(name)
+            verbose_print(
+                f"ROUTE: {label} -> {name} (~{estimate['seconds_per_page'] * pages:.1f}s, "
+                f"~${estimate['cost_per_page'] * pages:.4f}, failures {estimate['failure_rate']:.0%}"
+                f"{', degraded' if estimate['degraded'] else ''})",
+                self.verbose
+            )
+            hits_before = cache.thread_hits() if cache is not None else 0
+            start = time.monotonic()
+            try:
+                result = call(name)
+            except (Exception, SystemExit) as e:
+                # Extractors report errors and sys.exit() while handling them
+                cause = e.__context__ if isinstance(e, SystemExit) and e.__context__ is not None else e
+                if is_provider_error(cause):
+                    self._record(name, pages, time.monotonic() - start, False)
+                errors.append(f"{name}: {cause}")
+                print(f"ROUTE: {label}: {name} failed, trying the next extractor", file=sys.stderr)
+                continue
+            # Cache hits and skipped inputs say nothing about the extractor
+            if result is not None and (cache is None or cache.thread_hits() == hits_before):
+                self._record(name, pages, time.monotonic() - start, True)
+            return name, result
+        raise RuntimeError(f"All extractors failed for {label}: {'; '.join(errors) or 'none available'}")
+
+    def _record(self, name, pages, seconds, ok):
+        cost = self.prices.get(name, DEFAULT_PRICE) * pages
+        with self._lock:
+            calls = self.calls.setdefault(name, {"calls": 0, "failed": 0, "seconds": 0.0, "cost": 0.0})
+            calls["calls"] += 1
+            calls["failed"] += not ok
+            calls["seconds"] += seconds
+            calls["cost"] += cost
+        if self.stats is not None:
+            try:
+                self.stats.record(name, pages, seconds, ok, cost)
+            except Exception as e:
+                print(f"WARNING: Could not record extractor statistics: {e}", file=sys.stderr)
+
+    def print_summary(self):
+        """Print calls, failures, time and approximate cost per extractor used in this run."""
+        for name, calls in sorted(self.calls.items()):
+            print(
+                f"ROUTER: {name}: {calls['calls']} calls ({calls['failed']} failed), "
+                f"{calls['seconds']:.1f}s, ~${calls['cost']:.4f}",
+                file=sys.stderr
+            )
+
+def open_stats(args):
+    """ExtractorStats selected by add_router_arguments(), or None when it cannot be opened."""
+    path = stats_path(args)
+    try:
+        return ExtractorStats(path)
+    except Exception as e:
+        # Routing still works on the priors
+        print(f"WARNING: Extractor statistics disabled, cannot open {path}: {e}", file=sys.stderr)
+        return None
+
+def open_router(args, candidates, stats=None):
+    """Router for parsed add_router_arguments() arguments."""
+    return Router(candidates, stats or open_stats(args), args.target_latency, args.max_cost, parse_prices(args.price), args.verbose)
+
+def print_stats(router):
+    """Print the current estimates of all extractors with history or a token."""
+    names = sorted(set(router.candidates) | set(router.stats.extractors() if router.stats else []))
+    print(f"{'extractor':<20} {'runs':>5} {'s/page':>8} {'$/page':>8} {'failures':>9}  state")
+    for name in names:
+        estimate = router.estimate(name)
+        state = "degraded" if estimate["degraded"] else "ok" if name in router.candidates else "no token"
+        print(
+            f"{name:<20} {estimate['runs']:>5} {estimate['seconds_per_page']:>8.1f} "
+            f"{estimate['cost_per_page']:>8.4f} {estimate['failure_rate']:>9.0%}  {state}"
+        )
+
+def main(argv=None):
+    import argparse
+
+    from ai_ocr.batch import add_batch_arguments, collect_inputs, run_batch
+    from ai_ocr.cache import add_cache_arguments, open_cache
+    from ai_ocr.metrics import add_metrics_arguments, configure_metrics
+    from ai_ocr.pdfprobe import get_no_of_pages_pdf
+    from ai_ocr.registry import get_extractor
+
+    parser = argparse.ArgumentParser(description="Convert each input with the extractor that best meets a latency or cost goal, based on recorded history")
+    parser.add_argument("inputs", nargs="*", metavar="input", help="Input PDF or image file(s) or glob pattern(s)")
+    parser.add_argument("-o", "--output", help="Output filename (single input only)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
+    parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
+    parser.add_argument("--extractors", help="Comma-separated extractors to choose from (default: all with an API token set)")
+    parser.add_argument("--stats", action="store_true", help="Show the recorded estimates per extractor and exit")
+    add_router_arguments(parser)
+    add_batch_arguments(parser, 4, "Number of inputs converted concurrently")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    allowed = set(args.extractors.split(",")) if args.extractors else None
+    stats = open_stats(args)
+    routers = {}
+    for kind in ("pdf", "image"):
+        candidates = [name for name in available_extractors(kind) if allowed is None or name in allowed]
+        routers[kind] = open_router(args, candidates, stats)
+    if args.stats:
+        print_stats(open_router(args, routers["pdf"].candidates + routers["image"].candidates, stats))
+        return
+
+    inputs = collect_inputs(parser, args)
+    configure_metrics(args)
+    cache = open_cache(args)
+
+    def route(input_file):
+        kind = "pdf" if input_file.lower().endswith(".pdf") else "image"
+        pages = 1
+        if kind == "pdf":
+            pages = get_no_of_pages_pdf(input_file, args.verbose, os.path.expanduser(args.cache_dir))
+            if not isinstance(pages, int):
+                pages = 1
+
+        def call(name):
+            return get_extractor(name).extract(input_file, args.output, verbose=args.verbose, force=args.force, cache=cache)
+
+        return routers[kind].run(call, pages, input_file, cache)[1]
+
+    failed = run_batch(route, inputs, args.jobs, args.verbose)
+    for router in routers.values():
+        router.print_summary()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
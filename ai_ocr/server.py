@@ -0,0 +1,355 @@
+"""
+`ai-ocr serve`: long-lived OCR daemon on a local Unix socket.
+
+Every wrapper invocation otherwise pays interpreter start, SDK imports, client
+setup and fresh TLS connections before any work happens. The daemon keeps one
+process with warm Replicate scheduler, DeepInfra clients and download session,
+and runs jobs sent over `$AI_OCR_SOCKET` (default `$XDG_RUNTIME_DIR/ai-ocr.sock`).
+
+The wrappers act as thin clients: when the daemon is running they forward
+their files (absolute input/output paths plus extractor options) instead of
+processing them, unless `--no-daemon` is given. Results are streamed back per
+job as they finish, including the wrapper's own stdout/stderr lines, so the
+output looks the same as a local run.
+
+Protocol (newline-delimited JSON, one connection per client run):
+
+    client -> {"id": 1, "extractor": "nougat", "input": "/abs/in.pdf", "output": "/abs/in.md",
+               "options": {...}, "verbose": false, "force": false, "cache_dir": "/abs/cache" | null}
+    client -> (shutdown write side when all jobs are sent)
+    server -> {"id": 1, "stream": "stdout" | "stderr", "text": "..."}   (any number)
+    server -> {"id": 1, "status": "done" | "skipped" | "failed", "output": "/abs/in.md" | null}
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_ocr.batch import print_batch_summary
+from ai_ocr.cache import ResultCache, default_cache_dir
+from ai_ocr.common import PROVIDER_TOKENS, verbose_print
+
+DEFAULT_JOBS = 64
+
+def default_socket_path():
+    """Return daemon socket path from $AI_OCR_SOCKET, $XDG_RUNTIME_DIR or a private directory in the cache dir."""
+    if os.environ.get("AI_OCR_SOCKET"):
+        return os.environ["AI_OCR_SOCKET"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "ai-ocr.sock")
+    return os.path.join(default_cache_dir(), "daemon", "ai-ocr.sock")
+
+def add_daemon_arguments(parser):
+    """Add --socket and --no-daemon arguments (thin client mode) to an argparse parser."""
+    parser.add_argument("--socket", default=default_socket_path(), help="Socket of a running 'ai-ocr serve' daemon to forward files to (default: $AI_OCR_SOCKET or $XDG_RUNTIME_DIR/ai-ocr.sock)")
+    parser.add_argument("--no-daemon", action="store_true", help="Process files in this process even when the daemon is running")
+
+def connect(socket_path):
+    """Return a connected socket to the daemon, or None when it is not running."""
+    if not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def local_only_options(args):
+    """
+    Options given on the command line that a forwarded job would silently lose.
+
+    The daemon uses its own API tokens, rate limits, retries, metrics file,
+    journal and scheduler settings, so runs that set any of them are processed
+    locally instead.
+    """
+    from ai_ocr.predictions import DEFAULT_MAX_IN_FLIGHT, DEFAULT_POLL_INTERVAL
+    from ai_ocr.resilience import DEFAULT_MAX_RETRIES
+
+    defaults = {
+        "key_file": None,
+        "rate_limit": None,
+        "max_retries": DEFAULT_MAX_RETRIES,
+        "metrics_file": None,
+        "journal": None,
+        "no_journal": False,
+        "max_in_flight": DEFAULT_MAX_IN_FLIGHT,
+        "poll_interval": DEFAULT_POLL_INTERVAL,
+        "webhook_url": None,
+        "usage_log": None,
+        "no_usage_log": False,
+    }
+    return [f"--{name.replace('_', '-')}" for name, default in defaults.items() if getattr(args, name, default) != default]
+
+def forward_to_daemon(args, extractor, inputs, output_for, options=None):
+    """
+    Send inputs to a running daemon and relay its output.
+
+    output_for(input_file) returns the output filename a local run would write.
+    Returns the number of failed files, or None when no daemon is reachable (or
+    --no-daemon or a local-only option was given) and the caller should process
+    the files itself.
+    """
+    if args.no_daemon:
+        return None
+    local_only = local_only_options(args)
+    if local_only:
+        verbose_print(f"Not forwarding to the daemon: {', '.join(local_only)} only apply in this process", args.verbose)
+        return None
+    sock = connect(args.socket)
+    if sock is None:
+        return None
+    verbose_print(f"Forwarding {len(inputs)} file(s) to daemon at {args.socket}", args.verbose)
+
+    cache_dir = None if args.no_cache else os.path.abspath(os.path.expanduser(args.cache_dir))
+    start = time.monotonic()
+    with sock, sock.makefile("rb") as reader:
+        for job_id, input_file in enumerate(inputs):
+            job = {
+                "id": job_id,
+                "extractor": extractor,
+                "input": os.path.abspath(input_file),
+                "output": os.path.abspath(output_for(input_file)),
+                "options": options or {},
+                "verbose": args.verbose,
+                "force": args.force,
+                "cache_dir": cache_dir,
+            }
+            sock.sendall(json.dumps(job).encode("utf-8") + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+
+        counts = {"done": 0, "skipped": 0, "failed": 0}
+        for line in reader:
+            message = json.loads(line)
+            if "stream" in message:
+                stream = sys.stdout if message["stream"] == "stdout" else sys.stderr
+                stream.write(message["text"])
+                stream.flush()
+                continue
+            counts[message["status"]] += 1
+            if message["status"] == "failed" and len(inputs) > 1:
+                print(f"FAILED: {inputs[message['id']]}", file=sys.stderr)
+
+    lost = len(inputs) - sum(counts.values())
+    if lost:
+        print(f"Error: daemon connection closed with {lost} job(s) unfinished", file=sys.stderr)
+        counts["failed"] += lost
+    if len(inputs) > 1:
+        print_batch_summary(len(inputs), counts["done"], counts["skipped"], counts["failed"], time.monotonic() - start)
+    return counts["failed"]
+
+class _JobStreams:
+    """sys.stdout/sys.stderr replacement sending writes of job threads to their client."""
+
+    def __init__(self, original, name):
+        self.original = original
+        self.name = name
+        self.local = threading.local()
+
+    def write(self, text):
+        send = getattr(self.local, "send", None)
+        if send is None:
+            return self.original.write(text)
+        send(self.name, text)
+        return len(text)
+
+    def flush(self):
+        if getattr(self.local, "send", None) is None:
+            self.original.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.original, name)
+
+class OcrDaemon:
+    """Runs extractor jobs from many clients on one warm set of API clients."""
+
+    def __init__(self, socket_path, jobs=DEFAULT_JOBS, scheduler=None, verbose=False):
+        self.socket_path = socket_path
+        self.verbose = verbose
+        self.scheduler = scheduler
+        self.executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="ocr-job")
+        self.stats = {"jobs": 0, "failed": 0}
+        self._caches = {}
+        self._lock = threading.Lock()
+        self.stdout = _JobStreams(sys.stdout, "stdout")
+        self.stderr = _JobStreams(sys.stderr, "stderr")
+
+    def cache_for(self, cache_dir):
+        """Return the (shared) ResultCache of a directory, or None."""
+        if not cache_dir:
+            return None
+        with self._lock:
+            if cache_dir not in self._caches:
+                self._caches[cache_dir] = ResultCache(cache_dir)
+            return self._caches[cache_dir]
+
+    def run_job(self, job, send):
+        """Run one job in the calling worker thread; returns the final status message."""
+        from ai_ocr.registry import get_extractor
+
+        self.stdout.local.send = self.stderr.local.send = send
+        status, output = "failed", None
+        try:
+            extractor = get_extractor(job["extractor"])
+            if extractor is None:
+                raise ValueError(f"unknown extractor: {job['extractor']}")
+            names = PROVIDER_TOKENS.get(extractor.provider, ())
+            if names and not any(name in os.environ for name in names):
+                raise RuntimeError(f"{names[0]} is not set in the daemon's environment")
+            options = dict(job.get("options") or {})
+            if extractor.provider == "replicate" and self.scheduler is not None:
+                options["scheduler"] = self.scheduler
+            output = extractor.extract(
+                job["input"], job["output"],
+                verbose=job.get("verbose", False), force=job.get("force", False),
+                cache=self.cache_for(job.get("cache_dir")), **options
+            )
+            status = "done" if output is not None else "skipped"
+        except SystemExit:
+            # The extractor already printed its error
+            pass
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+        finally:
+            self.stdout.local.send = self.stderr.local.send = None
+        with self._lock:
+            self.stats["jobs"] += 1
+            self.stats["failed"] += status == "failed"
+        return {"id": job.get("id"), "status": status, "output": output}
+
+    def handle_connection(self, connection):
+        """Read jobs from one client connection and stream back output and results."""
+        send_lock = threading.Lock()
+
+        def send_message(message):
+            data = json.dumps(message).encode("utf-8") + b"\n"
+            with send_lock:
+                try:
+                    connection.sendall(data)
+                except OSError:
+                    pass  # Client went away; the job still finishes and fills the cache
+
+        futures = []
+        with connection.makefile("rb") as reader:
+            for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    job = json.loads(line)
+                except ValueError as e:
+                    send_message({"id": None, "status": "failed", "output": None, "error": f"bad job: {e}"})
+                    continue
+                verbose_print(f"Job {job.get('extractor')}: {job.get('input')}", self.verbose)
+
+                def send(stream, text, job_id=job.get("id")):
+                    send_message({"id": job_id, "stream": stream, "text": text})
+
+                def run(job=job, send=send):
+                    send_message(self.run_job(job, send))
+
+                futures.append(self.executor.submit(run))
+        # Keep the connection open until every result is sent
+        for future in futures:
+            future.result()
+
+    def serve_forever(self):
+        """Listen on the socket until interrupted."""
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                daemon.handle_connection(self.request)
+
+        prepare_socket_path(self.socket_path)
+        # Jobs run with the user's file access; other users must not submit them.
+        # The socket is created 0600 rather than chmod'ed after bind, which would
+        # leave a window; no worker thread exists yet to see the umask change.
+        umask = os.umask(0o077)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(umask)
+        server.daemon_threads = True
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+
+        def stop(signum, frame):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        print(f"Serving on {self.socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if self.scheduler is not None:
+                self.scheduler.close()
+            sys.stdout, sys.stderr = self.stdout.original, self.stderr.original
+            print(f"Stopped after {self.stats['jobs']} job(s), {self.stats['failed']} failed", file=sys.stderr)
+
+def prepare_socket_path(socket_path):
+    """Remove a stale socket file; exit when another daemon is already listening."""
+    sock = connect(socket_path)
+    if sock is not None:
+        sock.close()
+        print(f"ERROR: A daemon is already listening on {socket_path}", file=sys.stderr)
+        sys.exit(1)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if directory == os.path.dirname(os.path.join(default_cache_dir(), "daemon", "ai-ocr.sock")):
+        # The fallback directory is ours alone, unlike a shared cache dir
+        os.chmod(directory, 0o700)
+
+def warm_up(verbose=False):
+    """Import extractor modules and provider SDKs up front so the first job is fast."""
+    from ai_ocr.registry import EXTRACTORS
+
+    for name, extractor in EXTRACTORS.items():
+        try:
+            extractor.load()
+        except ImportError as e:
+            verbose_print(f"Extractor {name} unavailable: {e}", verbose)
+    for module in ("replicate", "openai", "requests"):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+def main(argv=None):
+    from ai_ocr.metrics import add_metrics_arguments, configure_metrics
+    from ai_ocr.predictions import add_scheduler_arguments, open_scheduler
+    from ai_ocr.usage import add_usage_arguments, configure_usage
+
+    parser = argparse.ArgumentParser(description="Run OCR jobs for the ai-ocr wrappers from a long-lived process on a Unix socket")
+    parser.add_argument("--socket", default=default_socket_path(), help="Socket path to listen on (default: $AI_OCR_SOCKET or $XDG_RUNTIME_DIR/ai-ocr.sock)")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS, help=f"Jobs processed concurrently (default: {DEFAULT_JOBS})")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
+    add_scheduler_arguments(parser)
+    add_metrics_arguments(parser)
+    add_usage_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    configure_metrics(args)
+    configure_usage(args)
+
+    warm_up(args.verbose)
+    daemon = OcrDaemon(args.socket, args.jobs, open_scheduler(args), args.verbose)
+    daemon.serve_forever()
+
+if __name__ == "__main__":
+    main()
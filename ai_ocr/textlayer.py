@@ -0,0 +1,167 @@
+"""
+Born-digital text layer routing for the page pipeline.
+
+Many PDFs already carry a perfect text layer, and OCR'ing them remotely only
+costs time and money. `TextLayerRouter.extract()` reads the text layer of a
+page range locally (`pdftotext`, or pypdf as fallback, whichever worked last
+first) and scores every page:
+
+* coverage - enough non-whitespace characters to be a real text page,
+* garbage  - share of replacement, control, private-use and `(cid:N)` characters,
+* words    - share of tokens that look like words or numbers,
+* fonts    - (pypdf only) CID fonts without a ToUnicode map, Type3 fonts and
+             glyph-number encodings, which extract as mojibake.
+
+Pages that pass are taken as they are; scanned, formula-heavy or garbled pages
+go to the OCR extractor. Pages come back in the page pipeline's merged output
+either way.
+"""
+
+import re
+import subprocess
+import sys
+import unicodedata
+
+from ai_ocr.common import verbose_print
+
+# Fewer non-whitespace characters than this: scanned or image-only page
+MIN_CHARS = 50
+MAX_GARBAGE_RATIO = 0.02
+MIN_WORD_RATIO = 0.7
+
+_CID_RE = re.compile(r"\(cid:\d+\)")
+_WORD_RE = re.compile(r"^(?:[^\W\d_]+(?:['’-][^\W\d_]+)*|\d[\d.,:/%-]*)$")
+_TOKEN_STRIP = "\"'“”‘’()[]{}<>.,;:!?*"
+_GLYPH_NAME_RE = re.compile(r"^/(?:g|glyph|cid|index|G)\d+$")
+
+# Name of the backend that last extracted successfully, tried first next time
+_preferred_backend = None
+
+def add_text_layer_arguments(parser):
+    """Add --no-text-layer argument to an argparse parser."""
+    parser.add_argument("--no-text-layer", action="store_true", help="OCR every page, even pages with a usable embedded text layer")
+
+def extract_with_pdftotext(pdf_filename, first_page, last_page):
+    """Text of pages first..last with one pdftotext process (pages end with a form feed)."""
+    result = subprocess.run(
+        ['pdftotext', '-enc', 'UTF-8', '-f', str(first_page), '-l', str(last_page), pdf_filename, '-'],
+        check=True, capture_output=True
+    )
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    if len(pages) < last_page - first_page + 1:
+        raise RuntimeError(f"pdftotext returned {len(pages)} pages")
+    return {first_page + index: pages[index] for index in range(last_page - first_page + 1)}
+
+def extract_with_pypdf(pdf_filename, first_page, last_page):
+    """Text of pages first..last with pypdf."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_filename)
+    return {page_no: reader.pages[page_no - 1].extract_text() or "" for page_no in range(first_page, last_page + 1)}
+
+EXTRACT_BACKENDS = {
+    "pdftotext": extract_with_pdftotext,
+    "pypdf": extract_with_pypdf,
+}
+
+def extract_text_layer(pdf_filename, first_page, last_page, verbose=False):
+    """Return {page_no: text} of the embedded text layer, or None when no backend works."""
+    global _preferred_backend
+    names = list(EXTRACT_BACKENDS)
+    if _preferred_backend in names:
+        names.remove(_preferred_backend)
+        names.insert(0, _preferred_backend)
+    for name in names:
+        try:
+            pages = EXTRACT_BACKENDS[name](pdf_filename, first_page, last_page)
+        except Exception as e:
+            verbose_print(f"DEBUG: {name} text extraction failed: {str(e)}", verbose)
+            continue
+        _preferred_backend = name
+        return pages
+    return None
+
+def unmapped_fonts(pdf_filename, first_page, last_page):
+    """Return {page_no: font name} of pages using a font whose text cannot be mapped to Unicode."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return {}
+    suspicious = {}
+    reader = PdfReader(pdf_filename)
+    for page_no in range(first_page, last_page + 1):
+        try:
+            fonts = reader.pages[page_no - 1].get("/Resources", {}).get_object().get("/Font", {}).get_object()
+            for name, font in fonts.items():
+                font = font.get_object()
+                subtype = font.get("/Subtype")
+                if "/ToUnicode" in font:
+                    continue
+                encoding = font.get("/Encoding")
+                encoding = encoding.get_object() if encoding is not None else None
+                differences = encoding.get("/Differences", []) if hasattr(encoding, "get") else []
+                if subtype in ("/Type0", "/Type3") or any(_GLYPH_NAME_RE.match(str(glyph)) for glyph in differences):
+                    suspicious[page_no] = f"{name} ({subtype})"
+                    break
+        except Exception:
+            # Unreadable resources: leave the decision to the text checks
+            continue
+    return suspicious
+
+def score_page(text):
+    """Return (usable, reason) for the text layer of one page."""
+    chars = [c for c in text if not c.isspace()]
+    if len(chars) < MIN_CHARS:
+        return False, f"{len(chars)} characters"
+    cid = sum(len(match) for match in _CID_RE.findall(text))
+    garbage = cid + sum(
+        1 for c in chars
+        if c == "�" or unicodedata.category(c) in ("Cc", "Co", "Cn")
+    )
+    if garbage / len(chars) > MAX_GARBAGE_RATIO:
+        return False, f"{garbage / len(chars):.0%} garbage characters"
+    tokens = [token.strip(_TOKEN_STRIP) for token in text.split()]
+    tokens = [token for token in tokens if token]
+    words = sum(1 for token in tokens if _WORD_RE.match(token))
+    if not tokens or words / len(tokens) < MIN_WORD_RATIO:
+        return False, f"{words}/{len(tokens)} word-like tokens"
+    return True, f"{len(chars)} characters"
+
+def clean_text(text):
+    """Text layer as Markdown paragraphs: trailing spaces and excess blank lines removed."""
+    lines = [line.rstrip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+class TextLayerRouter:
+    """Decides per page between the embedded text layer and OCR, and counts the API calls saved."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.pages = 0
+        self.local_pages = 0
+
+    def extract(self, pdf_filename, first_page, last_page, skip=()):
+        """Return {page_no: text} of pages in first..last (except skip) whose text layer is usable."""
+        pages = extract_text_layer(pdf_filename, first_page, last_page, self.verbose)
+        if pages is None:
+            print(f"WARNING: {pdf_filename}: cannot read the text layer (install poppler-utils or pypdf), OCR'ing all pages", file=sys.stderr)
+            return {}
+        fonts = unmapped_fonts(pdf_filename, first_page, last_page)
+        usable = {}
+        for page_no, text in pages.items():
+            if page_no in skip:
+                continue
+            self.pages += 1
+            ok, reason = score_page(text)
+            if ok and page_no in fonts:
+                ok, reason = False, f"font {fonts[page_no]} without Unicode mapping"
+            if ok:
+                usable[page_no] = clean_text(text)
+            verbose_print(f"TEXT LAYER: {pdf_filename} page {page_no}: {'used' if ok else 'OCR'} ({reason})", self.verbose)
+        self.local_pages += len(usable)
+        return usable
+
+    def print_summary(self):
+        """Print how many pages were taken from text layers instead of OCR'd."""
+        rate = 100.0 * self.local_pages / self.pages if self.pages else 0.0
+        print(f"TEXT LAYER: {self.local_pages}/{self.pages} pages extracted locally ({rate:.1f}%), {self.local_pages} OCR API calls avoided", file=sys.stderr)
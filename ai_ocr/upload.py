@@ -0,0 +1,47 @@
+"""
+Bounded-memory upload helpers.
+
+Replicate inputs are passed as open file handles, which the replicate client
+streams to its files API in chunks, so the document is never held in memory.
+Where an inline base64 data URI is unavoidable (OpenAI-compatible chat APIs),
+the file is base64-encoded chunk by chunk into an anonymous temporary file and
+decoded into the final `str` straight from an mmap of it: the only full-size
+copy kept in memory is the data URI itself.
+"""
+
+import base64
+import mmap
+import os
+import tempfile
+
+from ai_ocr.metrics import span
+
+# Multiple of 3, so base64 chunks concatenate without padding in between
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+def open_for_upload(file_path):
+    """Open input file for streaming upload (use as context manager)."""
+    return open(file_path, "rb")
+
+def iter_base64_chunks(file_obj, chunk_size=BASE64_CHUNK_SIZE):
+    """Yield base64-encoded bytes chunks of file_obj, reading chunk_size bytes at a time."""
+    if chunk_size % 3:
+        raise ValueError("chunk_size must be a multiple of 3")
+    for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+        yield base64.b64encode(chunk)
+
+def build_data_uri(file_path, mime_type):
+    """Build `data:<mime>;base64,...` string for file_path with flat intermediate memory."""
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return prefix.decode("ascii")
+    with span("encode", input=file_path, bytes_in=size) as fields, tempfile.TemporaryFile() as spool, open(file_path, "rb") as source:
+        spool.write(prefix)
+        for encoded in iter_base64_chunks(source):
+            spool.write(encoded)
+        spool.flush()
+        with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data_uri = str(mapped, "ascii")
+        fields["bytes_out"] = len(data_uri)
+        return data_uri
@@ -0,0 +1,278 @@
+"""
+Token and throughput accounting for OpenAI-compatible chat completions.
+
+Every DeepInfra call records its model, task, prompt and completion tokens,
+latency, finish reason, requested `max_tokens` and the image's size in a
+SQLite log (default `<cache-dir>/usage.sqlite3`, `--usage-log PATH`,
+`--no-usage-log`). It is opened on the first recorded call, like the journal
+it is process-wide.
+
+The log serves two purposes:
+
+* `ai-ocr usage` reports tokens/sec and tokens per page by task, and projects
+  tokens, cost and time for a corpus (`--pages N`);
+* `--max-tokens auto` sizes the generation budget per task from the recorded
+  completion lengths (p99 with headroom) instead of reserving 8192 tokens for
+  every page. A response cut off at an auto limit is requested again with the
+  full 8192, so auto never truncates output.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+
+from ai_ocr.cache import SQLiteStore, cache_path, default_cache_dir
+from ai_ocr.metrics import quantile
+
+DEFAULT_MAX_TOKENS = 8192
+# Recorded calls of a task needed before auto sizing kicks in
+MIN_SAMPLES = 20
+HISTORY = 500
+HEADROOM = 1.5
+MIN_AUTO_MAX_TOKENS = 512
+ROUND_TO = 256
+# Approximate list prices in USD per million tokens (override with --price-input/--price-output)
+PRICE_PER_M_INPUT = 0.03
+PRICE_PER_M_OUTPUT = 0.10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    finished REAL NOT NULL,
+    model TEXT NOT NULL,
+    task TEXT NOT NULL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    seconds REAL NOT NULL,
+    finish_reason TEXT,
+    max_tokens INTEGER,
+    image_bytes INTEGER,
+    width INTEGER,
+    height INTEGER
+);
+CREATE INDEX IF NOT EXISTS calls_task ON calls (model, task, finished);
+"""
+
+def default_usage_path():
+    """Return the usage log path inside the result cache directory."""
+    return os.path.join(default_cache_dir(), "usage.sqlite3")
+
+def usage_path(args):
+    """Return the --usage-log path, or usage.sqlite3 inside the --cache-dir."""
+    return os.path.expanduser(args.usage_log) if args.usage_log else cache_path(args, "usage.sqlite3")
+
+def add_usage_arguments(parser):
+    """Add --usage-log and --no-usage-log arguments to an argparse parser."""
+    parser.add_argument("--usage-log", help="Token usage log of API calls (default: <cache-dir>/usage.sqlite3)")
+    parser.add_argument("--no-usage-log", action="store_true", help="Do not record token usage")
+
+def max_tokens_type(value):
+    """argparse type for --max-tokens: a positive number or auto."""
+    if value == "auto":
+        return value
+    try:
+        tokens = int(value)
+    except ValueError:
+        tokens = 0
+    if tokens < 1:
+        import argparse
+        raise argparse.ArgumentTypeError(f"expected a positive number of tokens or auto, got {value!r}")
+    return tokens
+
+def task_label(task_type, custom_prompt=None):
+    """Task name usage is grouped by: the task type, or custom for own prompts."""
+    return "custom" if custom_prompt else task_type
+
+class UsageLog(SQLiteStore):
+    """Thread-safe SQLite log of API calls."""
+
+    def __init__(self, path):
+        super().__init__(path, SCHEMA)
+
+    def record(self, model, task, prompt_tokens, completion_tokens, seconds, finish_reason, max_tokens, image_bytes, width, height):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO calls (finished, model, task, prompt_tokens, completion_tokens, seconds, finish_reason, max_tokens, image_bytes, width, height) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), model, task, prompt_tokens, completion_tokens, seconds, finish_reason, max_tokens, image_bytes, width, height)
+            )
+
+    def completion_tokens(self, model, task, limit=HISTORY):
+        """Completion token counts of the latest calls of a task."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT completion_tokens FROM calls WHERE model = ? AND task = ? AND completion_tokens IS NOT NULL ORDER BY finished DESC LIMIT ?",
+                (model, task, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def calls(self, since=0.0, task=None):
+        """Calls finished after since, as dicts, oldest first."""
+        query = "SELECT finished, model, task, prompt_tokens, completion_tokens, seconds, finish_reason, max_tokens, image_bytes, width, height FROM calls WHERE finished >= ?"
+        params = [since]
+        if task:
+            query += " AND task = ?"
+            params.append(task)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY finished", params).fetchall()
+        names = ("finished", "model", "task", "prompt_tokens", "completion_tokens", "seconds", "finish_reason", "max_tokens", "image_bytes", "width", "height")
+        return [dict(zip(names, row)) for row in rows]
+
+_path = default_usage_path()
+_log = None
+_log_lock = threading.Lock()
+_auto_limits = {}
+
+def configure_usage(args):
+    """Select the usage log from add_usage_arguments() arguments (opened on first use)."""
+    global _path, _log
+    path = None if args.no_usage_log else usage_path(args)
+    with _log_lock:
+        if path != _path:
+            _path, _log = path, None
+            _auto_limits.clear()
+
+def current_usage_log():
+    """Return the process-wide UsageLog, or None when disabled or unavailable."""
+    global _path, _log
+    with _log_lock:
+        if _log is None and _path:
+            try:
+                _log = UsageLog(_path)
+            except Exception as e:
+                # Accounting must not stop the run itself
+                print(f"WARNING: Usage log disabled, cannot open {_path}: {e}", file=sys.stderr)
+                _path = None
+        return _log
+
+def auto_max_tokens(model, task):
+    """max_tokens for a task: recorded p99 completion length with headroom, or DEFAULT_MAX_TOKENS."""
+    key = (model, task)
+    if key in _auto_limits:
+        return _auto_limits[key]
+    log = current_usage_log()
+    tokens = log.completion_tokens(model, task) if log is not None else []
+    limit = DEFAULT_MAX_TOKENS
+    if len(tokens) >= MIN_SAMPLES:
+        p99 = quantile(sorted(tokens), 0.99)
+        limit = min(DEFAULT_MAX_TOKENS, max(MIN_AUTO_MAX_TOKENS, math.ceil(p99 * HEADROOM / ROUND_TO) * ROUND_TO))
+    # Computed once per process, so a batch uses one limit per task
+    _auto_limits[key] = limit
+    return limit
+
+def resolve_max_tokens(max_tokens, model, task):
+    """Return the max_tokens to request: max_tokens itself, or the auto limit of the task."""
+    return auto_max_tokens(model, task) if max_tokens == "auto" else max_tokens
+
+def finish_reason(response):
+    return getattr(response.choices[0], "finish_reason", None) if response.choices else None
+
+def should_retry_truncated(response, max_tokens, limit):
+    """True when an auto-sized request ran out of tokens and the full budget was not tried yet."""
+    return max_tokens == "auto" and limit < DEFAULT_MAX_TOKENS and finish_reason(response) == "length"
+
+def image_size(input_file):
+    """(width, height) of an image, or (None, None) without Pillow or for unreadable files."""
+    try:
+        from PIL import Image
+
+        with Image.open(input_file) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+def record_usage(model, task, response, seconds, input_file, image_bytes, max_tokens):
+    """Record one completed call in the usage log (no-op when disabled)."""
+    log = current_usage_log()
+    if log is None:
+        return
+    usage = response.usage
+    width, height = image_size(input_file)
+    try:
+        log.record(
+            model, task,
+            usage.prompt_tokens if usage is not None else None,
+            usage.completion_tokens if usage is not None else None,
+            seconds, finish_reason(response), max_tokens, image_bytes, width, height
+        )
+    except Exception as e:
+        print(f"WARNING: Could not record token usage: {e}", file=sys.stderr)
+
+def format_duration(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}min"
+    return f"{seconds / 3600:.1f}h"
+
+def print_report(calls, pages=None, jobs=1, price_input=PRICE_PER_M_INPUT, price_output=PRICE_PER_M_OUTPUT, file=sys.stdout):
+    """Print tokens/sec and tokens per page by task, and a corpus projection."""
+    tasks = {}
+    for call in calls:
+        if call["completion_tokens"] is not None:
+            tasks.setdefault((call["model"], call["task"]), []).append(call)
+    if not tasks:
+        print("No calls recorded", file=file)
+        return
+    print(
+        f"{'task':<22} {'calls':>6} {'prompt/page':>11} {'completion/page p50/p95/p99/max':>32} "
+        f"{'tok/s':>7} {'s/page':>7} {'cut off':>7} {'auto max':>8}",
+        file=file
+    )
+    for (model, task), entries in sorted(tasks.items()):
+        completion = sorted(call["completion_tokens"] for call in entries)
+        prompt = [call["prompt_tokens"] or 0 for call in entries]
+        seconds = sum(call["seconds"] for call in entries)
+        truncated = sum(1 for call in entries if call["finish_reason"] == "length")
+        spread = "/".join(str(value) for value in (
+            quantile(completion, 0.5), quantile(completion, 0.95), quantile(completion, 0.99), completion[-1]
+        ))
+        print(
+            f"{task[:22]:<22} {len(entries):>6} {sum(prompt) / len(prompt):>11.0f} {spread:>32} "
+            f"{sum(completion) / seconds if seconds else 0:>7.1f} {seconds / len(entries):>7.1f} {truncated:>7} "
+            f"{auto_max_tokens(model, task):>8}",
+            file=file
+        )
+    if not pages:
+        return
+    print(f"\nProjection for {pages} pages (${price_input:g}/M prompt, ${price_output:g}/M completion tokens, {jobs} concurrent requests):", file=file)
+    for (model, task), entries in sorted(tasks.items()):
+        prompt = sum(call["prompt_tokens"] or 0 for call in entries) / len(entries) * pages
+        completion = sum(call["completion_tokens"] for call in entries) / len(entries) * pages
+        cost = (prompt * price_input + completion * price_output) / 1e6
+        duration = sum(call["seconds"] for call in entries) / len(entries) * pages / max(jobs, 1)
+        print(
+            f"  {task}: {prompt / 1e6:.2f}M prompt + {completion / 1e6:.2f}M completion tokens, "
+            f"~${cost:.2f}, ~{format_duration(duration)}",
+            file=file
+        )
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report recorded token usage: tokens/sec and tokens per page by task, and corpus projections")
+    parser.add_argument("--task", help="Only calls of this task (e.g. 'Free OCR', custom)")
+    parser.add_argument("--days", type=float, help="Only calls of the last DAYS days")
+    parser.add_argument("--pages", type=int, help="Project tokens, cost and time for a corpus of this many pages")
+    parser.add_argument("-j", "--jobs", type=int, default=16, help="Concurrent requests assumed for the time projection (default: 16)")
+    parser.add_argument("--price-input", type=float, default=PRICE_PER_M_INPUT, help=f"USD per million prompt tokens (default: {PRICE_PER_M_INPUT:g})")
+    parser.add_argument("--price-output", type=float, default=PRICE_PER_M_OUTPUT, help=f"USD per million completion tokens (default: {PRICE_PER_M_OUTPUT:g})")
+    parser.add_argument("--usage-log", help="Token usage log (default: <cache-dir>/usage.sqlite3)")
+    parser.add_argument("--cache-dir", default=default_cache_dir(), help="Result cache directory (default: $AI_OCR_CACHE_DIR or ~/.cache/ai_ocr_wrappers)")
+    args = parser.parse_args(argv)
+
+    path = usage_path(args)
+    if not os.path.exists(path):
+        print(f"No usage recorded yet ({path} does not exist)")
+        return
+    args.no_usage_log = False
+    configure_usage(args)
+    log = current_usage_log()
+    if log is None:
+        sys.exit(1)
+    since = time.time() - args.days * 86400 if args.days else 0.0
+    print_report(log.calls(since, args.task), args.pages, args.jobs, args.price_input, args.price_output)
+
+if __name__ == "__main__":
+    main()
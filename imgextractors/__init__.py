@@ -0,0 +1 @@
+"""Image OCR extractors (each module also runs as a standalone script)."""
@@ -1,8 +1,10 @@
 #!/usr/bin/env -S uv run
 # /// script
 # dependencies = [
-#   "replicate>=0.25.0",
+#   "replicate>=1.0.0",
 #   "requests>=2.31.0",
+#   "pillow>=10.0.0",
+#   "numpy>=1.24.0",
 # ]
 # requires-python = ">=3.11"
 # ///
@@ -10,110 +12,127 @@
 import argparse
 import os
 import sys
-import requests
-import replicate
-import base64
-
-def verbose_print(message, verbose=False):
-    """Print message if verbose mode is enabled."""
-    if verbose:
-        print(message, file=sys.stderr)
-
-def check_api_token():
-    """Check if REPLICATE_API_TOKEN is set."""
-    if "REPLICATE_API_TOKEN" not in os.environ:
-        print("ERROR: REPLICATE_API_TOKEN is not set", file=sys.stderr)
-        sys.exit(1)
 
-def normalize_filename(filename, max_length=64):
-    """Normalize filename to a valid format."""
-    base = os.path.splitext(os.path.basename(filename))[0]
-    normalized = ''.join(c.lower() if c.isalnum() else '_' for c in base)
-    return normalized[:max_length]
-
-def generate_output_filename(input_filename, output_filename):
-    """Generate output filename based on input file or output flag."""
-    if output_filename:
-        return output_filename
-    else:
-        return normalize_filename(input_filename) + ".txt"
-
-def encode_file_to_base64(file_path):
-    """Encode the input file to base64."""
-    with open(file_path, "rb") as file:
-        return base64.b64encode(file.read()).decode('utf-8')
-
-def truncate_long_string(data, max_length=1024):
-    """Truncate long strings for verbose output."""
-    if len(data) > max_length:
-        return f"{data[:64]} (...) {data[-64:]}"
-    return data
-
-def extract_text_from_image(input_file, output_file, verbose=False, force=False):
-    """Extract text from image using Replicate's OCR-Surya API."""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_ocr.batch import add_batch_arguments, collect_inputs
+from ai_ocr.cache import add_cache_arguments, make_cache_key, open_cache
+from ai_ocr.common import check_api_token, generate_output_filename, truncate_long_string, verbose_print
+from ai_ocr.download import download_many, output_url
+from ai_ocr.metrics import add_metrics_arguments, configure_metrics
+from ai_ocr.predictions import PredictionJob, add_scheduler_arguments, open_scheduler, run_prediction_batch, run_prediction_job
+from ai_ocr.preprocess import SURYA_MAX_SIDE, add_preprocess_arguments, discard_preprocessed, preprocess_image
+from ai_ocr.server import add_daemon_arguments, forward_to_daemon
+
+MODEL_VERSION = "cudanexus/ocr-surya:7ab5bedee2cd1f0c82b2df6718d19bf0b473f738f9db062f122e47e1467f96ce"
+
+def prepare_extraction(input_file, output_file, verbose=False, force=False, cache=None, save_image=False, preprocess=True):
+    """Return the output filename (cache hit), None (skipped) or a PredictionJob for one image."""
     verbose_print(f"Extracting text from image: {input_file}", verbose)
 
-    final_output_file = generate_output_filename(input_file, output_file)
+    final_output_file = generate_output_filename(input_file, output_file, ".txt")
 
     if not force and os.path.exists(final_output_file):
         print(f"SKIPPING: File '{final_output_file}' already exists.", file=sys.stderr)
-        return
+        return None
+
+    cache_key = None
+    if cache:
+        # Preprocessed uploads can OCR differently, so they are cached separately
+        cache_key = make_cache_key(input_file, MODEL_VERSION, "Run OCR", {"preprocess": SURYA_MAX_SIDE} if preprocess else None)
+        if cache.copy_to(cache_key, final_output_file):
+            verbose_print(f"Cache hit, text saved as: {final_output_file}", verbose)
+            print(f"{final_output_file}")
+            return final_output_file
 
-    try:
-        # Encode the input file to base64
-        encoded_file = encode_file_to_base64(input_file)
-        verbose_print(f"Encoded file to base64: {truncate_long_string(encoded_file)}", verbose)
-
-        # Prepare the input for the API
-        api_input = {
-            "image": f"data:image/jpeg;base64,{encoded_file}",
-            "action": "Run OCR"
-        }
-        verbose_print(f"API input prepared: {truncate_long_string(str(api_input))}", verbose)
-
-        # Call the API
-        verbose_print("Calling Replicate API...", verbose)
-        output = replicate.run(
-            "cudanexus/ocr-surya:7ab5bedee2cd1f0c82b2df6718d19bf0b473f738f9db062f122e47e1467f96ce",
-            input=api_input
-        )
+    # The image is streamed to Replicate's files API when the prediction is created
+    upload_file = preprocess_image(input_file, SURYA_MAX_SIDE, verbose)[0] if preprocess else input_file
+    api_input = {
+        "action": "Run OCR"
+    }
+    verbose_print(f"API input prepared: {truncate_long_string(str(api_input))}", verbose)
+
+    def save_output(output):
         verbose_print(f"API output received: {truncate_long_string(str(output))}", verbose)
 
         if isinstance(output, dict) and 'text_file' in output:
-            # Download the text file from the FileOutput object
-            text_file_url = output['text_file'].url
-            response = requests.get(text_file_url)
-            response.raise_for_status()
-            content = response.text
-            
-            with open(final_output_file, "w", encoding="utf-8") as f:
-                f.write(content)
-            
+            # Stream the text file (and optionally the annotated image) straight to disk
+            downloads = [(output_url(output['text_file']), final_output_file)]
+            if save_image and output.get('image'):
+                image_url = output_url(output['image'])
+                image_ext = os.path.splitext(image_url.split('?')[0])[1] or ".png"
+                downloads.append((image_url, os.path.splitext(final_output_file)[0] + "_annotated" + image_ext))
+            for saved_file in download_many(downloads):
+                verbose_print(f"Downloaded: {saved_file}", verbose)
+
+            if cache:
+                cache.put_file(cache_key, final_output_file)
+
             verbose_print(f"Text saved as: {final_output_file}", verbose)
             print(f"{final_output_file}")
+            return final_output_file
         else:
             print("Error: Unexpected output format from the API.", file=sys.stderr)
             sys.exit(1)
 
+    # The preprocessed copy is only needed until it is uploaded
+    return PredictionJob(MODEL_VERSION, api_input, {"image": upload_file}, save_output,
+                         cleanup=lambda: discard_preprocessed(upload_file, input_file))
+
+def extract_text_from_image(input_file, output_file, verbose=False, force=False, cache=None, save_image=False, scheduler=None, preprocess=True):
+    """Extract text from image using Replicate's OCR-Surya API."""
+    try:
+        job = prepare_extraction(input_file, output_file, verbose, force, cache, save_image, preprocess)
+        if not isinstance(job, PredictionJob):
+            return job
+        return run_prediction_job(job, scheduler)
+
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Extract text from images using Replicate's OCR-Surya API")
-    parser.add_argument("input", help="Input image file")
-    parser.add_argument("-o", "--output", help="Output filename")
+    parser.add_argument("inputs", nargs="*", metavar="input", help="Input image file(s) or glob pattern(s)")
+    parser.add_argument("-o", "--output", help="Output filename (single input only)")
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
     parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
-    args = parser.parse_args()
-
-    check_api_token()
-    extract_text_from_image(
-        args.input,
-        args.output,
-        args.verbose,
-        args.force
+    parser.add_argument("--key-file", help="Path to file containing REPLICATE_API_TOKEN (e.g., ~/.env.replicate)")
+    parser.add_argument("--save-image", action="store_true", help="Also save the annotated OCR image as <output>_annotated.<ext>")
+    add_preprocess_arguments(parser)
+    add_batch_arguments(parser, 4, "Number of files uploaded/downloaded concurrently")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_daemon_arguments(parser)
+    args = parser.parse_args(argv)
+    inputs = collect_inputs(parser, args)
+    configure_metrics(args)
+
+    failed = forward_to_daemon(args, "surya", inputs, lambda input_file: generate_output_filename(input_file, args.output, ".txt"), {"save_image": args.save_image, "preprocess": not args.no_preprocess})
+    if failed is not None:
+        sys.exit(1 if failed else 0)
+    cache = open_cache(args)
+
+    check_api_token("replicate", args.key_file)
+    scheduler = open_scheduler(args)
+    failed = run_prediction_batch(
+        lambda input_file: prepare_extraction(
+            input_file,
+            args.output,
+            args.verbose,
+            args.force,
+            cache,
+            args.save_image,
+            not args.no_preprocess
+        ),
+        inputs,
+        scheduler,
+        args.jobs,
+        args.verbose
     )
+    scheduler.close()
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
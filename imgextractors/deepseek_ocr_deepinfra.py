@@ -3,6 +3,8 @@
 # dependencies = [
 #   "openai>=1.0.0",
 #   "requests>=2.31.0",
+#   "pillow>=10.0.0",
+#   "numpy>=1.24.0",
 # ]
 # requires-python = ">=3.11"
 # ///
@@ -23,69 +25,18 @@ Usage:
 import argparse
 import os
 import sys
-import base64
-from openai import OpenAI
-
-def verbose_print(message, verbose=False):
-    """Print message if verbose mode is enabled."""
-    if verbose:
-        print(message, file=sys.stderr)
-
-def check_api_token(key_file=None):
-    """Check if DEEPINFRA_API_TOKEN is set or load from key file."""
-    if key_file:
-        # Expand ~ to user home directory
-        key_file = os.path.expanduser(key_file)
-        if not os.path.exists(key_file):
-            print(f"ERROR: Key file not found: {key_file}", file=sys.stderr)
-            sys.exit(1)
-
-        # Source the file and extract DEEPINFRA_API_TOKEN or DEEPINFRA_TOKEN
-        try:
-            with open(key_file, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('export '):
-                        line = line[7:]  # Remove 'export '
-                    if line.startswith('DEEPINFRA_API_TOKEN=') or line.startswith('DEEPINFRA_TOKEN='):
-                        token = line.split('=', 1)[1].strip().strip('"').strip("'")
-                        os.environ['DEEPINFRA_API_TOKEN'] = token
-                        break
-        except Exception as e:
-            print(f"ERROR: Failed to read key file: {e}", file=sys.stderr)
-            sys.exit(1)
-
-    if "DEEPINFRA_API_TOKEN" not in os.environ and "DEEPINFRA_TOKEN" not in os.environ:
-        print("ERROR: DEEPINFRA_API_TOKEN is not set", file=sys.stderr)
-        print("Set it via environment variable or use --key-file option", file=sys.stderr)
-        sys.exit(1)
-
-    # Use either token
-    if "DEEPINFRA_API_TOKEN" not in os.environ and "DEEPINFRA_TOKEN" in os.environ:
-        os.environ['DEEPINFRA_API_TOKEN'] = os.environ['DEEPINFRA_TOKEN']
-
-def normalize_filename(filename, max_length=64):
-    """Normalize filename to a valid format."""
-    base = os.path.splitext(os.path.basename(filename))[0]
-    normalized = ''.join(c.lower() if c.isalnum() else '_' for c in base)
-    return normalized[:max_length]
-
-def generate_output_filename(input_filename, output_filename, task_type):
-    """Generate output filename based on input file, output flag, and task type."""
-    if output_filename:
-        return output_filename
-    else:
-        # Determine extension based on task type
-        if "markdown" in task_type.lower():
-            ext = ".md"
-        else:
-            ext = ".txt"
-        return normalize_filename(input_filename) + ext
-
-def encode_image_to_base64(file_path):
-    """Encode the input image to base64."""
-    with open(file_path, "rb") as file:
-        return base64.b64encode(file.read()).decode('utf-8')
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_ocr.batch import add_batch_arguments, collect_inputs, print_batch_summary, print_failure, run_batch
+from ai_ocr.cache import add_cache_arguments, make_cache_key, open_cache
+from ai_ocr.common import check_api_token, generate_output_filename, task_extension, verbose_print
+from ai_ocr.metrics import add_metrics_arguments, configure_metrics, span
+from ai_ocr.preprocess import DEEPSEEK_DYNAMIC_MAX_SIDE, add_preprocess_arguments, discard_preprocessed, preprocess_image
+from ai_ocr.resilience import add_resilience_arguments, configure_resilience, retry_call, retry_call_async
+from ai_ocr.server import add_daemon_arguments, forward_to_daemon
+from ai_ocr.upload import build_data_uri
+from ai_ocr.usage import DEFAULT_MAX_TOKENS, add_usage_arguments, configure_usage, max_tokens_type, record_usage, resolve_max_tokens, should_retry_truncated, task_label
 
 def get_task_prompt(task_type, custom_prompt=None):
     """Generate prompt based on task type."""
@@ -102,91 +53,315 @@ def get_task_prompt(task_type, custom_prompt=None):
 
     return prompts.get(task_type, "<image>\nFree OCR.")
 
+DEFAULT_BASE_URL = "https://api.deepinfra.com/v1/openai"
+MODEL = "deepseek-ai/DeepSeek-OCR"
+# Requests in flight at once in a batch; DeepInfra serves far more per account
+DEFAULT_CONCURRENCY = 16
+
+_clients = {}
+
+def get_client(base_url=None):
+    """Return the process-wide OpenAI client for base_url (one connection pool per process)."""
+    base_url = base_url or os.environ.get("DEEPINFRA_BASE_URL", DEFAULT_BASE_URL)
+    if base_url not in _clients:
+        # Imported on first use: the SDK takes longer to import than a cache hit takes
+        from openai import OpenAI
+
+        _clients[base_url] = OpenAI(
+            api_key=os.environ.get('DEEPINFRA_API_TOKEN'),
+            base_url=base_url,
+            # Retries and rate limiting are done by ai_ocr.resilience
+            max_retries=0
+        )
+    return _clients[base_url]
+
+def get_mime_type(input_file):
+    """Determine image MIME type from file extension."""
+    ext = os.path.splitext(input_file)[1].lower()
+    mime_types = {
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.png': 'image/png',
+        '.gif': 'image/gif',
+        '.webp': 'image/webp',
+    }
+    return mime_types.get(ext, 'image/jpeg')
+
+def build_messages(input_file, task_type, custom_prompt=None, verbose=False, preprocess=True):
+    """Build chat messages with the image (preprocessed unless disabled) inlined as base64 data URI."""
+    if preprocess:
+        upload_file, mime_type = preprocess_image(input_file, DEEPSEEK_DYNAMIC_MAX_SIDE, verbose)
+        data_uri = build_data_uri(upload_file, mime_type)
+        discard_preprocessed(upload_file, input_file)
+    else:
+        data_uri = build_data_uri(input_file, get_mime_type(input_file))
+    verbose_print(f"Encoded image to base64 data URI ({len(data_uri)} chars)", verbose)
+
+    prompt = get_task_prompt(task_type, custom_prompt)
+    verbose_print(f"Using prompt: {prompt}", verbose)
+
+    return [{
+        "role": "user",
+        "content": [
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": data_uri
+                }
+            },
+            {
+                "type": "text",
+                "text": prompt
+            }
+        ]
+    }]
+
+def request_bytes(messages):
+    """Approximate request body size: the inlined image and the prompt."""
+    return sum(
+        len(part["image_url"]["url"]) if part["type"] == "image_url" else len(part["text"].encode("utf-8"))
+        for message in messages for part in message["content"]
+    )
+
+def add_response_fields(fields, response):
+    """Add response size, token usage and request id to metrics span fields."""
+    fields["bytes_in"] = len((response.choices[0].message.content or "").encode("utf-8"))
+    if response.usage is not None:
+        fields["prompt_tokens"] = response.usage.prompt_tokens
+        fields["completion_tokens"] = response.usage.completion_tokens
+    fields["request_id"] = getattr(response, "id", None)
+
+def image_bytes(messages):
+    """Size of the inlined image(s) after base64 decoding."""
+    return sum(
+        len(part["image_url"]["url"].partition(",")[2]) * 3 // 4
+        for message in messages for part in message["content"] if part["type"] == "image_url"
+    )
+
+def complete(client, messages, input_file, task_type, custom_prompt=None, max_tokens="auto", temperature=0.0, verbose=False):
+    """
+    Run one chat completion with retries and record its token usage.
+
+    max_tokens "auto" is sized per task from recorded usage (ai_ocr/usage.py);
+    an answer cut off at the auto limit is requested again with the full budget.
+    """
+    task = task_label(task_type, custom_prompt)
+    limit = resolve_max_tokens(max_tokens, MODEL, task)
+    while True:
+        verbose_print(f"Calling DeepInfra API (max_tokens={limit})...", verbose)
+        start = time.monotonic()
+        with span("request", model=MODEL, input=input_file, bytes_out=request_bytes(messages), max_tokens=limit) as fields:
+            response = retry_call(
+                lambda: client.chat.completions.create(model=MODEL, messages=messages, max_tokens=limit, temperature=temperature),
+                provider="deepinfra", label=os.path.basename(input_file)
+            )
+            add_response_fields(fields, response)
+        record_usage(MODEL, task, response, time.monotonic() - start, input_file, image_bytes(messages), limit)
+        if not should_retry_truncated(response, max_tokens, limit):
+            return response
+        print(f"MAX TOKENS: {input_file} was cut off at {limit} tokens, retrying with {DEFAULT_MAX_TOKENS}", file=sys.stderr)
+        limit = DEFAULT_MAX_TOKENS
+
+async def complete_async(client, messages, input_file, task_type, custom_prompt=None, max_tokens="auto", temperature=0.0, verbose=False):
+    """complete() for an AsyncOpenAI client."""
+    import asyncio
+
+    task = task_label(task_type, custom_prompt)
+    limit = await asyncio.to_thread(resolve_max_tokens, max_tokens, MODEL, task)
+    while True:
+        start = time.monotonic()
+        with span("request", model=MODEL, input=input_file, bytes_out=request_bytes(messages), max_tokens=limit) as fields:
+            response = await retry_call_async(
+                lambda: client.chat.completions.create(model=MODEL, messages=messages, max_tokens=limit, temperature=temperature),
+                provider="deepinfra", label=os.path.basename(input_file)
+            )
+            add_response_fields(fields, response)
+        await asyncio.to_thread(record_usage, MODEL, task, response, time.monotonic() - start, input_file, image_bytes(messages), limit)
+        if not should_retry_truncated(response, max_tokens, limit):
+            return response
+        print(f"MAX TOKENS: {input_file} was cut off at {limit} tokens, retrying with {DEFAULT_MAX_TOKENS}", file=sys.stderr)
+        limit = DEFAULT_MAX_TOKENS
+
+def stream_completion(client, messages, input_file, final_output_file, task_type, custom_prompt=None, max_tokens="auto", temperature=0.0, echo=False, verbose=False):
+    """
+    Stream a chat completion into final_output_file as its deltas arrive.
+
+    Deltas are appended to `<output>.part` (and echoed to stdout with echo),
+    which replaces the output file once the answer is complete, so the output
+    file never holds a partial answer. Usage comes from the last chunk
+    (stream_options include_usage) and is recorded like complete() does.
+    Returns a response-like object without the text (which is not kept).
+    """
+    from types import SimpleNamespace
+
+    task = task_label(task_type, custom_prompt)
+    if echo and max_tokens == "auto":
+        # Echoed text cannot be taken back, so never risk a cut-off retry
+        limit = DEFAULT_MAX_TOKENS
+    else:
+        limit = resolve_max_tokens(max_tokens, MODEL, task)
+    part_file = final_output_file + ".part"
+    while True:
+        verbose_print(f"Streaming from DeepInfra API (max_tokens={limit})...", verbose)
+        start = time.monotonic()
+        choice = SimpleNamespace(finish_reason=None, message=SimpleNamespace(content=None))
+        response = SimpleNamespace(id=None, usage=None, choices=[choice])
+        with span("request", model=MODEL, input=input_file, bytes_out=request_bytes(messages), max_tokens=limit, stream=True) as fields:
+            # Only opening the stream is retried: deltas may already be consumed downstream
+            stream = retry_call(
+                lambda: client.chat.completions.create(
+                    model=MODEL, messages=messages, max_tokens=limit, temperature=temperature,
+                    stream=True, stream_options={"include_usage": True}
+                ),
+                provider="deepinfra", label=os.path.basename(input_file)
+            )
+            written = 0
+            try:
+                with stream, open(part_file, "w", encoding="utf-8") as f:
+                    for chunk in stream:
+                        response.id = chunk.id
+                        if getattr(chunk, "usage", None) is not None:
+                            response.usage = chunk.usage
+                        for delta in chunk.choices:
+                            if delta.finish_reason:
+                                choice.finish_reason = delta.finish_reason
+                            text = delta.delta.content
+                            if not text:
+                                continue
+                            if not written:
+                                fields["first_token"] = round(time.monotonic() - start, 4)
+                            f.write(text)
+                            f.flush()
+                            written += len(text.encode("utf-8"))
+                            if echo:
+                                sys.stdout.write(text)
+                                sys.stdout.flush()
+            except BaseException:
+                if os.path.exists(part_file):
+                    os.unlink(part_file)
+                raise
+            fields["bytes_in"] = written
+            fields["request_id"] = response.id
+            if response.usage is not None:
+                fields["prompt_tokens"] = response.usage.prompt_tokens
+                fields["completion_tokens"] = response.usage.completion_tokens
+        record_usage(MODEL, task, response, time.monotonic() - start, input_file, image_bytes(messages), limit)
+        if not should_retry_truncated(response, max_tokens, limit):
+            os.replace(part_file, final_output_file)
+            verbose_print(f"Streamed {written} bytes, first after {fields.get('first_token', 0):.2f}s", verbose)
+            return response
+        print(f"MAX TOKENS: {input_file} was cut off at {limit} tokens, retrying with {DEFAULT_MAX_TOKENS}", file=sys.stderr)
+        limit = DEFAULT_MAX_TOKENS
+
+def get_cache_key(input_file, task_type, custom_prompt, max_tokens, temperature, preprocess=True):
+    """Cache key for a request: image hash, model, prompt and generation parameters."""
+    if max_tokens == "auto":
+        # Auto limits never cut answers off, so they share the results of the full budget
+        max_tokens = DEFAULT_MAX_TOKENS
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    if preprocess:
+        # Preprocessed uploads can OCR differently, so they are cached separately
+        params["preprocess"] = DEEPSEEK_DYNAMIC_MAX_SIDE
+    return make_cache_key(
+        input_file,
+        MODEL,
+        get_task_prompt(task_type, custom_prompt),
+        params
+    )
+
+def restore_from_cache(cache, cache_key, final_output_file, verbose=False, echo=False):
+    """Copy cached result to output file; returns output filename on hit, else None."""
+    if cache and cache.copy_to(cache_key, final_output_file):
+        verbose_print(f"Cache hit, output saved as: {final_output_file}", verbose)
+        if echo:
+            echo_file(final_output_file)
+        else:
+            print(f"{final_output_file}")
+        return final_output_file
+    return None
+
+def echo_file(path):
+    """Copy a finished output file to stdout, as --stream-stdout would have printed it."""
+    import shutil
+
+    with open(path, "r", encoding="utf-8") as f:
+        shutil.copyfileobj(f, sys.stdout)
+    sys.stdout.flush()
+
+def save_response(response, final_output_file, verbose=False, cache=None, cache_key=None):
+    """Write completion content to output file (and result cache)."""
+    content = response.choices[0].message.content
+
+    verbose_print(f"Extracted {len(content)} characters", verbose)
+    if response.usage is not None:
+        # Streamed answers and some OpenAI-compatible servers report no usage
+        verbose_print(f"Tokens used: {response.usage.total_tokens} (prompt: {response.usage.prompt_tokens}, completion: {response.usage.completion_tokens})", verbose)
+
+    with span("write", output=final_output_file, bytes_out=len(content.encode("utf-8"))):
+        with open(final_output_file, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    if cache:
+        cache.put_file(cache_key, final_output_file)
+
+    verbose_print(f"Output saved as: {final_output_file}", verbose)
+    print(f"{final_output_file}")
+    return final_output_file
+
 def extract_with_deepseek_ocr(
     input_file,
     output_file,
     task_type="Convert to Markdown",
     custom_prompt=None,
-    max_tokens=8192,
+    max_tokens="auto",
     temperature=0.0,
     verbose=False,
-    force=False
+    force=False,
+    base_url=None,
+    cache=None,
+    preprocess=True,
+    stream=False,
+    echo=False
 ):
-    """Extract text/data from image using DeepSeek-OCR via DeepInfra API."""
+    """
+    Extract text/data from image using DeepSeek-OCR via DeepInfra API.
+
+    With stream the answer is written to the output file as it is generated
+    (see stream_completion()); echo also prints it to stdout instead of the
+    output filename.
+    """
     verbose_print(f"Processing image with DeepSeek-OCR: {input_file}", verbose)
     verbose_print(f"Task type: {task_type}", verbose)
 
-    final_output_file = generate_output_filename(input_file, output_file, task_type)
+    final_output_file = generate_output_filename(input_file, output_file, task_extension(task_type))
 
     if not force and os.path.exists(final_output_file):
         print(f"SKIPPING: File '{final_output_file}' already exists.", file=sys.stderr)
-        return
+        return None
 
     try:
-        # Initialize OpenAI client with DeepInfra endpoint
-        api_token = os.environ.get('DEEPINFRA_API_TOKEN')
-        client = OpenAI(
-            api_key=api_token,
-            base_url="https://api.deepinfra.com/v1/openai"
-        )
-
-        # Encode image
-        base64_image = encode_image_to_base64(input_file)
-        verbose_print(f"Encoded image to base64 ({len(base64_image)} chars)", verbose)
-
-        # Determine image MIME type
-        ext = os.path.splitext(input_file)[1].lower()
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp',
-        }
-        mime_type = mime_types.get(ext, 'image/jpeg')
-
-        # Get prompt
-        prompt = get_task_prompt(task_type, custom_prompt)
-        verbose_print(f"Using prompt: {prompt}", verbose)
-
-        # Call the API
-        verbose_print("Calling DeepInfra API...", verbose)
-        response = client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-OCR",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{mime_type};base64,{base64_image}"
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
-            }],
-            max_tokens=max_tokens,
-            temperature=temperature
-        )
+        cache_key = None
+        if cache:
+            cache_key = get_cache_key(input_file, task_type, custom_prompt, max_tokens, temperature, preprocess)
+            if restore_from_cache(cache, cache_key, final_output_file, verbose, echo):
+                return final_output_file
+
+        client = get_client(base_url)
+        messages = build_messages(input_file, task_type, custom_prompt, verbose, preprocess)
+
+        if stream or echo:
+            stream_completion(client, messages, input_file, final_output_file, task_type, custom_prompt, max_tokens, temperature, echo, verbose)
+            if cache:
+                cache.put_file(cache_key, final_output_file)
+            verbose_print(f"Output saved as: {final_output_file}", verbose)
+            if not echo:
+                print(f"{final_output_file}")
+            return final_output_file
+
+        response = complete(client, messages, input_file, task_type, custom_prompt, max_tokens, temperature, verbose)
 
         verbose_print(f"API response received", verbose)
-
-        # Extract content
-        content = response.choices[0].message.content
-
-        if verbose:
-            verbose_print(f"Extracted {len(content)} characters", verbose)
-            verbose_print(f"Tokens used: {response.usage.total_tokens} (prompt: {response.usage.prompt_tokens}, completion: {response.usage.completion_tokens})", verbose)
-
-        # Write output to file
-        with open(final_output_file, "w", encoding="utf-8") as f:
-            f.write(content)
-
-        verbose_print(f"Output saved as: {final_output_file}", verbose)
-        print(f"{final_output_file}")
+        return save_response(response, final_output_file, verbose, cache, cache_key)
 
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
@@ -195,7 +370,77 @@ def extract_with_deepseek_ocr(
             traceback.print_exc(file=sys.stderr)
         sys.exit(1)
 
-def main():
+async def extract_many_with_deepseek_ocr_async(
+    inputs,
+    task_type="Convert to Markdown",
+    custom_prompt=None,
+    max_tokens="auto",
+    temperature=0.0,
+    verbose=False,
+    force=False,
+    base_url=None,
+    concurrency=DEFAULT_CONCURRENCY,
+    cache=None,
+    preprocess=True
+):
+    """
+    Extract many images concurrently with one AsyncOpenAI client.
+
+    At most `concurrency` requests are in flight; each result is written as soon
+    as its request completes. Returns the number of failed inputs.
+    """
+    import asyncio
+
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(
+        api_key=os.environ.get('DEEPINFRA_API_TOKEN'),
+        base_url=base_url or os.environ.get("DEEPINFRA_BASE_URL", DEFAULT_BASE_URL),
+        max_retries=0
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(input_file):
+        final_output_file = generate_output_filename(input_file, None, task_extension(task_type))
+        if not force and os.path.exists(final_output_file):
+            print(f"SKIPPING: File '{final_output_file}' already exists.", file=sys.stderr)
+            return None
+        cache_key = None
+        if cache:
+            cache_key = await asyncio.to_thread(get_cache_key, input_file, task_type, custom_prompt, max_tokens, temperature, preprocess)
+            if await asyncio.to_thread(restore_from_cache, cache, cache_key, final_output_file, verbose):
+                return final_output_file
+        async with semaphore:
+            verbose_print(f"Processing image with DeepSeek-OCR: {input_file}", verbose)
+            messages = await asyncio.to_thread(build_messages, input_file, task_type, custom_prompt, verbose, preprocess)
+            response = await complete_async(client, messages, input_file, task_type, custom_prompt, max_tokens, temperature, verbose)
+        return await asyncio.to_thread(save_response, response, final_output_file, verbose, cache, cache_key)
+
+    done = skipped = failed = 0
+    start = time.monotonic()
+    tasks = {asyncio.ensure_future(process(input_file)): input_file for input_file in inputs}
+    pending = set(tasks)
+    try:
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    failed += 1
+                    print_failure(tasks[task], e)
+                    continue
+                if result is None:
+                    skipped += 1
+                else:
+                    done += 1
+    finally:
+        await client.close()
+
+    print_batch_summary(len(inputs), done, skipped, failed, time.monotonic() - start)
+    return failed
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Extract text/data from images using DeepSeek-OCR via DeepInfra API",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -216,6 +461,15 @@ Examples:
   # Use custom API key file
   %(prog)s --key-file ~/.env.deepinfra document.jpg
 
+  # Many images/pages concurrently (asyncio, one shared client)
+  %(prog)s --jobs 64 'pages/*.png'
+
+  # Write the Markdown while it is generated, and pipe it on as it arrives
+  %(prog)s --stream-stdout document.jpg | less
+
+  # Against a local OpenAI-compatible stand-in server
+  %(prog)s --base-url http://127.0.0.1:8765/v1/openai document.jpg
+
 Task Types:
   - "Convert to Markdown" (default): Convert document to markdown format
   - "Free OCR": Extract text without specific formatting
@@ -228,8 +482,8 @@ Note: DeepInfra uses OpenAI-compatible API, so responses follow OpenAI format.
 """
     )
 
-    parser.add_argument("input", help="Input image file (jpg, png, etc.)")
-    parser.add_argument("-o", "--output", help="Output filename")
+    parser.add_argument("inputs", nargs="*", metavar="input", help="Input image file(s) (jpg, png, etc.) or glob pattern(s)")
+    parser.add_argument("-o", "--output", help="Output filename (single input only)")
     parser.add_argument(
         "-t", "--task",
         choices=["Convert to Markdown", "Free OCR", "Parse Figure", "Extract Tables", "Extract Formulas"],
@@ -242,9 +496,9 @@ Note: DeepInfra uses OpenAI-compatible API, so responses follow OpenAI format.
     )
     parser.add_argument(
         "--max-tokens",
-        type=int,
-        default=8192,
-        help="Maximum tokens in response (default: 8192)"
+        type=max_tokens_type,
+        default="auto",
+        help=f"Maximum tokens in response, or auto: sized per task from recorded usage, retried with {DEFAULT_MAX_TOKENS} when cut off (default: auto)"
     )
     parser.add_argument(
         "--temperature",
@@ -252,26 +506,105 @@ Note: DeepInfra uses OpenAI-compatible API, so responses follow OpenAI format.
         default=0.0,
         help="Temperature for generation (default: 0.0 for deterministic)"
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the answer into OUTPUT.part as it is generated, renamed to OUTPUT when complete"
+    )
+    parser.add_argument(
+        "--stream-stdout",
+        action="store_true",
+        help="Like --stream, and also print the answer to stdout as it arrives (single input only)"
+    )
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
     parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
     parser.add_argument(
         "--key-file",
         help="Path to file containing DEEPINFRA_API_TOKEN (e.g., ~/.env.deepinfra)"
     )
+    parser.add_argument(
+        "--base-url",
+        help=f"OpenAI-compatible API base URL (default: $DEEPINFRA_BASE_URL or {DEFAULT_BASE_URL})"
+    )
 
-    args = parser.parse_args()
-
-    check_api_token(args.key_file)
-    extract_with_deepseek_ocr(
-        args.input,
-        args.output,
-        args.task,
-        args.prompt,
-        args.max_tokens,
-        args.temperature,
-        args.verbose,
-        args.force
+    add_preprocess_arguments(parser)
+    add_batch_arguments(parser, DEFAULT_CONCURRENCY, "Concurrent DeepInfra requests")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_usage_arguments(parser)
+    add_resilience_arguments(parser, "deepinfra")
+    add_daemon_arguments(parser)
+
+    args = parser.parse_args(argv)
+    inputs = collect_inputs(parser, args)
+    if args.stream_stdout and len(inputs) > 1:
+        parser.error("--stream-stdout takes a single input")
+    if args.stream_stdout:
+        # The daemon cannot print to this terminal
+        args.no_daemon = True
+    configure_metrics(args)
+    configure_usage(args)
+
+    failed = forward_to_daemon(
+        args,
+        "deepseek-deepinfra",
+        inputs,
+        lambda input_file: generate_output_filename(input_file, args.output, task_extension(args.task)),
+        {
+            "task_type": args.task,
+            "custom_prompt": args.prompt,
+            "max_tokens": args.max_tokens,
+            "temperature": args.temperature,
+            "base_url": args.base_url,
+            "preprocess": not args.no_preprocess,
+            "stream": args.stream,
+        }
     )
+    if failed is not None:
+        sys.exit(1 if failed else 0)
+    cache = open_cache(args)
+    configure_resilience(args, "deepinfra")
+
+    check_api_token("deepinfra", args.key_file)
+    if len(inputs) > 1 and not args.stream:
+        import asyncio
+
+        failed = asyncio.run(extract_many_with_deepseek_ocr_async(
+            inputs,
+            args.task,
+            args.prompt,
+            args.max_tokens,
+            args.temperature,
+            args.verbose,
+            args.force,
+            args.base_url,
+            args.jobs,
+            cache,
+            not args.no_preprocess
+        ))
+    else:
+        failed = run_batch(
+            lambda input_file: extract_with_deepseek_ocr(
+                input_file,
+                args.output,
+                args.task,
+                args.prompt,
+                args.max_tokens,
+                args.temperature,
+                args.verbose,
+                args.force,
+                args.base_url,
+                cache,
+                not args.no_preprocess,
+                args.stream,
+                args.stream_stdout
+            ),
+            inputs,
+            args.jobs,
+            args.verbose
+        )
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
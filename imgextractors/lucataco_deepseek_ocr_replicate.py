@@ -1,8 +1,10 @@
 #!/usr/bin/env -S uv run
 # /// script
 # dependencies = [
-#   "replicate>=0.25.0",
+#   "replicate>=1.0.0",
 #   "requests>=2.31.0",
+#   "numpy>=1.24.0",
+#   "pillow>=10.0.0",
 # ]
 # requires-python = ">=3.11"
 # ///
@@ -18,140 +20,146 @@ Usage:
     ./lucataco_deepseek_ocr_replicate.py input_image.jpg
     ./lucataco_deepseek_ocr_replicate.py --task-type "Parse Figure" chart.png
     ./lucataco_deepseek_ocr_replicate.py --resolution Large document.jpg -o output.md
+    ./lucataco_deepseek_ocr_replicate.py --resolution auto scans/*.png
 """
 
 import argparse
 import os
 import sys
-import requests
-import replicate
-import base64
-
-def verbose_print(message, verbose=False):
-    """Print message if verbose mode is enabled."""
-    if verbose:
-        print(message, file=sys.stderr)
-
-def check_api_token(key_file=None):
-    """Check if REPLICATE_API_TOKEN is set or load from key file."""
-    if key_file:
-        # Expand ~ to user home directory
-        key_file = os.path.expanduser(key_file)
-        if not os.path.exists(key_file):
-            print(f"ERROR: Key file not found: {key_file}", file=sys.stderr)
-            sys.exit(1)
-
-        # Source the file and extract REPLICATE_API_TOKEN
-        try:
-            with open(key_file, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('export '):
-                        line = line[7:]  # Remove 'export '
-                    if line.startswith('REPLICATE_API_TOKEN='):
-                        token = line.split('=', 1)[1].strip().strip('"').strip("'")
-                        os.environ['REPLICATE_API_TOKEN'] = token
-                        break
-        except Exception as e:
-            print(f"ERROR: Failed to read key file: {e}", file=sys.stderr)
-            sys.exit(1)
 
-    if "REPLICATE_API_TOKEN" not in os.environ:
-        print("ERROR: REPLICATE_API_TOKEN is not set", file=sys.stderr)
-        print("Set it via environment variable or use --key-file option", file=sys.stderr)
-        sys.exit(1)
-
-def normalize_filename(filename, max_length=64):
-    """Normalize filename to a valid format."""
-    base = os.path.splitext(os.path.basename(filename))[0]
-    normalized = ''.join(c.lower() if c.isalnum() else '_' for c in base)
-    return normalized[:max_length]
-
-def generate_output_filename(input_filename, output_filename, task_type):
-    """Generate output filename based on input file, output flag, and task type."""
-    if output_filename:
-        return output_filename
-    else:
-        # Determine extension based on task type
-        if "markdown" in task_type.lower():
-            ext = ".md"
-        else:
-            ext = ".txt"
-        return normalize_filename(input_filename) + ext
-
-def encode_file_to_base64(file_path):
-    """Encode the input file to base64."""
-    with open(file_path, "rb") as file:
-        return base64.b64encode(file.read()).decode('utf-8')
-
-def truncate_long_string(data, max_length=1024):
-    """Truncate long strings for verbose output."""
-    if len(data) > max_length:
-        return f"{data[:64]} (...) {data[-64:]}"
-    return data
-
-def extract_with_deepseek_ocr(
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_ocr.batch import add_batch_arguments, collect_inputs
+from ai_ocr.cache import add_cache_arguments, make_cache_key, open_cache
+from ai_ocr.common import check_api_token, generate_output_filename, task_extension, truncate_long_string, verbose_print
+from ai_ocr.metrics import add_metrics_arguments, configure_metrics, span
+from ai_ocr.predictions import PredictionJob, add_scheduler_arguments, open_scheduler, run_prediction_batch, run_prediction_job
+from ai_ocr.preprocess import add_preprocess_arguments, deepseek_max_side, discard_preprocessed, preprocess_image
+from ai_ocr.server import add_daemon_arguments, forward_to_daemon
+
+MODEL_VERSION = "lucataco/deepseek-ocr:deedb3f2ecdf38e90c79e79befd926ba8e95077cfef92ffec06f2f3494f1ce82"
+
+def get_cache_key(input_file, task_type, resolution_size, preprocess=True):
+    """Cache key for a prediction: image hash, model version, task and resolution."""
+    params = {"resolution_size": resolution_size}
+    if preprocess:
+        # Preprocessed uploads can OCR differently, so they are cached separately
+        params["preprocess"] = True
+    return make_cache_key(input_file, MODEL_VERSION, task_type, params)
+
+def output_text(output):
+    """Text of a DeepSeek-OCR prediction output (a string or a list of strings)."""
+    if isinstance(output, str):
+        return output
+    if isinstance(output, list) and len(output) > 0:
+        return '\n'.join(str(item) for item in output)
+    raise ValueError(f"Unexpected output format: {type(output)}")
+
+def prepare_extraction(
     input_file,
     output_file,
     task_type="Convert to Markdown",
     resolution_size="Base",
     verbose=False,
-    force=False
+    force=False,
+    cache=None,
+    preprocess=True
 ):
-    """Extract text/data from image using DeepSeek-OCR via Replicate API."""
+    """Return the output filename (cache hit), None (skipped) or a PredictionJob for one image."""
     verbose_print(f"Processing image with DeepSeek-OCR: {input_file}", verbose)
     verbose_print(f"Task type: {task_type}", verbose)
     verbose_print(f"Resolution: {resolution_size}", verbose)
 
-    final_output_file = generate_output_filename(input_file, output_file, task_type)
+    final_output_file = generate_output_filename(input_file, output_file, task_extension(task_type))
 
     if not force and os.path.exists(final_output_file):
         print(f"SKIPPING: File '{final_output_file}' already exists.", file=sys.stderr)
-        return
-
-    try:
-        # Read and prepare the image
-        with open(input_file, "rb") as f:
-            image_data = f.read()
-
-        verbose_print(f"Read {len(image_data)} bytes from {input_file}", verbose)
-
-        # Prepare the input for the API
+        return None
+
+    cache_key = None
+    if cache:
+        cache_key = get_cache_key(input_file, task_type, resolution_size, preprocess)
+        if cache.copy_to(cache_key, final_output_file):
+            verbose_print(f"Cache hit, output saved as: {final_output_file}", verbose)
+            print(f"{final_output_file}")
+            return final_output_file
+
+    stats = None
+    if resolution_size == "auto":
+        # Imported lazily so numpy/Pillow are only needed for --resolution auto
+        from ai_ocr.resolution import choose_resolution, measure_image
+        stats = measure_image(input_file)
+        resolution_size, reason = choose_resolution(stats)
+        verbose_print(f"Layout stats: {stats}", verbose)
+        print(f"RESOLUTION: {input_file}: auto -> {resolution_size} ({reason})", file=sys.stderr)
+
+    def make_job():
+        upload_file = input_file
+        if preprocess:
+            # Escalation to a larger resolution preprocesses again at its input size
+            upload_file = preprocess_image(input_file, deepseek_max_side(resolution_size), verbose)[0]
+        verbose_print(f"Uploading {os.path.getsize(upload_file)} bytes from {upload_file}", verbose)
+        # The image is streamed to Replicate's files API when the prediction is created
         api_input = {
-            "image": open(input_file, "rb"),
             "task_type": task_type,
             "resolution_size": resolution_size
         }
         verbose_print(f"API input prepared with task_type={task_type}, resolution_size={resolution_size}", verbose)
+        # The preprocessed copy is only needed until it is uploaded
+        return PredictionJob(MODEL_VERSION, api_input, {"image": upload_file}, save_output,
+                             cleanup=lambda: discard_preprocessed(upload_file, input_file))
 
-        # Call the API
-        verbose_print("Calling Replicate API...", verbose)
-        output = replicate.run(
-            "lucataco/deepseek-ocr:deedb3f2ecdf38e90c79e79befd926ba8e95077cfef92ffec06f2f3494f1ce82",
-            input=api_input
-        )
+    def save_output(output):
+        nonlocal resolution_size
         verbose_print(f"API output received: {type(output)}", verbose)
 
-        # Handle different output formats
-        if isinstance(output, str):
-            # Direct string output
-            content = output
-            verbose_print(f"Got string output: {truncate_long_string(content)}", verbose)
-        elif isinstance(output, list) and len(output) > 0:
-            # List of strings - join them
-            content = '\n'.join(str(item) for item in output)
-            verbose_print(f"Got list output with {len(output)} items", verbose)
-        else:
-            print(f"Error: Unexpected output format: {type(output)}", file=sys.stderr)
+        try:
+            content = output_text(output)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
             print(f"Output: {output}", file=sys.stderr)
             sys.exit(1)
+        verbose_print(f"Got output: {truncate_long_string(content)}", verbose)
+
+        if stats is not None:
+            from ai_ocr.resolution import next_resolution, output_looks_truncated
+            larger = next_resolution(resolution_size)
+            if larger and output_looks_truncated(content, stats):
+                print(f"ESCALATING: {input_file}: {resolution_size} -> {larger} (output looks truncated)", file=sys.stderr)
+                resolution_size = larger
+                # Submitted by the caller like the first job, not awaited in this output worker
+                return make_job()
 
         # Write output to file
-        with open(final_output_file, "w", encoding="utf-8") as f:
-            f.write(content)
+        with span("write", output=final_output_file, bytes_out=len(content.encode("utf-8"))):
+            with open(final_output_file, "w", encoding="utf-8") as f:
+                f.write(content)
+
+        if cache:
+            cache.put_file(cache_key, final_output_file)
 
         verbose_print(f"Output saved as: {final_output_file}", verbose)
         print(f"{final_output_file}")
+        return final_output_file
+
+    return make_job()
+
+def extract_with_deepseek_ocr(
+    input_file,
+    output_file,
+    task_type="Convert to Markdown",
+    resolution_size="Base",
+    verbose=False,
+    force=False,
+    cache=None,
+    scheduler=None,
+    preprocess=True
+):
+    """Extract text/data from image using DeepSeek-OCR via Replicate API."""
+    try:
+        job = prepare_extraction(input_file, output_file, task_type, resolution_size, verbose, force, cache, preprocess)
+        if not isinstance(job, PredictionJob):
+            return job
+        return run_prediction_job(job, scheduler)
 
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
@@ -160,7 +168,7 @@ def extract_with_deepseek_ocr(
             traceback.print_exc(file=sys.stderr)
         sys.exit(1)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Extract text/data from images using DeepSeek-OCR via Replicate API",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -190,11 +198,13 @@ Resolution Sizes:
   - Base (1024x1024): 256 tokens, balanced (default)
   - Large (1280x1280): 400 tokens, best quality
   - Gundam: Dynamic resolution for complex documents
+  - auto: Cheapest size where text stays legible, measured per image;
+    escalates to the next size when the output looks empty or truncated
 """
     )
 
-    parser.add_argument("input", help="Input image file (jpg, png, etc.)")
-    parser.add_argument("-o", "--output", help="Output filename")
+    parser.add_argument("inputs", nargs="*", metavar="input", help="Input image file(s) (jpg, png, etc.) or glob pattern(s)")
+    parser.add_argument("-o", "--output", help="Output filename (single input only)")
     parser.add_argument(
         "-t", "--task-type",
         choices=["Convert to Markdown", "Free OCR", "Parse Figure", "Locate Object by Reference"],
@@ -203,9 +213,9 @@ Resolution Sizes:
     )
     parser.add_argument(
         "-r", "--resolution",
-        choices=["Tiny", "Small", "Base", "Large", "Gundam"],
+        choices=["Tiny", "Small", "Base", "Large", "Gundam", "auto"],
         default="Base",
-        help="Resolution size (default: Base)"
+        help="Resolution size, or auto to pick per image from its layout (default: Base)"
     )
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
     parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
@@ -214,17 +224,49 @@ Resolution Sizes:
         help="Path to file containing REPLICATE_API_TOKEN (e.g., ~/.env.replicate)"
     )
 
-    args = parser.parse_args()
-
-    check_api_token(args.key_file)
-    extract_with_deepseek_ocr(
-        args.input,
-        args.output,
-        args.task_type,
-        args.resolution,
-        args.verbose,
-        args.force
+    add_preprocess_arguments(parser)
+    add_batch_arguments(parser, 4, "Number of files uploaded/downloaded concurrently")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_daemon_arguments(parser)
+
+    args = parser.parse_args(argv)
+    inputs = collect_inputs(parser, args)
+    configure_metrics(args)
+
+    failed = forward_to_daemon(
+        args,
+        "deepseek-replicate",
+        inputs,
+        lambda input_file: generate_output_filename(input_file, args.output, task_extension(args.task_type)),
+        {"task_type": args.task_type, "resolution_size": args.resolution, "preprocess": not args.no_preprocess}
+    )
+    if failed is not None:
+        sys.exit(1 if failed else 0)
+    cache = open_cache(args)
+
+    check_api_token("replicate", args.key_file)
+    scheduler = open_scheduler(args)
+    failed = run_prediction_batch(
+        lambda input_file: prepare_extraction(
+            input_file,
+            args.output,
+            args.task_type,
+            args.resolution,
+            args.verbose,
+            args.force,
+            cache,
+            not args.no_preprocess
+        ),
+        inputs,
+        scheduler,
+        args.jobs,
+        args.verbose
     )
+    scheduler.close()
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1 @@
+"""PDF extractors (each module also runs as a standalone script)."""
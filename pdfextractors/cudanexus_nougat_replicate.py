@@ -1,7 +1,7 @@
 #!/usr/bin/env -S uv run
 # /// script
 # dependencies = [
-#   "replicate>=0.25.0",
+#   "replicate>=1.0.0",
 #   "requests>=2.31.0",
 # ]
 # requires-python = ">=3.11"
@@ -10,93 +10,101 @@
 import argparse
 import os
 import sys
-import requests
-import replicate
-import base64
-
-def verbose_print(message, verbose=False):
-    """Print message if verbose mode is enabled."""
-    if verbose:
-        print(message, file=sys.stderr)
-
-def check_api_token():
-    """Check if REPLICATE_API_TOKEN is set."""
-    if "REPLICATE_API_TOKEN" not in os.environ:
-        print("ERROR: REPLICATE_API_TOKEN is not set", file=sys.stderr)
-        sys.exit(1)
 
-def normalize_filename(filename, max_length=64):
-    """Normalize filename to a valid format."""
-    base = os.path.splitext(os.path.basename(filename))[0]
-    normalized = ''.join(c.lower() if c.isalnum() else '_' for c in base)
-    return normalized[:max_length]
-
-def generate_output_filename(input_filename, output_filename):
-    """Generate output filename based on input file or output flag."""
-    if output_filename:
-        return output_filename
-    else:
-        return normalize_filename(input_filename) + ".md"
-
-def encode_file_to_base64(file_path):
-    """Encode the input file to base64."""
-    with open(file_path, "rb") as file:
-        return base64.b64encode(file.read()).decode('utf-8')
-
-def convert_pdf_to_markdown(input_file, output_file, verbose=False, force=False):
-    """Convert PDF to Markdown using Replicate API."""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_ocr.batch import add_batch_arguments, collect_inputs
+from ai_ocr.cache import add_cache_arguments, make_cache_key, open_cache
+from ai_ocr.common import check_api_token, generate_output_filename, verbose_print
+from ai_ocr.download import download_to_file, output_url
+from ai_ocr.metrics import add_metrics_arguments, configure_metrics
+from ai_ocr.predictions import PredictionJob, add_scheduler_arguments, open_scheduler, run_prediction_batch, run_prediction_job
+from ai_ocr.server import add_daemon_arguments, forward_to_daemon
+
+MODEL_VERSION = "cudanexus/nougat:d0b4e90da423598ff84debc9115bf891dd819843600ad842c0c178e3571f9e76"
+
+def prepare_conversion(input_file, output_file, verbose=False, force=False, cache=None):
+    """Return the output filename (cache hit), None (skipped) or a PredictionJob for one PDF."""
     verbose_print(f"Converting PDF to Markdown: {input_file}", verbose)
 
     final_output_file = generate_output_filename(input_file, output_file)
 
     if not force and os.path.exists(final_output_file):
         print(f"SKIPPING: File '{final_output_file}' already exists.", file=sys.stderr)
-        return
+        return None
+
+    cache_key = None
+    if cache:
+        cache_key = make_cache_key(input_file, MODEL_VERSION)
+        if cache.copy_to(cache_key, final_output_file):
+            verbose_print(f"Cache hit, output saved as: {final_output_file}", verbose)
+            print(f"{final_output_file}")
+            return final_output_file
+
+    def save_output(output):
+        # Stream the result straight to the output file
+        download_to_file(output_url(output), final_output_file)
+
+        if cache:
+            cache.put_file(cache_key, final_output_file)
 
-    try:
-        # Encode the input file to base64
-        encoded_file = encode_file_to_base64(input_file)
-
-        # Prepare the input for the API
-        api_input = {
-            "pdf_file": f"data:application/pdf;base64,{encoded_file}"
-        }
-
-        output = replicate.run(
-            "cudanexus/nougat:d0b4e90da423598ff84debc9115bf891dd819843600ad842c0c178e3571f9e76",
-            input=api_input
-        )
-
-        print("Error: Unexpected output format from the API.", file=sys.stderr)
-        response = requests.get(output)
-        response.raise_for_status()
-        content = response.text
-
-        with open(final_output_file, "w", encoding="utf-8") as f:
-            f.write(content)
-        
         verbose_print(f"Output saved as: {final_output_file}", verbose)
-        
+        print(f"{final_output_file}")
+        return final_output_file
+
+    # The PDF is streamed to Replicate's files API when the prediction is created
+    return PredictionJob(MODEL_VERSION, {}, {"pdf_file": input_file}, save_output)
+
+def convert_pdf_to_markdown(input_file, output_file, verbose=False, force=False, cache=None, scheduler=None):
+    """Convert PDF to Markdown using Replicate API."""
+    try:
+        job = prepare_conversion(input_file, output_file, verbose, force, cache)
+        if not isinstance(job, PredictionJob):
+            return job
+        return run_prediction_job(job, scheduler)
 
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Convert PDF to Markdown using Replicate API")
-    parser.add_argument("input", help="Input PDF file")
-    parser.add_argument("-o", "--output", help="Output filename")
+    parser.add_argument("inputs", nargs="*", metavar="input", help="Input PDF file(s) or glob pattern(s)")
+    parser.add_argument("-o", "--output", help="Output filename (single input only)")
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
     parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
-    args = parser.parse_args()
-
-    check_api_token()
-    convert_pdf_to_markdown(
-        args.input,
-        args.output,
-        args.verbose,
-        args.force
+    parser.add_argument("--key-file", help="Path to file containing REPLICATE_API_TOKEN (e.g., ~/.env.replicate)")
+    add_batch_arguments(parser, 4, "Number of files uploaded/downloaded concurrently")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_daemon_arguments(parser)
+    args = parser.parse_args(argv)
+    inputs = collect_inputs(parser, args)
+    configure_metrics(args)
+
+    failed = forward_to_daemon(args, "nougat", inputs, lambda input_file: generate_output_filename(input_file, args.output))
+    if failed is not None:
+        sys.exit(1 if failed else 0)
+    cache = open_cache(args)
+
+    check_api_token("replicate", args.key_file)
+    scheduler = open_scheduler(args)
+    failed = run_prediction_batch(
+        lambda input_file: prepare_conversion(
+            input_file,
+            args.output,
+            args.verbose,
+            args.force,
+            cache
+        ),
+        inputs,
+        scheduler,
+        args.jobs,
+        args.verbose
     )
+    scheduler.close()
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,9 @@
 #!/usr/bin/env -S uv run
 # /// script
 # dependencies = [
-#   "replicate>=0.25.0",
+#   "replicate>=1.0.0",
 #   "requests>=2.31.0",
+#   "pypdf>=4.0.0",
 # ]
 # requires-python = ">=3.11"
 # ///
@@ -10,121 +11,242 @@
 import argparse
 import os
 import sys
-import requests
-import replicate
-import time
-import json
-import base64
-
-def verbose_print(message, verbose=False):
-    """Print message if verbose mode is enabled."""
-    if verbose:
-        print(message, file=sys.stderr)
-
-def check_api_token():
-    """Check if REPLICATE_API_TOKEN is set."""
-    if "REPLICATE_API_TOKEN" not in os.environ:
-        print("ERROR: REPLICATE_API_TOKEN is not set", file=sys.stderr)
-        sys.exit(1)
-
-def normalize_filename(filename, max_length=64):
-    """Normalize filename to a valid format."""
-    base = os.path.splitext(os.path.basename(filename))[0]
-    normalized = ''.join(c.lower() if c.isalnum() else '_' for c in base)
-    return normalized[:max_length]
-
-def check_existing_file(base_name):
-    """Check if a file with the given base name (markdown extension) exists."""
-    return os.path.exists(f"{base_name}.md")
-
-def generate_output_filename(input_filename, output_filename):
-    """Generate output filename based on input file or output flag."""
-    if output_filename:
-        return output_filename
-    else:
-        return normalize_filename(input_filename) + ".md"
-
-def encode_file_to_base64(file_path):
-    """Encode the input file to base64."""
-    with open(file_path, "rb") as file:
-        return base64.b64encode(file.read()).decode('utf-8')
-
-def convert_pdf_to_markdown(input_file, output_file, verbose=False, force=False, dpi=400, lang="English", max_pages=None, enable_editor=False, parallel_factor=1):
-    """Convert PDF to Markdown using Replicate API."""
+import tempfile
+from concurrent.futures import FIRST_EXCEPTION, wait
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_ocr.batch import add_batch_arguments, collect_inputs
+from ai_ocr.cache import add_cache_arguments, make_cache_key, open_cache
+from ai_ocr.common import check_api_token, generate_output_filename, verbose_print
+from ai_ocr.download import download_to_file, output_url
+from ai_ocr.journal import current_journal, make_key
+from ai_ocr.metrics import add_metrics_arguments, configure_metrics, span
+from ai_ocr.pdfprobe import get_no_of_pages_pdf
+from ai_ocr.pdfsplit import parse_shard_pages, shard_ranges, split_pdf, stitch_markdown
+from ai_ocr.predictions import PredictionJob, add_scheduler_arguments, get_scheduler, open_scheduler, record_output, run_prediction_batch, run_prediction_job
+from ai_ocr.server import add_daemon_arguments, forward_to_daemon
+
+MODEL_VERSION = "cuuupid/marker:9c67051309f6d10ca139489f15fcb5ebc4866a3734af537c181fb13bc719d280"
+
+def convert_shards(input_file, final_output_file, ranges, api_input, verbose=False, cache=None, scheduler=None):
+    """Convert page ranges of input_file as concurrent predictions and stitch their Markdown in order."""
+    scheduler = scheduler or get_scheduler()
+    params = {key: api_input[key] for key in ("dpi", "lang", "enable_editor")}
+    keys = {(first, last): make_cache_key(input_file, MODEL_VERSION, params={**params, "pages": [first, last]}) for first, last in ranges}
+    journal = current_journal()
+    document = make_key("marker-shards", MODEL_VERSION, list(keys.values()))
+    journaled = journal.start_document(document, input_file, final_output_file, ranges[-1][1]) if journal else {}
+
+    texts = {}
+    with tempfile.TemporaryDirectory(prefix="ai_ocr_shards_") as tmpdir:
+        missing = []
+        for first, last in ranges:
+            shard_output = os.path.join(tmpdir, f"shard-{first}-{last}.md")
+            if journaled.get(f"pages {first}-{last}") is not None:
+                verbose_print(f"Pages {first}-{last} done in an earlier run", verbose)
+                texts[first] = journaled[f"pages {first}-{last}"]
+            elif cache and cache.copy_to(keys[(first, last)], shard_output):
+                verbose_print(f"Cache hit for pages {first}-{last}", verbose)
+                with open(shard_output, "r", encoding="utf-8") as f:
+                    texts[first] = f.read()
+            else:
+                missing.append((first, last))
+
+        try:
+            if missing:
+                shard_files = split_pdf(input_file, missing, tmpdir, verbose)
+                # Predictions run concurrently on Replicate once created
+                shards = {}
+                try:
+                    for (first, last), shard_file in zip(missing, shard_files):
+                        prediction = scheduler.submit(MODEL_VERSION, api_input, {"document": shard_file},
+                                                      journal_key=keys[(first, last)], document=document, unit=f"pages {first}-{last}")
+                        shards[prediction] = (first, last)
+                    pending = set(shards)
+                    while pending:
+                        # Shards are saved as they finish; the first failure ends the wait
+                        done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+                        for prediction in done:
+                            first, last = shards[prediction]
+                            output = prediction.result()
+                            try:
+                                if not isinstance(output, dict) or 'markdown' not in output:
+                                    raise ValueError(f"Unexpected output format from the API for pages {first}-{last}")
+                                shard_output = os.path.join(tmpdir, f"shard-{first}-{last}.md")
+                                download_to_file(output_url(output['markdown']), shard_output)
+                            except BaseException as e:
+                                record_output(prediction, error=e)
+                                raise
+                            if cache:
+                                cache.put_file(keys[(first, last)], shard_output)
+                            verbose_print(f"Pages {first}-{last} converted", verbose)
+                            with open(shard_output, "r", encoding="utf-8") as f:
+                                texts[first] = f.read()
+                            # The shard text itself, so a resumed run needs neither the cache nor the prediction
+                            record_output(prediction, texts[first])
+                except BaseException:
+                    # The document fails as a whole, so the other shards would only cost money
+                    for prediction in shards:
+                        scheduler.cancel(prediction)
+                    raise
+        except BaseException:
+            if journal:
+                journal.finish_document(document, False)
+            raise
+
+    content = stitch_markdown(sorted(texts.items()))
+    with span("write", output=final_output_file, bytes_out=len(content.encode("utf-8"))):
+        with open(final_output_file, "w", encoding="utf-8") as f:
+            f.write(content)
+    if journal:
+        journal.finish_document(document, True)
+
+def prepare_conversion(input_file, output_file, verbose=False, force=False, dpi=400, lang="English", max_pages=None, enable_editor=False, parallel_factor=1, cache=None, shard_pages="auto", scheduler=None):
+    """Return the output filename (cache hit or sharded run), None (skipped) or a PredictionJob for one PDF."""
     verbose_print(f"Converting PDF to Markdown: {input_file}", verbose)
 
     final_output_file = generate_output_filename(input_file, output_file)
 
     if not force and os.path.exists(final_output_file):
         print(f"SKIPPING: File '{final_output_file}' already exists.", file=sys.stderr)
-        return
-
-    try:
-        # Encode the input file to base64
-        encoded_file = encode_file_to_base64(input_file)
-
-        # Prepare the input for the API
-        api_input = {
-            "document": f"data:application/pdf;base64,{encoded_file}",
+        return None
+
+    ranges = None
+    if shard_pages:
+        pages = get_no_of_pages_pdf(input_file, verbose, cache.cache_dir if cache else None)
+        if pages:
+            ranges = shard_ranges(min(pages, max_pages or pages), shard_pages)
+    sharded = ranges is not None and len(ranges) > 1
+
+    cache_key = None
+    if cache:
+        # parallel_factor only affects speed, not the result
+        params = {
             "dpi": dpi,
             "lang": lang,
-            "parallel_factor": parallel_factor,
+            "max_pages": max_pages,
             "enable_editor": enable_editor
         }
-
-        # Add max_pages if specified
-        if max_pages is not None:
-            api_input["max_pages"] = max_pages
-
-        output = replicate.run(
-            "cuuupid/marker:9c67051309f6d10ca139489f15fcb5ebc4866a3734af537c181fb13bc719d280",
-            input=api_input
-        )
-
+        if sharded:
+            # Stitched shards differ slightly from a whole-document conversion
+            params["shards"] = ranges
+        cache_key = make_cache_key(input_file, MODEL_VERSION, params=params)
+        if cache.copy_to(cache_key, final_output_file):
+            verbose_print(f"Cache hit, markdown saved as: {final_output_file}", verbose)
+            print(f"{final_output_file}")
+            return final_output_file
+
+    # Prepare the input for the API; the document itself is streamed to
+    # Replicate's files API when the prediction is created
+    api_input = {
+        "dpi": dpi,
+        "lang": lang,
+        "parallel_factor": parallel_factor,
+        "enable_editor": enable_editor
+    }
+
+    if sharded:
+        verbose_print(f"Converting {ranges[-1][1]} pages in {len(ranges)} shards of ~{ranges[0][1]} pages", verbose)
+        convert_shards(input_file, final_output_file, ranges, api_input, verbose, cache, scheduler)
+        if cache:
+            cache.put_file(cache_key, final_output_file)
+        verbose_print(f"Markdown saved as: {final_output_file}", verbose)
+        print(f"{final_output_file}")
+        return final_output_file
+
+    # Add max_pages if specified
+    if max_pages is not None:
+        api_input["max_pages"] = max_pages
+
+    def save_output(output):
         if isinstance(output, dict) and 'markdown' in output:
-            markdown_url = output['markdown']
-            response = requests.get(markdown_url)
-            response.raise_for_status()
-            content = response.text
+            # Stream the markdown straight to the output file
+            download_to_file(output_url(output['markdown']), final_output_file)
 
-            with open(final_output_file, "w", encoding="utf-8") as f:
-                f.write(content)
+            if cache:
+                cache.put_file(cache_key, final_output_file)
 
             verbose_print(f"Markdown saved as: {final_output_file}", verbose)
             print(f"{final_output_file}")
+            return final_output_file
         else:
             print("Error: Unexpected output format from the API.", file=sys.stderr)
             sys.exit(1)
 
+    return PredictionJob(MODEL_VERSION, api_input, {"document": input_file}, save_output)
+
+def convert_pdf_to_markdown(input_file, output_file, verbose=False, force=False, dpi=400, lang="English", max_pages=None, enable_editor=False, parallel_factor=1, cache=None, shard_pages="auto", scheduler=None):
+    """Convert PDF to Markdown using Replicate API."""
+    try:
+        job = prepare_conversion(input_file, output_file, verbose, force, dpi, lang, max_pages, enable_editor, parallel_factor, cache, shard_pages, scheduler)
+        if not isinstance(job, PredictionJob):
+            return job
+        return run_prediction_job(job, scheduler)
+
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Convert PDF to Markdown using Replicate API")
-    parser.add_argument("input", help="Input PDF file")
-    parser.add_argument("-o", "--output", help="Output filename")
+    parser.add_argument("inputs", nargs="*", metavar="input", help="Input PDF file(s) or glob pattern(s)")
+    parser.add_argument("-o", "--output", help="Output filename (single input only)")
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
     parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
+    parser.add_argument("--key-file", help="Path to file containing REPLICATE_API_TOKEN (e.g., ~/.env.replicate)")
     parser.add_argument("--dpi", type=int, default=400, help="The DPI to use for OCR (default: 400)")
     parser.add_argument("--lang", choices=["English", "Spanish", "Portuguese", "French", "German", "Russian"], default="English", help="Language to use for OCR (default: English)")
     parser.add_argument("--max-pages", type=int, help="Maximum number of pages to parse")
     parser.add_argument("--enable-editor", action="store_true", help="Enable the editor model")
     parser.add_argument("--parallel-factor", type=int, default=1, help="Parallel factor to use for OCR (default: 1)")
-    args = parser.parse_args()
-
-    check_api_token()
-    convert_pdf_to_markdown(
-        args.input,
-        args.output,
-        args.verbose,
-        args.force,
-        args.dpi,
-        args.lang,
-        args.max_pages,
-        args.enable_editor,
-        args.parallel_factor
+    parser.add_argument("--shard-pages", type=parse_shard_pages, default="auto", help="Split PDFs into page ranges of this size converted as concurrent predictions; 'auto' picks it from the page count, 0 disables (default: auto)")
+    add_batch_arguments(parser, 4, "Number of files uploaded/downloaded concurrently")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_daemon_arguments(parser)
+    args = parser.parse_args(argv)
+    inputs = collect_inputs(parser, args)
+    configure_metrics(args)
+
+    options = {
+        "dpi": args.dpi,
+        "lang": args.lang,
+        "max_pages": args.max_pages,
+        "enable_editor": args.enable_editor,
+        "parallel_factor": args.parallel_factor,
+        "shard_pages": args.shard_pages,
+    }
+    failed = forward_to_daemon(args, "marker", inputs, lambda input_file: generate_output_filename(input_file, args.output), options)
+    if failed is not None:
+        sys.exit(1 if failed else 0)
+    cache = open_cache(args)
+
+    check_api_token("replicate", args.key_file)
+    scheduler = open_scheduler(args)
+    failed = run_prediction_batch(
+        lambda input_file: prepare_conversion(
+            input_file,
+            args.output,
+            args.verbose,
+            args.force,
+            args.dpi,
+            args.lang,
+            args.max_pages,
+            args.enable_editor,
+            args.parallel_factor,
+            cache,
+            args.shard_pages,
+            scheduler
+        ),
+        inputs,
+        scheduler,
+        args.jobs,
+        args.verbose
     )
+    scheduler.close()
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
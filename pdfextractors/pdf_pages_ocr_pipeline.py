@@ -0,0 +1,248 @@
+#!/usr/bin/env -S uv run
+# /// script
+# dependencies = [
+#   "replicate>=1.0.0",
+#   "requests>=2.31.0",
+#   "openai>=1.0.0",
+#   "numpy>=1.24.0",
+#   "pillow>=10.0.0",
+#   "pypdf>=4.0.0",
+# ]
+# requires-python = ">=3.11"
+# ///
+
+"""
+PDF to Markdown via image OCR extractors, pipelined page by page.
+
+Renders PDF pages to images and OCRs them with one of the imgextractors
+(surya, DeepSeek-OCR via Replicate or DeepInfra). Page N+1 is rendered while
+page N is being OCR'd remotely, and the merged Markdown is written to disk
+page by page, in order, as pages complete. Pages with a usable embedded text
+layer (born-digital PDFs) are taken from it locally instead of being OCR'd.
+
+Usage:
+    ./pdf_pages_ocr_pipeline.py document.pdf
+    ./pdf_pages_ocr_pipeline.py --extractor deepseek-deepinfra --jobs 32 manual.pdf -o manual.md
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_ocr.batch import add_batch_arguments, collect_inputs, run_batch
+from ai_ocr.blankpage import add_blank_page_arguments
+from ai_ocr.cache import add_cache_arguments, open_cache
+from ai_ocr.common import check_api_token, generate_output_filename, verbose_print
+from ai_ocr.dedup import PageDeduplicator, add_dedup_arguments
+from ai_ocr.hedge import PROVIDERS as HEDGE_PROVIDERS, HedgedDeepSeek, add_hedge_arguments
+from ai_ocr.journal import add_journal_arguments, configure_journal, current_journal, make_key
+from ai_ocr.metrics import add_metrics_arguments, configure_metrics
+from ai_ocr.pdfprobe import file_fingerprint
+from ai_ocr.pipeline import ocr_pdf_pages
+from ai_ocr.preprocess import DEEPSEEK_DYNAMIC_MAX_SIDE, add_preprocess_arguments, extractor_max_side
+from ai_ocr.rasterize import DEFAULT_DPI
+from ai_ocr.registry import extractor_names, get_extractor
+from ai_ocr.resilience import add_resilience_arguments, configure_resilience
+from ai_ocr.router import add_router_arguments, available_extractors, open_router, open_stats, parse_prices
+from ai_ocr.textlayer import TextLayerRouter, add_text_layer_arguments
+from ai_ocr.usage import add_usage_arguments, configure_usage
+
+EXTRACTORS = extractor_names("image")
+
+def extractor_options(name, args):
+    """Keyword options for an image extractor from the pipeline arguments."""
+    options = {}
+    if name == "deepseek-replicate":
+        options = {"task_type": args.task, "resolution_size": args.resolution}
+    elif name == "deepseek-deepinfra":
+        options = {"task_type": args.task, "base_url": args.base_url}
+    if get_extractor(name).module.startswith("imgextractors."):
+        # Plugin extractors may not know the option
+        options["preprocess"] = not args.no_preprocess
+    return options
+
+def open_hedger(args):
+    """HedgedDeepSeek with the selected DeepSeek-OCR extractor as primary."""
+    check_api_token(get_extractor(args.extractor).provider, args.key_file)
+    for name in HEDGE_PROVIDERS:
+        check_api_token(get_extractor(name).provider)
+    return HedgedDeepSeek(
+        args.extractor,
+        args.task,
+        args.resolution,
+        args.base_url,
+        not args.no_preprocess,
+        args.hedge_percentile,
+        args.hedge_delay,
+        open_stats(args),
+        parse_prices(args.price),
+        args.verbose
+    )
+
+def make_page_ocr(args, cache, router=None, hedger=None):
+    """
+    Return ocr_page(png_path, page_no) -> text for the selected image extractor,
+    for the extractor the router picks per page with -e auto, or hedged across
+    both DeepSeek-OCR providers with --hedge.
+    """
+    if hedger is not None:
+        return lambda png_path, page_no: hedger.ocr(png_path, cache, f"page {page_no}")
+    if router is None:
+        check_api_token(get_extractor(args.extractor).provider, args.key_file)
+
+    def run(name, png_path, page_output):
+        extractor = get_extractor(name)
+        extractor.extract(png_path, page_output, verbose=args.verbose, force=True, cache=cache, **extractor_options(name, args))
+        with open(page_output, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def ocr_page(png_path, page_no):
+        with tempfile.TemporaryDirectory(prefix="ai_ocr_page_") as tmpdir:
+            page_output = os.path.join(tmpdir, f"page-{page_no}.md")
+            if router is None:
+                return run(args.extractor, png_path, page_output)
+            return router.run(lambda name: run(name, png_path, page_output), 1, f"page {page_no}", cache)[1]
+
+    return ocr_page
+
+def render_size(args):
+    """Longest page side in pixels to render at, or None to render at --dpi."""
+    if args.dpi or args.no_preprocess:
+        return None
+    if args.extractor == "auto":
+        # Large enough for any extractor the router may pick
+        return DEEPSEEK_DYNAMIC_MAX_SIDE
+    # Rendering beyond what the model reads only costs rasterizing and upload time
+    options = {"resolution_size": args.resolution} if args.extractor == "deepseek-replicate" else None
+    return extractor_max_side(args.extractor, options)
+
+def open_deduplicator(args, cache):
+    """PageDeduplicator for the selected extractor settings, or None with --no-dedup."""
+    if args.no_dedup:
+        return None
+    # Repeated pages may only reuse text produced by the same model, task and rendering
+    context = make_key("pages", args.extractor, args.task, args.resolution, args.base_url, args.dpi, render_size(args))
+    index_path = os.path.join(cache.cache_dir, "pages.sqlite3") if cache else None
+    return PageDeduplicator(context, args.dedup_distance, index_path, args.verbose)
+
+def convert_pdf_pages(input_file, output_file, ocr_page, args, dedup=None, text_layer=None):
+    """Convert one PDF with the page pipeline; returns output filename or None when skipped."""
+    final_output_file = generate_output_filename(input_file, output_file)
+
+    if not args.force and os.path.exists(final_output_file):
+        print(f"SKIPPING: File '{final_output_file}' already exists.", file=sys.stderr)
+        return None
+
+    verbose_print(f"Converting PDF pages with {args.extractor}: {input_file}", args.verbose)
+    scale_to = render_size(args)
+    journal = current_journal()
+    document = None
+    if journal is not None:
+        # Page results depend on the file, extractor settings and rendering, not on the output name
+        document = make_key("pages", file_fingerprint(input_file), args.extractor, args.task, args.resolution, args.base_url, args.dpi, scale_to, args.first, args.last, args.no_text_layer)
+    # Extractors print their per-page output filenames; keep stdout for final results
+    with contextlib.redirect_stdout(sys.stderr):
+        ok = ocr_pdf_pages(
+            input_file,
+            final_output_file,
+            ocr_page,
+            args.first,
+            args.last,
+            args.dpi or DEFAULT_DPI,
+            args.jobs,
+            args.render_jobs,
+            args.verbose,
+            journal,
+            document,
+            scale_to,
+            dedup,
+            args.blank_ink,
+            args.blank_page_text,
+            text_layer,
+            os.path.expanduser(args.cache_dir)
+        )
+    if not ok:
+        sys.exit(1)
+
+    verbose_print(f"Markdown saved as: {final_output_file}", args.verbose)
+    print(f"{final_output_file}")
+    return final_output_file
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert PDF to Markdown by OCR'ing page images, pipelined")
+    parser.add_argument("inputs", nargs="*", metavar="input", help="Input PDF file(s) or glob pattern(s)")
+    parser.add_argument("-o", "--output", help="Output filename (single input only)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
+    parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
+    parser.add_argument("-e", "--extractor", choices=EXTRACTORS + ["auto"], default="surya", help="Image OCR extractor, or auto to pick one per page by recorded latency, failures and cost (default: surya)")
+    parser.add_argument("--first", type=int, help="First page to process")
+    parser.add_argument("--last", type=int, help="Last page to process")
+    parser.add_argument("--dpi", type=int, help=f"Rendering resolution (default: the extractor's input size in pixels, else {DEFAULT_DPI})")
+    parser.add_argument("--render-jobs", type=int, help="Parallel page renderer processes (default: CPU count)")
+    parser.add_argument("--task", default="Convert to Markdown", help="DeepSeek-OCR task type (default: Convert to Markdown)")
+    parser.add_argument("--resolution", default="Base", help="DeepSeek-OCR resolution for deepseek-replicate, or auto per page (default: Base)")
+    parser.add_argument("--base-url", help="OpenAI-compatible API base URL for deepseek-deepinfra")
+    parser.add_argument("--key-file", help="Path to file containing the provider API token")
+    add_preprocess_arguments(parser)
+    add_dedup_arguments(parser)
+    add_blank_page_arguments(parser)
+    add_text_layer_arguments(parser)
+    add_router_arguments(parser)
+    add_hedge_arguments(parser)
+    add_batch_arguments(parser, 8, "Pages OCR'd concurrently per document")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_usage_arguments(parser)
+    add_resilience_arguments(parser)
+    add_journal_arguments(parser)
+    args = parser.parse_args(argv)
+    inputs = collect_inputs(parser, args)
+    configure_metrics(args)
+    configure_usage(args)
+    cache = open_cache(args)
+    router = hedger = None
+    if args.hedge:
+        if args.extractor not in HEDGE_PROVIDERS:
+            print(f"ERROR: --hedge needs -e {' or -e '.join(HEDGE_PROVIDERS)}", file=sys.stderr)
+            sys.exit(1)
+        hedger = open_hedger(args)
+        for name in HEDGE_PROVIDERS:
+            configure_resilience(args, get_extractor(name).provider)
+    elif args.extractor == "auto":
+        candidates = available_extractors("image")
+        if not candidates:
+            print("ERROR: -e auto needs the API token of at least one image extractor's provider in the environment", file=sys.stderr)
+            sys.exit(1)
+        router = open_router(args, candidates)
+        for provider in sorted({get_extractor(name).provider for name in candidates}):
+            configure_resilience(args, provider)
+    else:
+        configure_resilience(args, get_extractor(args.extractor).provider)
+    configure_journal(args)
+
+    ocr_page = make_page_ocr(args, cache, router, hedger)
+    dedup = open_deduplicator(args, cache)
+    text_layer = None if args.no_text_layer else TextLayerRouter(args.verbose)
+    # --jobs is the per-document OCR concurrency, documents run one after another
+    failed = run_batch(
+        lambda input_file: convert_pdf_pages(input_file, args.output, ocr_page, args, dedup, text_layer),
+        inputs,
+        1,
+        args.verbose
+    )
+    if text_layer is not None:
+        text_layer.print_summary()
+    if dedup is not None:
+        dedup.print_summary()
+    if router is not None:
+        router.print_summary()
+    if hedger is not None:
+        hedger.print_summary()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Offline load and latency benchmark for the extractor wrappers.
+
+Starts the local stand-in servers from tests/fakes (Replicate files/predictions
+API and the DeepInfra OpenAI-compatible chat endpoint) with configurable latency
+distribution, output size and error rate, then drives every wrapper at
+increasing concurrency. Each (extractor, concurrency) run happens in a fresh
+subprocess calling the wrapper's per-file function from a thread pool, and
+reports p50/p95/p99 per-file latency, throughput, errors and peak RSS (from
+os.wait4). No API tokens are needed and nothing is billed.
+
+Usage:
+    python3 tests/benchmarks/extractor_load_benchmark.py
+    python3 tests/benchmarks/extractor_load_benchmark.py --extractors nougat,deepseek-deepinfra \\
+        --concurrency 1,8,32 --latency lognormal:1:0.6 --error-rate 0.02 --json bench.json
+    python3 tests/benchmarks/extractor_load_benchmark.py --baseline bench.json
+
+With --baseline, runs whose p95 latency, throughput or peak RSS got worse than
+--tolerance (default 25%) are reported as REGRESSION and the exit code is 1.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "tests", "fakes"))
+
+from ai_ocr.registry import EXTRACTORS as REGISTRY
+
+# name -> synthetic input extension
+EXTRACTORS = {name: ".pdf" if extractor.input_kind == "pdf" else ".png" for name, extractor in REGISTRY.items()}
+
+def make_call(name, poll_interval, base_url, rate_limit):
+    """Return call(input_file, output_file) running one file through the named wrapper."""
+    from ai_ocr.predictions import PredictionScheduler
+    from ai_ocr.resilience import set_rate_limit
+
+    # The fakes have no quota; by default measure the wrappers, not the limiter
+    for provider in ("replicate", "replicate-api", "deepinfra"):
+        set_rate_limit(provider, rate_limit)
+    extractor = REGISTRY[name]
+    if extractor.provider == "replicate":
+        options = {"scheduler": PredictionScheduler(poll_interval=poll_interval)}
+    else:
+        options = {"base_url": base_url}
+    return lambda input_file, output_file: extractor.extract(input_file, output_file, force=True, **options)
+
+def run_worker(args):
+    """Subprocess side: push all inputs through one wrapper at the given concurrency."""
+    call = make_call(args.run, args.poll_interval, args.base_url, args.rate_limit)
+    with open(args.inputs_list) as f:
+        inputs = f.read().split()
+    output_dir = os.path.dirname(args.results)
+
+    def timed(index, input_file):
+        start = time.monotonic()
+        try:
+            call(input_file, os.path.join(output_dir, f"out_{index}.md"))
+        except (SystemExit, Exception):
+            return None
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    # Wrappers print output filenames on stdout; keep the pipe quiet
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            latencies = list(executor.map(timed, range(len(inputs)), inputs))
+    elapsed = time.monotonic() - start
+    with open(args.results, "w") as f:
+        json.dump({"latencies": [x for x in latencies if x is not None], "errors": latencies.count(None), "elapsed": elapsed}, f)
+
+def percentile(values, p):
+    """Nearest-rank percentile of values (nan when empty)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+def run_one(name, concurrency, inputs, workdir, args, env):
+    """Run one (extractor, concurrency) combination in a subprocess and return its metrics."""
+    run_dir = tempfile.mkdtemp(prefix=f"{name}_{concurrency}_", dir=workdir)
+    inputs_list = os.path.join(run_dir, "inputs.txt")
+    with open(inputs_list, "w") as f:
+        f.write("\n".join(inputs))
+    results = os.path.join(run_dir, "results.json")
+    with open(os.path.join(run_dir, "stderr.log"), "w") as stderr:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--run", name, "--concurrency-run", str(concurrency),
+             "--inputs-list", inputs_list, "--results", results, "--poll-interval", str(args.poll_interval),
+             "--rate-limit", str(args.rate_limit),
+             "--base-url", env["DEEPINFRA_BASE_URL"]],
+            env=env, stdout=subprocess.DEVNULL, stderr=stderr
+        )
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0 or not os.path.exists(results):
+        raise RuntimeError(f"{name} at concurrency {concurrency} failed, see {run_dir}/stderr.log")
+    with open(results) as f:
+        data = json.load(f)
+    latencies = data["latencies"]
+    if data["errors"]:
+        with open(os.path.join(run_dir, "stderr.log")) as f:
+            first_error = next((line.strip() for line in f if line.startswith("Error")), "unknown error")
+        print(f"  {name} c={concurrency}: {data['errors']} error(s), first: {first_error}", file=sys.stderr)
+    return {
+        "extractor": name,
+        "concurrency": concurrency,
+        "files": len(inputs),
+        "ok": len(latencies),
+        "errors": data["errors"],
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "throughput": len(latencies) / data["elapsed"] if data["elapsed"] > 0 else 0.0,
+        # ru_maxrss is in kB on Linux
+        "peak_rss_mb": rusage.ru_maxrss / 1024,
+    }
+
+def print_row(result):
+    print(
+        f"{result['extractor']:<20} {result['concurrency']:>5} {result['files']:>6} {result['errors']:>6} "
+        f"{result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f} "
+        f"{result['throughput']:>9.2f} {result['peak_rss_mb']:>9.1f}",
+        flush=True
+    )
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """Print REGRESSION lines for runs worse than baseline by more than tolerance; returns count."""
+    with open(baseline_path) as f:
+        baseline = {(r["extractor"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    for result in results:
+        old = baseline.get((result["extractor"], result["concurrency"]))
+        if old is None:
+            continue
+        checks = [
+            ("p95", result["p95"] > old["p95"] * (1 + tolerance)),
+            ("throughput", result["throughput"] < old["throughput"] * (1 - tolerance)),
+            ("peak_rss_mb", result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance)),
+        ]
+        for metric, worse in checks:
+            if worse:
+                regressions += 1
+                print(f"REGRESSION: {result['extractor']} c={result['concurrency']} {metric}: {old[metric]:.2f} -> {result[metric]:.2f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load/latency benchmark of the extractor wrappers against local fake APIs")
+    parser.add_argument("--extractors", default=",".join(EXTRACTORS), help=f"Comma separated extractors (default: {','.join(EXTRACTORS)})")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma separated concurrency levels (default: 1,4,16,64)")
+    parser.add_argument("--files", type=int, default=0, help="Files per run (default: 4x concurrency, at least 16)")
+    parser.add_argument("--latency", default="lognormal:0.5:0.5", help="Fake model latency spec, see tests/fakes/fake_common.py (default: lognormal:0.5:0.5)")
+    parser.add_argument("--input-bytes", type=int, default=64 * 1024, help="Size of each synthetic input file (default: 65536)")
+    parser.add_argument("--output-bytes", type=int, default=4096, help="Size of each fake OCR output (default: 4096)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of API calls answered with 429/5xx (default: 0)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of Replicate predictions that fail (default: 0)")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="Prediction scheduler sweep interval (default: 0.1)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Per-provider API requests/s inside each run, 0 = unlimited (default: 0)")
+    parser.add_argument("--json", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression vs --baseline (default: 0.25)")
+    parser.add_argument("--run", choices=list(EXTRACTORS), help=argparse.SUPPRESS)
+    parser.add_argument("--concurrency-run", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--inputs-list", help=argparse.SUPPRESS)
+    parser.add_argument("--results", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        args.concurrency = args.concurrency_run
+        run_worker(args)
+        return
+
+    import fake_openai_server
+    import fake_replicate_server
+
+    names = [name.strip() for name in args.extractors.split(",") if name.strip()]
+    unknown = [name for name in names if name not in EXTRACTORS]
+    if unknown:
+        parser.error(f"unknown extractor(s): {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    replicate_server = fake_replicate_server.start_server(
+        latency=args.latency, fail_rate=args.fail_rate, output_bytes=args.output_bytes, error_rate=args.error_rate
+    )
+    openai_server = fake_openai_server.start_server(
+        latency=args.latency, output_bytes=args.output_bytes, error_rate=args.error_rate
+    )
+    env = dict(os.environ)
+    env.update({
+        "REPLICATE_BASE_URL": f"http://127.0.0.1:{replicate_server.server_port}",
+        "REPLICATE_API_TOKEN": "fake",
+        "DEEPINFRA_API_TOKEN": "fake",
+        "DEEPINFRA_BASE_URL": f"http://127.0.0.1:{openai_server.server_port}/v1/openai",
+    })
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ai_ocr_bench_") as workdir:
+        print(f"latency={args.latency} output_bytes={args.output_bytes} input_bytes={args.input_bytes} "
+              f"error_rate={args.error_rate} fail_rate={args.fail_rate}")
+        print(f"{'extractor':<20} {'conc':>5} {'files':>6} {'errors':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'files/s':>9} {'RSS MB':>9}")
+        for name in names:
+            for concurrency in levels:
+                count = args.files or max(16, 4 * concurrency)
+                inputs = []
+                for index in range(count):
+                    path = os.path.join(workdir, f"{name}_{concurrency}_{index}{EXTRACTORS[name]}")
+                    with open(path, "wb") as f:
+                        f.write(os.urandom(args.input_bytes))
+                    inputs.append(path)
+                result = run_one(name, concurrency, inputs, workdir, args, env)
+                results.append(result)
+                print_row(result)
+
+    replicate_server.shutdown()
+    openai_server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if v is not None}, "results": results}, f, indent=2)
+    if args.baseline and compare_with_baseline(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
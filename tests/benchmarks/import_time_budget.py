@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the `ai-ocr` command and every extractor.
+
+Runs `python -X importtime -m ai_ocr <command> --help` for the command overview,
+each registered extractor and the pipeline, and fails when
+
+* a provider SDK or other heavy module (replicate, openai, requests, httpx,
+  pydantic, numpy, PIL, asyncio, http.server) is imported just to print help, or
+* the modules imported on top of the bare interpreter take longer than
+  --budget-ms (default 40 ms) according to -X importtime.
+
+Both limits keep short invocations (help, cache hits, SKIPPING) fast: the SDKs
+are only imported when an API call is actually made. Needs no API access.
+
+Usage:
+    python3 tests/benchmarks/import_time_budget.py
+    python3 tests/benchmarks/import_time_budget.py --budget-ms 25 --commands nougat,pipeline
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_DIR)
+
+# Top-level modules that must not be imported by --help
+FORBIDDEN = ["replicate", "openai", "requests", "httpx", "pydantic", "numpy", "PIL", "asyncio", "http.server"]
+DEFAULT_BUDGET_MS = 40.0
+RUNS = 3
+
+def import_times(args):
+    """Run python -X importtime with args; return {module: (depth, cumulative_us)} of the fastest run."""
+    best = None
+    for _ in range(RUNS):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", *args],
+            cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"python {' '.join(args)} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            depth = (len(name) - len(name.lstrip())) // 2
+            modules[name.strip()] = (depth, int(cumulative))
+        total = sum(us for depth, us in modules.values() if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, modules)
+    return best[1]
+
+def main():
+    from ai_ocr.cli import COMMANDS
+    from ai_ocr.registry import EXTRACTORS
+
+    parser = argparse.ArgumentParser(description="Check that ai-ocr commands start without importing heavy modules")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help=f"Allowed import time on top of the bare interpreter (default: {DEFAULT_BUDGET_MS:g})")
+    parser.add_argument("--commands", help="Comma separated commands to check (default: overview, all extractors and commands)")
+    args = parser.parse_args()
+
+    commands = args.commands.split(",") if args.commands else ["", *EXTRACTORS, *COMMANDS]
+    baseline = import_times(["-c", "pass"])
+
+    failures = 0
+    print(f"{'command':<20} {'imports ms':>10}  heavy modules")
+    for command in commands:
+        modules = import_times(["-m", "ai_ocr", *([command] if command else []), "--help"])
+        added = {name: value for name, value in modules.items() if name not in baseline}
+        total_ms = sum(us for depth, us in added.values() if depth == 0) / 1000
+        heavy = sorted(name for name in added if name.split(".")[0] in FORBIDDEN or name in FORBIDDEN)
+        ok = total_ms <= args.budget_ms and not heavy
+        failures += not ok
+        print(f"{command or '(overview)':<20} {total_ms:>10.1f}  {', '.join(heavy) or '-'}{'' if ok else '  OVER BUDGET' if not heavy else '  FORBIDDEN IMPORT'}")
+
+    if failures:
+        print(f"IMPORT_BUDGET_FAILED: {failures} command(s)")
+        sys.exit(1)
+    print("IMPORT_BUDGET_OK")
+
+if __name__ == "__main__":
+    main()
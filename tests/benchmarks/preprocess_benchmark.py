@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Upload size and latency benchmark for image preprocessing (ai_ocr/preprocess.py).
+
+Generates synthetic page images the way the page pipeline used to produce them
+(A4 at 400 DPI, RGB PNG; every other page with scanner noise) plus a color
+photo-like page, and reports for each model input size
+
+* upload bytes before and after preprocessing, and the preprocessing time,
+* estimated upload time at --uplink-mbps (base64 for DeepInfra's data URIs),
+* end-to-end wall time of the DeepInfra wrapper against the local fake
+  OpenAI server (tests/fakes/fake_openai_server.py) with and without
+  --no-preprocess.
+
+Usage:
+    python3 tests/benchmarks/preprocess_benchmark.py [--pages 8] [--uplink-mbps 20]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_DIR)
+
+from ai_ocr.preprocess import DEEPSEEK_DYNAMIC_MAX_SIDE, SURYA_MAX_SIDE, deepseek_max_side, discard_preprocessed, preprocess_image
+
+A4_400DPI = (3307, 4677)
+TARGETS = [
+    ("surya", SURYA_MAX_SIDE),
+    ("deepseek Base", deepseek_max_side("Base")),
+    ("deepseek Large", deepseek_max_side("Large")),
+    ("deepseek Gundam", DEEPSEEK_DYNAMIC_MAX_SIDE),
+]
+
+def generate_text_page(path, seed, noise=False):
+    """Black text lines on a white page, saved as RGB PNG like pdftoppm output."""
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGB", A4_400DPI, "white")
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.load_default(size=48)
+    except TypeError:
+        font = ImageFont.load_default()
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+    for y in range(300, A4_400DPI[1] - 300, 90):
+        line = " ".join(rng.choice(words, 9))
+        draw.text((300, y), line, fill=(0, 0, 0), font=font)
+    if noise:
+        # Sensor noise of a scanned page compresses far worse than a clean rendering
+        pixels = np.asarray(img, dtype=np.int16) - rng.integers(0, 6, (A4_400DPI[1], A4_400DPI[0], 1))
+        img = Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+    img.save(path)
+
+def generate_photo_page(path, seed):
+    """Smooth color gradients with noise, a stand-in for a photographed page."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    height, width = A4_400DPI[1] // 2, A4_400DPI[0] // 2
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 127 // (width + height) + 64], axis=2)
+    pixels = pixels + rng.integers(-12, 12, pixels.shape)
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(path)
+
+def upload_seconds(size, uplink_mbps, base64_encoded=False):
+    """Time to send size bytes at uplink_mbps."""
+    if base64_encoded:
+        size = size * 4 / 3
+    return size * 8 / (uplink_mbps * 1e6)
+
+def measure_sizes(images, uplink_mbps):
+    print(f"{'target':<16} {'max side':>8} {'bytes before':>13} {'bytes after':>12} {'ratio':>6} {'prep s':>7} {'upload s before':>16} {'after':>7}")
+    for name, max_side in TARGETS:
+        before = after = 0
+        start = time.monotonic()
+        for image in images:
+            upload_file, _ = preprocess_image(image, max_side)
+            before += os.path.getsize(image)
+            after += os.path.getsize(upload_file)
+            discard_preprocessed(upload_file, image)
+        elapsed = time.monotonic() - start
+        print(
+            f"{name:<16} {max_side:>8} {before:>13} {after:>12} {after / before:>6.2f} {elapsed:>7.2f} "
+            f"{upload_seconds(before, uplink_mbps):>16.2f} {upload_seconds(after, uplink_mbps):>7.2f}"
+        )
+
+def start_fake_server():
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "tests", "fakes", "fake_openai_server.py"), "--port", "0"],
+        stdout=subprocess.PIPE, text=True
+    )
+    port = int(process.stdout.readline().strip().split(":")[1])
+    return process, f"http://127.0.0.1:{port}/v1/openai"
+
+def measure_end_to_end(images, workdir, uplink_mbps):
+    """Run the DeepInfra wrapper on all images against the fake server with and without preprocessing."""
+    server, base_url = start_fake_server()
+    env = dict(os.environ, DEEPINFRA_API_TOKEN="fake", PYTHONPATH=REPO_DIR)
+    try:
+        print(f"\n{'deepinfra run':<16} {'wall s':>7} {'+ upload s':>11} {'total s':>8}")
+        for label, extra in [("original", ["--no-preprocess"]), ("preprocessed", [])]:
+            out_dir = os.path.join(workdir, label)
+            os.makedirs(out_dir)
+            start = time.monotonic()
+            for image in images:
+                # One request per process, as a page-at-a-time caller would see it
+                subprocess.run(
+                    [sys.executable, os.path.join(REPO_DIR, "imgextractors", "deepseek_ocr_deepinfra.py"),
+                     "--base-url", base_url, "--no-cache", "--no-daemon", "-f", *extra,
+                     "-o", os.path.join(out_dir, os.path.basename(image) + ".md"), image],
+                    env=env, check=True, capture_output=True
+                )
+            elapsed = time.monotonic() - start
+            if extra:
+                sent = sum(os.path.getsize(image) for image in images)
+            else:
+                sent = 0
+                for image in images:
+                    upload_file, _ = preprocess_image(image, DEEPSEEK_DYNAMIC_MAX_SIDE)
+                    sent += os.path.getsize(upload_file)
+                    discard_preprocessed(upload_file, image)
+            upload = upload_seconds(sent, uplink_mbps, base64_encoded=True)
+            print(f"{label:<16} {elapsed:>7.2f} {upload:>11.2f} {elapsed + upload:>8.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload bytes and latency with and without image preprocessing")
+    parser.add_argument("--pages", type=int, default=8, help="Number of synthetic text pages (default: 8)")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="Uplink bandwidth for estimated upload times (default: 20)")
+    parser.add_argument("--no-end-to-end", action="store_true", help="Skip the runs against the fake DeepInfra server")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="preprocess_benchmark_")
+    try:
+        images = []
+        for page in range(args.pages):
+            path = os.path.join(workdir, f"page-{page + 1}.png")
+            generate_text_page(path, page, noise=page % 2 == 1)
+            images.append(path)
+        photo = os.path.join(workdir, "photo.png")
+        generate_photo_page(photo, args.pages)
+        images.append(photo)
+        print(f"{args.pages} text pages {A4_400DPI[0]}x{A4_400DPI[1]} RGB PNG (half scanned) + 1 color page, uplink {args.uplink_mbps} Mbit/s\n")
+        measure_sizes(images, args.uplink_mbps)
+        if not args.no_end_to_end:
+            measure_end_to_end(images, workdir, args.uplink_mbps)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Peak memory benchmark for upload payload preparation.
+
+Generates a large synthetic PDF (200 MB by default) and measures, each in a
+fresh subprocess, peak RSS (ru_maxrss), sampled peak anonymous RSS (excludes
+reclaimable file-backed pages such as mmaps) and wall time of:
+
+* baseline        - interpreter and imports only
+* legacy_data_uri - old `encode_file_to_base64` + f-string data URI
+* data_uri        - `ai_ocr.upload.build_data_uri` (chunked base64 via mmap)
+* streamed_upload - streaming the file handle over HTTP to a local sink,
+                    as the replicate client does with `open_for_upload`
+
+Usage:
+    python3 tests/benchmarks/upload_memory_benchmark.py [--size-mb 200] [--keep FILE]
+"""
+
+import argparse
+import base64
+import http.client
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_DIR)
+
+STRATEGIES = ["baseline", "legacy_data_uri", "data_uri", "streamed_upload"]
+
+def generate_pdf(path, size_mb):
+    """Write a synthetic PDF-like file of size_mb megabytes (incompressible payload)."""
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        for _ in range(size_mb):
+            f.write(block)
+        f.write(b"\n%%EOF\n")
+
+def legacy_data_uri(file_path):
+    """Reproduce the previous whole-file encoding path."""
+    with open(file_path, "rb") as file:
+        encoded_file = base64.b64encode(file.read()).decode('utf-8')
+    return f"data:application/pdf;base64,{encoded_file}"
+
+class SinkHandler(BaseHTTPRequestHandler):
+    """Reads and discards request bodies."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        self.send_response(204)
+        self.end_headers()
+
+def streamed_upload(file_path):
+    """Stream file to a local HTTP sink in blocks, never holding it in memory."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SinkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port, blocksize=64 * 1024)
+        with open(file_path, "rb") as f:
+            connection.request("POST", "/upload", body=f, headers={"Content-Length": str(os.path.getsize(file_path))})
+        connection.getresponse().read()
+        connection.close()
+    finally:
+        server.shutdown()
+
+def read_rss_anon_kb():
+    """Current anonymous RSS in kB from /proc (None where unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+class AnonPeakSampler(threading.Thread):
+    """Samples anonymous RSS; unlike ru_maxrss it ignores reclaimable file-backed pages."""
+
+    def __init__(self, interval=0.002):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_kb = read_rss_anon_kb()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while self.peak_kb is not None and not self.stopped.is_set():
+            self.peak_kb = max(self.peak_kb, read_rss_anon_kb())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak_kb
+
+def run_strategy(strategy, file_path):
+    """Run one strategy in this process and print peak RSS, peak anonymous RSS (MB) and seconds."""
+    from ai_ocr.upload import build_data_uri
+
+    sampler = AnonPeakSampler()
+    sampler.start()
+    start = time.monotonic()
+    if strategy == "legacy_data_uri":
+        result = legacy_data_uri(file_path)
+        del result
+    elif strategy == "data_uri":
+        result = build_data_uri(file_path, "application/pdf")
+        del result
+    elif strategy == "streamed_upload":
+        streamed_upload(file_path)
+    elapsed = time.monotonic() - start
+    peak_anon_kb = sampler.stop()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    peak_anon_mb = peak_anon_kb / 1024 if peak_anon_kb is not None else float("nan")
+    print(f"{peak_mb:.1f} {peak_anon_mb:.1f} {elapsed:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS benchmark for upload payload preparation")
+    parser.add_argument("--size-mb", type=int, default=200, help="Size of synthetic PDF in MB (default: 200)")
+    parser.add_argument("--keep", help="Use/keep synthetic PDF at this path instead of a temporary file")
+    parser.add_argument("--run", choices=STRATEGIES, help=argparse.SUPPRESS)
+    parser.add_argument("file", nargs="?", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_strategy(args.run, args.file)
+        return
+
+    tmpdir = None
+    if args.keep:
+        pdf_path = args.keep
+    else:
+        tmpdir = tempfile.mkdtemp()
+        pdf_path = os.path.join(tmpdir, "synthetic.pdf")
+    if not os.path.exists(pdf_path):
+        generate_pdf(pdf_path, args.size_mb)
+    size_mb = os.path.getsize(pdf_path) / 1024 / 1024
+
+    try:
+        print(f"File: {pdf_path} ({size_mb:.1f} MB)")
+        print(f"{'strategy':<18} {'peak RSS MB':>12} {'peak anon MB':>13} {'anon x size':>12} {'seconds':>8}")
+        for strategy in STRATEGIES:
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", strategy, pdf_path],
+                capture_output=True, text=True, check=True
+            )
+            peak_mb, peak_anon_mb, elapsed = (float(x) for x in result.stdout.split())
+            print(f"{strategy:<18} {peak_mb:>12.1f} {peak_anon_mb:>13.1f} {peak_anon_mb / size_mb:>12.2f} {elapsed:>8.2f}")
+    finally:
+        if tmpdir:
+            os.unlink(pdf_path)
+            os.rmdir(tmpdir)
+
+if __name__ == "__main__":
+    main()
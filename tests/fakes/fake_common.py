@@ -0,0 +1,70 @@
+"""
+Helpers shared by the stand-in servers: latency distributions, output padding
+and injected HTTP errors.
+
+Latency specs (seconds):
+
+    0.5                 fixed
+    uniform:0.2:1.5     uniform between low and high
+    lognormal:0.8:0.5   lognormal with given median and sigma (long tail)
+    exp:0.8             exponential with given mean
+"""
+
+import math
+import random
+from http.server import ThreadingHTTPServer
+
+FILLER_LINE = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.\n"
+
+# (status, Retry-After seconds or None) picked at random for injected errors
+INJECTED_ERRORS = [(429, 1), (500, None), (502, None), (503, 2)]
+
+class FakeServer(ThreadingHTTPServer):
+    """Threading HTTP server with a listen backlog large enough for load tests."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+class Latency:
+    """Latency distribution parsed from a spec string; sample() returns seconds."""
+
+    def __init__(self, spec):
+        self.spec = str(spec)
+        kind, _, params = self.spec.partition(":")
+        try:
+            if not params:
+                self.kind, self.params = "fixed", [float(kind)]
+            else:
+                self.kind, self.params = kind, [float(value) for value in params.split(":")]
+        except ValueError:
+            raise ValueError(f"invalid latency spec: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exp": 1}
+        if expected.get(self.kind) != len(self.params):
+            raise ValueError(f"invalid latency spec: {spec}")
+
+    def sample(self):
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return random.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return random.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return random.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+
+    def __str__(self):
+        return self.spec
+
+def pad_text(text, size):
+    """Pad text with filler lines up to roughly `size` bytes (no-op when already longer)."""
+    missing = size - len(text.encode("utf-8"))
+    if missing <= 0:
+        return text
+    repeats = missing // len(FILLER_LINE) + 1
+    return text + "\n" + (FILLER_LINE * repeats)[:missing]
+
+def injected_error(rate):
+    """Return (status, retry_after) for an injected failure, or None."""
+    if rate > 0 and random.random() < rate:
+        return random.choice(INJECTED_ERRORS)
+    return None
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in for the DeepInfra chat completions endpoint.
+
+Answers POST .../chat/completions with a deterministic fake OCR result, so the
+DeepInfra wrapper can be exercised without network access or API costs:
+
+    python3 tests/fakes/fake_openai_server.py --port 8765 &
+    imgextractors/deepseek_ocr_deepinfra.py --base-url http://127.0.0.1:8765/v1/openai page.png
+
+`--latency` takes a distribution spec (see fake_common.py), `--output-bytes` pads
+the answer and `--error-rate` answers that fraction of requests with 429/5xx.
+Requests with `stream: true` are answered as server-sent events, paced by
+`--token-interval`.
+Prints `LISTENING:<port>` on stdout once ready (use --port 0 for a free port).
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler
+
+from fake_common import FakeServer, Latency, injected_error, pad_text
+
+# Tokens per server-sent event of streamed answers
+STREAM_TOKENS = 4
+
+def fake_ocr_text(request):
+    """Build fake OCR content that reflects the request (prompt and image size)."""
+    image_chars = 0
+    prompt = ""
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            prompt += content
+            continue
+        for part in content or []:
+            if part.get("type") == "image_url":
+                image_chars += len(part.get("image_url", {}).get("url", ""))
+            elif part.get("type") == "text":
+                prompt += part.get("text", "")
+    return f"# Fake OCR\n\nPrompt: {prompt.strip()}\n\nImage payload: {image_chars} chars\n"
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the subset of the OpenAI API used by the wrappers."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "deepseek-ai/DeepSeek-OCR", "object": "model"}]})
+        else:
+            self.send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+            return
+
+        error = injected_error(self.server.error_rate)
+        if error is not None:
+            status, retry_after = error
+            body = json.dumps({"error": {"message": f"Injected error {status}", "type": "server_error", "code": status}}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if retry_after is not None:
+                self.send_header("Retry-After", str(retry_after))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        latency = self.server.latency.sample()
+        if latency:
+            time.sleep(latency)
+
+        content = pad_text(fake_ocr_text(request), self.server.output_bytes)
+        prompt_tokens = 256
+        # One token per word; answers longer than max_tokens are cut off like a real model's
+        tokens = re.findall(r"\s*\S+\s*", content)
+        finish_reason = "stop"
+        max_tokens = request.get("max_tokens")
+        if max_tokens and len(tokens) > max_tokens:
+            tokens, finish_reason = tokens[:max_tokens], "length"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", "deepseek-ai/DeepSeek-OCR")
+        if request.get("stream"):
+            self.send_stream(request, completion_id, model, tokens, finish_reason, usage)
+            return
+        self.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        })
+
+    def send_stream(self, request, completion_id, model, tokens, finish_reason, usage):
+        """Answer as server-sent events: STREAM_TOKENS tokens per chunk, usage last if requested."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": choices}
+            if usage is not None:
+                chunk["usage"] = usage
+            data = f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for start in range(0, len(tokens), STREAM_TOKENS):
+            if start and self.server.token_interval:
+                time.sleep(self.server.token_interval * STREAM_TOKENS)
+            event([{"index": 0, "delta": {"content": "".join(tokens[start:start + STREAM_TOKENS])}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], usage)
+        data = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+def start_server(host="127.0.0.1", port=0, latency=0.0, verbose=False, output_bytes=0, error_rate=0.0, token_interval=0.0):
+    """Start the fake server in a daemon thread and return it (port in server.server_port)."""
+    server = FakeServer((host, port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.latency = Latency(latency)
+    server.output_bytes = output_bytes
+    server.error_rate = error_rate
+    server.token_interval = token_interval
+    server.verbose = verbose
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server for DeepInfra")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port, 0 picks a free one (default: 8765)")
+    parser.add_argument("--latency", default="0", help="Seconds to wait before answering, or a distribution like lognormal:0.5:0.4 (default: 0)")
+    parser.add_argument("--output-bytes", type=int, default=0, help="Pad answers to this many bytes (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/5xx (default: 0)")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Seconds per token of streamed answers (stream=true) after the first chunk (default: 0)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log requests to stderr")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency, args.verbose, args.output_bytes, args.error_rate, args.token_interval)
+    print(f"LISTENING:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
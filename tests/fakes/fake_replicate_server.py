@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the subset of the Replicate HTTP API used by the wrappers.
+
+Implements file uploads, asynchronous predictions (list, get, cancel), signed
+completion webhooks and output file downloads. Predictions move from `starting`
+to `processing` to `succeeded` on a timer, so the prediction scheduler can be
+exercised without network access or API costs:
+
+    python3 tests/fakes/fake_replicate_server.py --port 8766 --latency 2 &
+    REPLICATE_BASE_URL=http://127.0.0.1:8766 REPLICATE_API_TOKEN=fake \
+        pdfextractors/cudanexus_nougat_replicate.py *.pdf
+
+Output shapes follow the real models (nougat: file URL, marker: {"markdown": URL},
+surya: {"text_file": URL, "image": URL}, deepseek: text). `--latency` takes a
+distribution spec (see fake_common.py), `--output-bytes` pads outputs and
+`--error-rate` answers that fraction of API calls with 429/5xx. GET /__stats
+returns request counters. Prints `LISTENING:<port>` on stdout once ready.
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from fake_common import FakeServer, Latency, injected_error, pad_text
+
+# Version ids of the models the wrappers pin -> output shape
+OUTPUT_KINDS = {
+    "d0b4e90da423598ff84debc9115bf891dd819843600ad842c0c178e3571f9e76": "nougat",
+    "9c67051309f6d10ca139489f15fcb5ebc4866a3734af537c181fb13bc719d280": "marker",
+    "7ab5bedee2cd1f0c82b2df6718d19bf0b473f738f9db062f122e47e1467f96ce": "surya",
+    "deedb3f2ecdf38e90c79e79befd926ba8e95077cfef92ffec06f2f3494f1ce82": "deepseek",
+}
+PAGE_SIZE = 100
+# 1x1 transparent PNG for surya's annotated image output
+FAKE_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+def isoformat(timestamp):
+    """Replicate-style UTC timestamp (fixed width, so strings sort chronologically)."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+class FakeReplicateState:
+    """Uploaded files, predictions and output files, guarded by one lock."""
+
+    def __init__(self, latency, boot, fail_rate, webhook_secret, output_bytes=0, error_rate=0.0):
+        self.latency = latency
+        self.boot = boot
+        self.fail_rate = fail_rate
+        self.output_bytes = output_bytes
+        self.error_rate = error_rate
+        self.webhook_secret = webhook_secret
+        self.lock = threading.Lock()
+        self.files = {}
+        self.outputs = {}
+        self.predictions = {}
+        self.order = []
+        self.stats = {}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+class FakeReplicateHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the Replicate API endpoints used by the wrappers."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def send_injected_error(self):
+        """Answer with an injected 429/5xx (per --error-rate); returns True if it did."""
+        error = injected_error(self.state.error_rate)
+        if error is None:
+            return False
+        status, retry_after = error
+        self.state.count(f"injected_{status}")
+        body = json.dumps({"detail": f"Injected error {status}", "status": status}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/problem+json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if url.path == "/__stats":
+            with self.state.lock:
+                self.send_json(200, dict(self.state.stats))
+        elif parts[:1] == ["v1"] and parts[1:2] != ["webhooks"] and self.send_injected_error():
+            return
+        elif url.path == "/v1/predictions":
+            self.state.count("list_predictions")
+            self.list_predictions(parse_qs(url.query))
+        elif parts[:2] == ["v1", "predictions"] and len(parts) == 3:
+            self.state.count("get_prediction")
+            prediction = self.refresh(parts[2])
+            if prediction is None:
+                self.send_json(404, {"detail": "Not found."})
+            else:
+                self.send_json(200, prediction)
+        elif url.path == "/v1/webhooks/default/secret":
+            self.send_json(200, {"key": self.state.webhook_secret})
+        elif parts[:1] == ["outputs"] and len(parts) == 3:
+            self.state.count("download_output")
+            with self.state.lock:
+                output = self.state.outputs.get(parts[1] + "/" + parts[2])
+            if output is None:
+                self.send_json(404, {"detail": "Not found."})
+            else:
+                self.send_body(200, output[0], output[1])
+        else:
+            self.send_json(404, {"detail": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        body = self.read_body()
+        if parts[:1] == ["v1"] and self.send_injected_error():
+            return
+        if parts == ["v1", "files"]:
+            self.state.count("create_file")
+            self.create_file(body)
+        elif parts == ["v1", "predictions"]:
+            self.state.count("create_prediction")
+            self.create_prediction(json.loads(body or b"{}"))
+        elif parts[:2] == ["v1", "models"] and parts[-1:] == ["predictions"]:
+            self.state.count("create_prediction")
+            self.create_prediction(json.loads(body or b"{}"), model="/".join(parts[2:4]))
+        elif parts[:2] == ["v1", "predictions"] and parts[-1:] == ["cancel"]:
+            self.state.count("cancel_prediction")
+            with self.state.lock:
+                prediction = self.state.predictions.get(parts[2])
+                if prediction and prediction["status"] not in ("succeeded", "failed", "canceled"):
+                    prediction["status"] = "canceled"
+                    prediction["completed_at"] = isoformat(time.time())
+            if prediction is None:
+                self.send_json(404, {"detail": "Not found."})
+            else:
+                self.send_json(200, self.public(prediction))
+        else:
+            self.send_json(404, {"detail": f"Not found: {self.path}"})
+
+    def create_file(self, body):
+        """Store the `content` part of a multipart upload."""
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("latin-1") + body
+        )
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "content":
+                break
+        else:
+            self.send_json(400, {"detail": "missing content part"})
+            return
+        content = part.get_payload(decode=True)
+        file_id = uuid.uuid4().hex
+        name = part.get_filename() or "file"
+        with self.state.lock:
+            self.state.files[file_id] = (name, content)
+        self.send_json(201, {
+            "id": file_id,
+            "name": name,
+            "content_type": part.get_content_type(),
+            "size": len(content),
+            "etag": hashlib.md5(content).hexdigest(),
+            "checksums": {"sha256": hashlib.sha256(content).hexdigest()},
+            "metadata": {},
+            "created_at": isoformat(time.time()),
+            "expires_at": None,
+            "urls": {"get": f"{self.base_url()}/v1/files/{file_id}"}
+        })
+
+    def create_prediction(self, request, model=None):
+        version = request.get("version") or ""
+        now = time.time()
+        prediction_id = uuid.uuid4().hex[:26]
+        prediction = {
+            "id": prediction_id,
+            "model": model or "fake/model",
+            "version": version,
+            "status": "starting",
+            "input": request.get("input", {}),
+            "output": None,
+            "logs": "",
+            "error": None,
+            "metrics": {},
+            "created_at": isoformat(now),
+            "started_at": None,
+            "completed_at": None,
+            "urls": {
+                "get": f"{self.base_url()}/v1/predictions/{prediction_id}",
+                "cancel": f"{self.base_url()}/v1/predictions/{prediction_id}/cancel"
+            },
+            # Private fields, stripped from responses
+            "_created": now,
+            "_latency": self.state.latency.sample(),
+            "_kind": OUTPUT_KINDS.get(version, "deepseek"),
+            "_fail": random.random() < self.state.fail_rate,
+            "_base_url": self.base_url(),
+            "_webhook": request.get("webhook"),
+        }
+        with self.state.lock:
+            self.state.predictions[prediction_id] = prediction
+            self.state.order.append(prediction_id)
+        if prediction["_webhook"]:
+            timer = threading.Timer(prediction["_latency"] + 0.01, self.send_webhook, args=(prediction_id,))
+            timer.daemon = True
+            timer.start()
+        self.send_json(201, self.public(prediction))
+
+    def refresh(self, prediction_id):
+        """Advance a prediction according to its age and return its public form."""
+        with self.state.lock:
+            prediction = self.state.predictions.get(prediction_id)
+            if prediction is None:
+                return None
+            self.advance(prediction)
+            return self.public(prediction)
+
+    def advance(self, prediction):
+        """Move status along the timeline; called with the state lock held."""
+        if prediction["status"] in ("succeeded", "failed", "canceled"):
+            return
+        age = time.time() - prediction["_created"]
+        latency = prediction["_latency"]
+        boot = min(self.state.boot, latency)
+        if age >= boot and prediction["started_at"] is None:
+            prediction["status"] = "processing"
+            prediction["started_at"] = isoformat(prediction["_created"] + boot)
+        if age >= latency:
+            prediction["completed_at"] = isoformat(prediction["_created"] + latency)
+            prediction["metrics"] = {"predict_time": latency - boot}
+            if prediction["_fail"]:
+                prediction["status"] = "failed"
+                prediction["error"] = "Fake model failure"
+            else:
+                prediction["status"] = "succeeded"
+                prediction["output"] = self.make_output(prediction)
+
+    def make_output(self, prediction):
+        """Build model-shaped output, storing output files for download."""
+        names = [value.rsplit("/", 1)[-1] for value in prediction["input"].values() if isinstance(value, str) and "/v1/files/" in value]
+        uploads = [self.state.files.get(file_id, ("missing", b"")) for file_id in names]
+        described = ", ".join(f"{name} ({len(content)} bytes)" for name, content in uploads) or "no files"
+        params = ", ".join(f"{key}={value}" for key, value in sorted(prediction["input"].items()) if not (isinstance(value, str) and "/v1/files/" in value))
+        text = pad_text(f"# Fake OCR\n\nFAKE OCR OUTPUT for {described}\n\nParameters: {params or 'none'}\n", self.state.output_bytes)
+        base = f"{prediction['_base_url']}/outputs/{prediction['id']}"
+
+        def store(name, content, content_type):
+            self.state.outputs[f"{prediction['id']}/{name}"] = (content, content_type)
+            return f"{base}/{name}"
+
+        kind = prediction["_kind"]
+        if kind == "nougat":
+            return store("output.md", text.encode("utf-8"), "text/markdown")
+        if kind == "marker":
+            return {"markdown": store("output.md", text.encode("utf-8"), "text/markdown"), "images": {}}
+        if kind == "surya":
+            return {
+                "text_file": store("results.txt", text.encode("utf-8"), "text/plain"),
+                "image": store("annotated.png", FAKE_PNG, "image/png")
+            }
+        return text
+
+    def public(self, prediction):
+        return {key: value for key, value in prediction.items() if not key.startswith("_")}
+
+    def list_predictions(self, query):
+        """Newest first, cursor pagination like the real API."""
+        offset = int(query.get("cursor", ["0"])[0])
+        with self.state.lock:
+            ids = self.state.order[::-1][offset:offset + PAGE_SIZE]
+            results = []
+            for prediction_id in ids:
+                prediction = self.state.predictions[prediction_id]
+                self.advance(prediction)
+                results.append(self.public(prediction))
+            more = offset + PAGE_SIZE < len(self.state.order)
+        self.send_json(200, {
+            "previous": None,
+            "next": f"{self.base_url()}/v1/predictions?cursor={offset + PAGE_SIZE}" if more else None,
+            "results": results
+        })
+
+    def send_webhook(self, prediction_id):
+        """POST the completed prediction to its webhook, signed like Replicate does."""
+        prediction = self.refresh(prediction_id)
+        with self.state.lock:
+            webhook = self.state.predictions[prediction_id]["_webhook"]
+        body = json.dumps(prediction)
+        webhook_id = f"msg_{uuid.uuid4().hex}"
+        timestamp = str(int(time.time()))
+        key = base64.b64decode(self.state.webhook_secret.split("_", 1)[1])
+        signature = base64.b64encode(hmac.new(key, f"{webhook_id}.{timestamp}.{body}".encode(), hashlib.sha256).digest()).decode()
+        self.state.count("webhook_sent")
+        try:
+            requests.post(webhook, data=body.encode("utf-8"), timeout=10, headers={
+                "Content-Type": "application/json",
+                "webhook-id": webhook_id,
+                "webhook-timestamp": timestamp,
+                "webhook-signature": f"v1,{signature}"
+            })
+        except requests.RequestException as e:
+            print(f"webhook delivery to {webhook} failed: {e}", file=sys.stderr)
+
+def start_server(host="127.0.0.1", port=0, latency=1.0, boot=0.0, fail_rate=0.0, verbose=False, output_bytes=0, error_rate=0.0):
+    """Start the fake server in a daemon thread and return it (port in server.server_port)."""
+    server = FakeServer((host, port), FakeReplicateHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    secret = "whsec_" + base64.b64encode(uuid.uuid4().bytes).decode()
+    server.state = FakeReplicateState(Latency(latency), boot, fail_rate, secret, output_bytes, error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in server for the Replicate API")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8766, help="Port, 0 picks a free one (default: 8766)")
+    parser.add_argument("--latency", default="1.0", help="Seconds from creation until a prediction finishes, or a distribution like lognormal:1:0.5 (default: 1)")
+    parser.add_argument("--boot", type=float, default=0.0, help="Seconds a prediction stays 'starting' (default: 0)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of predictions that fail (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of API calls answered with 429/5xx (default: 0)")
+    parser.add_argument("--output-bytes", type=int, default=0, help="Pad text outputs to this many bytes (default: 0)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log requests to stderr")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency, args.boot, args.fail_rate, args.verbose, args.output_bytes, args.error_rate)
+    print(f"LISTENING:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -172,11 +172,314 @@ check_are_words_contained "000:$extractor" "$ocrfile" Example Document John Doe
 
 ## ##### Run the tests based on flags ##### ##
 
+# LOCAL TESTS (stand-in servers, no costs) ################
+if $LOCAL_TESTS; then
+
+INFO "# Running local tests against stand-in servers..."
+
+REPO_DIR="$PWD"
+
+# Start fake server script in background, sets FAKE_PID and FAKE_PORT
+function start_fake_server() {
+    local script="$1"
+    shift 1
+    local portfile="$tmpdir/$(basename "$script").port"
+    python3 "$script" --port 0 "$@" > "$portfile" &
+    FAKE_PID=$!
+    for _ in $(seq 50); do
+        grep -q LISTENING "$portfile" 2>/dev/null && break
+        sleep 0.1
+    done
+    FAKE_PORT="$(sed -n 's/^LISTENING://p' "$portfile")"
+}
+
+# Page pipeline test document: born-digital text page, blank scan, the same scan twice.
+# Returns 1 (test skipped) without pdftoppm to render the pages.
+function make_pipeline_pdf() {
+    local pdf="$1"
+    if ! command -v pdftoppm > /dev/null; then
+        INFO "SKIPPED:local:$testname:pdftoppm not installed"
+        return 1
+    fi
+    python3 - "$REPO_DIR" "$pdf" <<'PYTHON'
+import io, sys
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+repo, pdf = sys.argv[1:]
+writer = PdfWriter()
+writer.add_page(PdfReader(f"{repo}/testdata/v00/test_latex_page_with_table.pdf").pages[0])
+scan = Image.open(f"{repo}/testdata/v00/test_latex_page_with_table-2.png").convert("L").resize((1240, 1754))
+for image in (Image.new("L", scan.size, 255), scan, scan):
+    buffer = io.BytesIO()
+    image.save(buffer, "PDF", resolution=150)
+    writer.add_page(PdfReader(buffer).pages[0])
+with open(pdf, "wb") as f:
+    writer.write(f)
+PYTHON
+}
+
+# OCR pages.pdf in the workdir with surya against a fresh fake Replicate server;
+# writes the PIPELINE summary to pipeline.txt and the predictions created to created.txt
+function run_pipeline() {
+    local workdir="$1"
+    shift 1
+    start_fake_server tests/fakes/fake_replicate_server.py --latency 0.2
+    (cd "$workdir" && set -x
+    export REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake
+    python3 "$REPO_DIR/pdfextractors/pdf_pages_ocr_pipeline.py" --no-cache "$@" pages.pdf 2> pipeline.err
+    grep '^PIPELINE:' pipeline.err > pipeline.txt
+    curl -s "$REPLICATE_BASE_URL/__stats" | python3 -c 'import json, sys; print("create_prediction=%d" % json.load(sys.stdin).get("create_prediction", 0))' > created.txt
+    )
+    kill "$FAKE_PID"
+    cat "$workdir/pipeline.txt" "$workdir/created.txt"
+}
+
+function run_local_test() {
+    local testname="$1"
+    local workdir="$tmpdir/local_$testname"
+    mkdir -p "$workdir"
+    INFO "LOCAL_TEST:$testname"
+    export AI_OCR_CACHE_DIR="$workdir/cache"
+    # Never forward to a daemon the user has running against the real APIs
+    export AI_OCR_SOCKET="$workdir/ai-ocr.sock"
+    case "$testname" in
+        deepseek_ocr_deepinfra_async)
+            start_fake_server tests/fakes/fake_openai_server.py --latency 0.2
+            (cd "$workdir" && set -x
+            DEEPINFRA_API_TOKEN=fake python3 "$REPO_DIR/imgextractors/deepseek_ocr_deepinfra.py" --verbose --jobs 2 \
+                --base-url "http://127.0.0.1:$FAKE_PORT/v1/openai" \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table-1.png" "$REPO_DIR/testdata/v00/test_latex_page_with_table-2.png"
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname:1" "$workdir/test_latex_page_with_table_1.md" Fake OCR Convert markdown
+            check_are_words_contained "local:$testname:2" "$workdir/test_latex_page_with_table_2.md" Fake OCR Convert markdown
+            ;;
+        result_cache)
+            # Renamed copy of an already processed image must be served from cache, without any server
+            start_fake_server tests/fakes/fake_openai_server.py
+            cp testdata/v00/test_latex_page_with_table-1.png "$workdir/renamed_copy.png"
+            (cd "$workdir" && set -x
+            DEEPINFRA_API_TOKEN=fake python3 "$REPO_DIR/imgextractors/deepseek_ocr_deepinfra.py" \
+                --base-url "http://127.0.0.1:$FAKE_PORT/v1/openai" "$REPO_DIR/testdata/v00/test_latex_page_with_table-1.png"
+            )
+            kill "$FAKE_PID"
+            (cd "$workdir" && set -x
+            DEEPINFRA_API_TOKEN=fake python3 "$REPO_DIR/imgextractors/deepseek_ocr_deepinfra.py" --verbose \
+                --base-url "http://127.0.0.1:$FAKE_PORT/v1/openai" renamed_copy.png
+            )
+            check_are_words_contained "local:$testname" "$workdir/renamed_copy.md" Fake OCR Convert markdown
+            ;;
+        metrics_file)
+            # Every stage of a Replicate run lands in the metrics file and the summary lists it
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 0.5
+            (cd "$workdir" && set -x
+            export REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake
+            python3 "$REPO_DIR/pdfextractors/cudanexus_nougat_replicate.py" --no-cache --metrics-file metrics.jsonl \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table.pdf" -o nougat.md
+            PYTHONPATH="$REPO_DIR" python3 -m ai_ocr metrics metrics.jsonl > metrics_report.txt
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname" "$workdir/metrics_report.txt" upload create queue inference wait download
+            ;;
+        deepinfra_stream)
+            # Streamed answer reaches stdout and the output file, with its usage recorded
+            start_fake_server tests/fakes/fake_openai_server.py --output-bytes 2000 --token-interval 0.001
+            (cd "$workdir" && set -x
+            DEEPINFRA_API_TOKEN=fake python3 "$REPO_DIR/imgextractors/deepseek_ocr_deepinfra.py" --no-cache --stream-stdout \
+                --base-url "http://127.0.0.1:$FAKE_PORT/v1/openai" \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table-1.png" > stdout.md
+            PYTHONPATH="$REPO_DIR" python3 -m ai_ocr usage > usage_report.txt
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname:stdout" "$workdir/stdout.md" Fake OCR Convert markdown Lorem
+            check_are_words_contained "local:$testname:file" "$workdir/test_latex_page_with_table_1.md" Fake OCR Convert markdown Lorem
+            check_are_words_contained "local:$testname:usage" "$workdir/usage_report.txt" "Convert to Markdown"
+            ;;
+        usage_log)
+            # Token usage of every DeepInfra call is recorded and reported per task with a projection
+            start_fake_server tests/fakes/fake_openai_server.py
+            (cd "$workdir" && set -x
+            DEEPINFRA_API_TOKEN=fake python3 "$REPO_DIR/imgextractors/deepseek_ocr_deepinfra.py" --no-cache --task "Free OCR" \
+                --base-url "http://127.0.0.1:$FAKE_PORT/v1/openai" \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table-1.png" "$REPO_DIR/testdata/v00/test_latex_page_with_table-2.png"
+            PYTHONPATH="$REPO_DIR" python3 -m ai_ocr usage --pages 1000 > usage_report.txt
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname" "$workdir/usage_report.txt" "Free OCR" tok/s "auto max" Projection completion
+            ;;
+        replicate_prediction_scheduler)
+            # Many predictions in flight against the fake Replicate API, tracked by one poller
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 0.5
+            cp testdata/v00/test_latex_page_with_table.pdf "$workdir/copy_a.pdf"
+            cp testdata/v00/test_latex_page_with_table.pdf "$workdir/copy_b.pdf"
+            (cd "$workdir" && set -x
+            export REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake
+            python3 "$REPO_DIR/pdfextractors/cudanexus_nougat_replicate.py" --no-cache copy_a.pdf copy_b.pdf
+            python3 "$REPO_DIR/imgextractors/cudanexus_ocr_surya_replicate.py" --no-cache --save-image \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table-1.png" "$REPO_DIR/testdata/v00/test_latex_page_with_table-2.png"
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname:nougat" "$workdir/copy_b.md" Fake OCR copy_b.pdf
+            check_are_words_contained "local:$testname:surya" "$workdir/test_latex_page_with_table_2.txt" Fake OCR page_with_table-2.png
+            check_are_words_contained "local:$testname:surya_image" "$workdir/test_latex_page_with_table_2_annotated.png" PNG
+            ;;
+        marker_sharding)
+            # One marker prediction per page range, stitched back in page order
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 0.2
+            (cd "$workdir" && set -x
+            REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake \
+                python3 "$REPO_DIR/pdfextractors/cuuupid_marker_replicate.py" --verbose --shard-pages 1 \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table.pdf"
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname" "$workdir/test_latex_page_with_table.md" Fake OCR pages-1-1.pdf pages-2-2.pdf
+            ;;
+        pipeline_pages)
+            # Every page rendered and OCR'd, written in page order
+            make_pipeline_pdf "$workdir/pages.pdf" || return
+            run_pipeline "$workdir" --no-dedup --blank-ink 0 --no-text-layer
+            check_are_words_contained "local:$testname:summary" "$workdir/pipeline.txt" "4/4 pages" "failed=0" "blank=0"
+            check_are_words_contained "local:$testname:created" "$workdir/created.txt" "create_prediction=4$"
+            check_are_words_contained "local:$testname" "$workdir/pages.md" Fake OCR "page 1 -->" "page 4 -->"
+            ;;
+        pipeline_dedup)
+            # The repeated scan is served from the first copy's result
+            make_pipeline_pdf "$workdir/pages.pdf" || return
+            run_pipeline "$workdir" --blank-ink 0 --no-text-layer
+            check_are_words_contained "local:$testname:summary" "$workdir/pipeline.txt" "4/4 pages" "failed=0" "deduplicated=1"
+            check_are_words_contained "local:$testname:created" "$workdir/created.txt" "create_prediction=3$"
+            check_are_words_contained "local:$testname" "$workdir/pages.md" Fake OCR "page 4 -->"
+            ;;
+        pipeline_blank)
+            # The blank scan is answered locally
+            make_pipeline_pdf "$workdir/pages.pdf" || return
+            run_pipeline "$workdir" --no-dedup --no-text-layer
+            check_are_words_contained "local:$testname:summary" "$workdir/pipeline.txt" "4/4 pages" "failed=0" "blank=1"
+            check_are_words_contained "local:$testname:created" "$workdir/created.txt" "create_prediction=3$"
+            check_are_words_contained "local:$testname" "$workdir/pages.md" "\\[blank page\\]"
+            ;;
+        pipeline_text_layer)
+            # The born-digital page is taken from its text layer
+            make_pipeline_pdf "$workdir/pages.pdf" || return
+            run_pipeline "$workdir" --no-dedup --blank-ink 0
+            check_are_words_contained "local:$testname:summary" "$workdir/pipeline.txt" "4/4 pages" "failed=0" "text_layer=1"
+            check_are_words_contained "local:$testname:created" "$workdir/created.txt" "create_prediction=3$"
+            check_are_words_contained "local:$testname" "$workdir/pages.md" "Example Document" "John Doe" Introduction
+            ;;
+        journal_resume)
+            # Interrupted while the prediction runs; the re-run re-attaches instead of creating another one
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 4
+            cp testdata/v00/test_latex_page_with_table.pdf "$workdir/resume.pdf"
+            (cd "$workdir" && set -x
+            export REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake
+            timeout -s INT 2 python3 "$REPO_DIR/pdfextractors/cudanexus_nougat_replicate.py" --no-cache --poll-interval 0.1 resume.pdf
+            python3 "$REPO_DIR/pdfextractors/cudanexus_nougat_replicate.py" --no-cache --poll-interval 0.1 resume.pdf 2> resume.err
+            curl -s "$REPLICATE_BASE_URL/__stats" > stats.json
+            )
+            kill "$FAKE_PID"
+            cat "$workdir/resume.err" "$workdir/stats.json"
+            check_are_words_contained "local:$testname:resumed" "$workdir/resume.err" RESUMING prediction
+            check_are_words_contained "local:$testname:created_once" "$workdir/stats.json" '"create_prediction": 1,'
+            check_are_words_contained "local:$testname" "$workdir/resume.md" Fake OCR resume.pdf
+            ;;
+        journal_duplicate_inputs)
+            # The same content twice in one run gets its own prediction instead of hanging on the first
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 1
+            cp testdata/v00/test_latex_page_with_table.pdf "$workdir/a.pdf"
+            cp testdata/v00/test_latex_page_with_table.pdf "$workdir/b.pdf"
+            (cd "$workdir" && set -x
+            REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake \
+                timeout 60 python3 "$REPO_DIR/pdfextractors/cudanexus_nougat_replicate.py" --no-cache --jobs 1 --poll-interval 0.1 a.pdf b.pdf
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname:a" "$workdir/a.md" Fake OCR a.pdf
+            check_are_words_contained "local:$testname" "$workdir/b.md" Fake OCR b.pdf
+            ;;
+        lucataco_resolution_auto)
+            # Resolution picked from page layout (page 2 holds a few lines of 10pt text)
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 0.2
+            (cd "$workdir" && set -x
+            REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake \
+                python3 "$REPO_DIR/imgextractors/lucataco_deepseek_ocr_replicate.py" --resolution auto \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table-2.png"
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname" "$workdir/test_latex_page_with_table_2.md" Fake OCR resolution_size=Base
+            ;;
+        ai_ocr_cli)
+            # Single entry point dispatching to the registry; --help must not load provider SDKs
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 0.2
+            (cd "$workdir" && set -x
+            REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake PYTHONPATH="$REPO_DIR" \
+                python3 -m ai_ocr surya --no-cache "$REPO_DIR/testdata/v00/test_latex_page_with_table-1.png"
+            )
+            kill "$FAKE_PID"
+            check_are_words_contained "local:$testname" "$workdir/test_latex_page_with_table_1.txt" Fake OCR page_with_table-1.png
+            python3 tests/benchmarks/import_time_budget.py > "$workdir/import_time_budget.txt"
+            cat "$workdir/import_time_budget.txt"
+            check_are_words_contained "local:$testname:import_time_budget" "$workdir/import_time_budget.txt" IMPORT_BUDGET_OK
+            ;;
+        ai_ocr_serve)
+            # Daemon with warm clients; the wrapper forwards both pages to it as a thin client
+            start_fake_server tests/fakes/fake_replicate_server.py --latency 0.2
+            REPLICATE_BASE_URL="http://127.0.0.1:$FAKE_PORT" REPLICATE_API_TOKEN=fake PYTHONPATH="$REPO_DIR" \
+                python3 -m ai_ocr serve --poll-interval 0.05 2> "$workdir/serve.err" &
+            local serve_pid=$!
+            for _ in $(seq 50); do
+                [ -S "$AI_OCR_SOCKET" ] && break
+                sleep 0.1
+            done
+            (cd "$workdir" && set -x
+            python3 "$REPO_DIR/imgextractors/cudanexus_ocr_surya_replicate.py" --verbose \
+                "$REPO_DIR/testdata/v00/test_latex_page_with_table-1.png" "$REPO_DIR/testdata/v00/test_latex_page_with_table-2.png" \
+                2> "$workdir/client.err"
+            )
+            kill "$serve_pid"
+            wait "$serve_pid"
+            kill "$FAKE_PID"
+            cat "$workdir/client.err" "$workdir/serve.err"
+            check_are_words_contained "local:$testname:forwarded" "$workdir/client.err" Forwarding done=2
+            check_are_words_contained "local:$testname" "$workdir/test_latex_page_with_table_2.txt" Fake OCR page_with_table-2.png
+            check_are_words_contained "local:$testname:stopped" "$workdir/serve.err" Stopped
+            ;;
+        *)
+            ERROR "Unknown local test: $testname"
+            ;;
+    esac
+}
+
+if [ -n "$SPECIFIC_TEST" ]; then
+    run_local_test "$SPECIFIC_TEST"
+else
+    run_local_test "deepseek_ocr_deepinfra_async"
+    run_local_test "result_cache"
+    run_local_test "replicate_prediction_scheduler"
+    run_local_test "metrics_file"
+    run_local_test "usage_log"
+    run_local_test "deepinfra_stream"
+    run_local_test "lucataco_resolution_auto"
+    run_local_test "marker_sharding"
+    run_local_test "pipeline_pages"
+    run_local_test "pipeline_dedup"
+    run_local_test "pipeline_blank"
+    run_local_test "pipeline_text_layer"
+    run_local_test "journal_resume"
+    run_local_test "journal_duplicate_inputs"
+    run_local_test "ai_ocr_cli"
+    run_local_test "ai_ocr_serve"
+fi
+
+fi
+
 # REPLICATE TESTS #########################################
-if $REPLICATE_TESTS || $REST_TESTS || [ -n "$SPECIFIC_TEST" ]; then
+if $REPLICATE_TESTS || $REST_TESTS || { [ -n "$SPECIFIC_TEST" ] && ! $LOCAL_TESTS; }; then
 
 INFO "# Running Replicate API tests..."
 
+# Fresh result cache, so production APIs are really exercised
+export AI_OCR_CACHE_DIR="$tmpdir/cache"
+
 function INFOEXTRACTOR() {
     local status="$1"
     echo